@@ -0,0 +1,198 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from melodrive.stats.randommanager import RandomManager
+from musiclib.metre import Metre
+from musiclib.rhythmdata import rhythmData as rd
+from musiclib.melodyrhythmgenerator import MelodyRhythmGenerator
+from musiclib.harmonyrhythmgenerator import HarmonyRhythmGenerator
+from musiclib.harmonypitch.harmonypitchgenerator import HarmonyPitchGenerator
+from musiclib.melodypitch.melodybackbonegenerator import \
+    MelodyBackboneGenerator
+from musiclib.melodypitch.note import Note
+
+FOURFOUR = "4/4"
+THREEFOUR = "3/4"
+
+# labels of the tactus and harmonic tactus of each time signature
+metreLabels = {FOURFOUR: ("quarternote", "halfnote"),
+               THREEFOUR: ("quarternote", "dottedhalfnote")}
+
+# number of jobs sent to a worker process at a time
+CHUNKSIZE = 16
+
+
+def deriveJobSeed(masterSeed, jobIndex):
+    """Returns the seed of a job. It only depends on the master seed and the
+    index of the job, so results don't depend on the number of workers or on
+    the order jobs are run in.
+
+    Args:
+        masterSeed (int):
+        jobIndex (int):
+
+    Returns:
+        seed (int):
+    """
+    seedSequence = np.random.SeedSequence(masterSeed, spawn_key=(jobIndex,))
+    return int(seedSequence.generate_state(1, np.uint64)[0])
+
+
+def runJob(job, masterSeed, jobIndex):
+    """Seeds the random generators of the process and runs a job
+
+    Args:
+        job (function): Takes the index of the job and returns its result
+        masterSeed (int):
+        jobIndex (int):
+
+    Returns:
+        result:
+    """
+    seed = deriveJobSeed(masterSeed, jobIndex)
+    RandomManager.getActive().seed(seed)
+    random.seed(seed)
+    return job(jobIndex)
+
+
+def generateBatch(job, numJobs, masterSeed, maxWorkers=None,
+                  chunkSize=CHUNKSIZE):
+    """Runs jobs across a pool of processes and returns their results in
+    order. Every job is seeded with deriveJobSeed, so the results are the
+    same for any number of workers.
+
+    Args:
+        job (function): Picklable function which takes the index of a job
+                        and returns its result, e.g. a MUJob
+        numJobs (int):
+        masterSeed (int):
+        maxWorkers (int): Number of processes. If None, the number of CPUs.
+                          If 0, jobs are run in the current process
+        chunkSize (int): Number of jobs sent to a process at a time, so that
+                         the job is pickled once per chunk
+
+    Returns:
+        results (list): Result of each job
+    """
+    runSeededJob = partial(runJob, job, masterSeed)
+    if maxWorkers == 0:
+        return [runSeededJob(jobIndex) for jobIndex in range(numJobs)]
+
+    with ProcessPoolExecutor(maxWorkers) as executor:
+        return list(executor.map(runSeededJob, range(numJobs),
+                                 chunksize=chunkSize))
+
+
+class GeneratedMU(object):
+    """GeneratedMU contains the output of all the generators for a MU
+
+    Attributes:
+        jobIndex (int):
+        melodicRhythm (RhythmSequence):
+        harmonicRhythm (RhythmSequence):
+        chords (list): List of Chord objects, one for each element of the
+                       harmonic rhythm
+        backbone (list): List of backbone Note objects, one for each chord
+        lick (list): (duration, midi note) pairs of a lick
+    """
+
+    def __init__(self, jobIndex, melodicRhythm=None, harmonicRhythm=None,
+                 chords=None, backbone=None, lick=None):
+        super(GeneratedMU, self).__init__()
+        self.jobIndex = jobIndex
+        self.melodicRhythm = melodicRhythm
+        self.harmonicRhythm = harmonicRhythm
+        self.chords = chords
+        self.backbone = backbone
+        self.lick = lick
+
+
+class MUJob(object):
+    """MUJob generates a MU with the rhythm, harmony pitch, backbone and
+    lick generators. It only stores its settings when pickled, and creates
+    the generators the first time it runs in a process.
+
+    Features are read from a dict with the keys of BarPipeline. Missing
+    features are 0.
+
+    Attributes:
+        timeSignature (str):
+        numBarsMU (int): Number of core bars of a MU
+        features (dict):
+        structureLevel (str): Structure level of the MU, used to decide
+                              cadences
+        generateLicks (bool): If True, a lick is generated for each MU
+    """
+
+    def __init__(self, timeSignature=FOURFOUR, numBarsMU=2, features=None,
+                 structureLevel="musicunit", generateLicks=True):
+        super(MUJob, self).__init__()
+        self.timeSignature = timeSignature
+        self.numBarsMU = numBarsMU
+        self.features = dict(features or {})
+        self.structureLevel = structureLevel
+        self.generateLicks = generateLicks
+        self._generators = None
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_generators"] = None
+        return state
+
+
+    def __call__(self, jobIndex):
+        if self._generators is None:
+            self._generators = self._createGenerators()
+        (metre, melodyRhythmGenerator, harmonyRhythmGenerator,
+         harmonyPitchGenerator, backboneGenerator,
+         lickGenerator) = self._generators
+        features = self.features
+
+        for generator, density, entropy in (
+                (melodyRhythmGenerator, "density", "entropy"),
+                (harmonyRhythmGenerator, "harmonicDensity",
+                 "harmonicEntropy")):
+            generator.setDensityImpact(features.get(density, 0))
+            generator.setEntropyImpact(features.get(entropy, 0))
+
+        mu = GeneratedMU(jobIndex)
+        mu.melodicRhythm = melodyRhythmGenerator.generateMelodicRhythmMU(
+            metre, self.numBarsMU)
+        mu.harmonicRhythm = harmonyRhythmGenerator.generateHarmonicRhythmMU(
+            metre, self.numBarsMU)
+        mu.chords = harmonyPitchGenerator.generateHarmonyPitchMU(
+            mu.harmonicRhythm, features.get("harmonicComplexity", 0),
+            features.get("minMajRatio", 0), self.structureLevel, show=False)
+
+        backboneNotes = [Note(rhythm, chord, isBackboneNote=True)
+                         for rhythm, chord in zip(mu.harmonicRhythm,
+                                                  mu.chords)]
+        mu.backbone = backboneGenerator.generateBackbonePitches(
+            backboneNotes, features.get("pitchHeight", 0),
+            features.get("pitchRange", 0),
+            features.get("melodicComplexity", 0), show=False)
+
+        if lickGenerator is not None:
+            mu.lick = lickGenerator.generateLick(
+                harmonyPitchGenerator.chordProfile.getScale())
+        return mu
+
+
+    def _createGenerators(self):
+        tactus, harmonicTactus = metreLabels[self.timeSignature]
+        metre = Metre.createFromLabels(self.timeSignature, tactus,
+                                       harmonicTactus)
+
+        lickGenerator = None
+        if self.generateLicks:
+            # the lick generator loads all its Markov models, so it's only
+            # imported and created if licks are needed
+            from musiclib.licks.lickgenerator import LickGenerator
+            lickGenerator = LickGenerator()
+
+        return (metre, MelodyRhythmGenerator(metre),
+                HarmonyRhythmGenerator.fromModelData(metre, rd["harmony"]),
+                HarmonyPitchGenerator(), MelodyBackboneGenerator(),
+                lickGenerator)
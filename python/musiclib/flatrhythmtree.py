@@ -0,0 +1,263 @@
+from array import array
+from musiclib.flattree import FlatTree, FlatTreeNode, NONODE
+from musiclib.rhythmtree import MAXNUMDOTS
+from musiclib.ticks import TICKSPERQUARTER, convertTicks, ticksToDuration
+
+
+class FlatRhythmTree(FlatTree):
+    """FlatRhythmTree is an array-backed alternative to RhythmTree. Besides
+    the structure of the tree, it stores the rhythm data of every node in
+    typed arrays. Nodes are accessed through FlatRhythmTreeNode objects,
+    which expose the API of RhythmTree used by the rhythm generators.
+
+    Trees are either copied from a RhythmTree, or built directly in the
+    arrays by RhythmTreeFactory.createFlatRhythmTree, which also inserts
+    tuplets in them without creating any node objects.
+
+    Attributes:
+        durationTicks (array): Duration of each node in ticks
+        ticksPerQuarter (int): Resolution of the ticks
+        durationLevel (array): Duration level of each node
+        metricalAccent (array): Metrical accent of each node
+        hasTupletChildren (array): 1 if children of a node are a tuplet
+        lowestDurationLevel (int): Lowest duration level of the tree
+    """
+
+    _arrayNames = FlatTree._arrayNames + ("durationTicks", "durationLevel",
+                                          "metricalAccent",
+                                          "hasTupletChildren")
+
+    def __init__(self, ticksPerQuarter=TICKSPERQUARTER):
+        super(FlatRhythmTree, self).__init__()
+        self.ticksPerQuarter = ticksPerQuarter
+        self.durationTicks = array("l")
+        self.durationLevel = array("b")
+        self.metricalAccent = array("b")
+        self.hasTupletChildren = array("b")
+        self.lowestDurationLevel = None
+
+
+    @classmethod
+    def fromRhythmTree(cls, rhythmTree):
+        """Creates a flat copy of a RhythmTree
+
+        Args:
+            rhythmTree (RhythmTree): Root of the tree to be copied
+
+        Returns:
+            flatRhythmTree (FlatRhythmTree):
+        """
+        flatRhythmTree = cls(rhythmTree.getTicksPerQuarter())
+        flatRhythmTree.addSubtree(rhythmTree)
+        flatRhythmTree.lowestDurationLevel = \
+            rhythmTree.getLowestDurationLevel()
+        return flatRhythmTree
+
+
+    def addRhythmNode(self, parentIndex, durationTicks, durationLevel,
+                      metricalAccent, hasTupletChildren=False):
+        """Appends a node with the given rhythm data to the children of a
+        node. If parentIndex is NONODE the node becomes the root.
+
+        Args:
+            parentIndex (int): Index of the parent
+            durationTicks (int):
+            durationLevel (int):
+            metricalAccent (int):
+            hasTupletChildren (bool):
+
+        Returns:
+            index (int): Index of the new node
+        """
+        index = self._appendStructure(parentIndex)
+        self.durationTicks.append(durationTicks)
+        self.durationLevel.append(durationLevel)
+        self.metricalAccent.append(metricalAccent)
+        self.hasTupletChildren.append(hasTupletChildren)
+        return index
+
+
+    def copy(self):
+        flatRhythmTree = super(FlatRhythmTree, self).copy()
+        flatRhythmTree.ticksPerQuarter = self.ticksPerQuarter
+        flatRhythmTree.lowestDurationLevel = self.lowestDurationLevel
+        return flatRhythmTree
+
+
+    def getSignature(self):
+        """Returns a hashable description of the nodes which can be reached
+        from the root. It's the same as the signature of a
+        PersistentRhythmTree with the same structure.
+        """
+        # children are found after their parent breadth-first, so the
+        # signatures are built from the last node back to the root
+        order = [0]
+        for index in order:
+            order.extend(self.getChildIndexes(index))
+
+        signatures = {}
+        for index in reversed(order):
+            signatures[index] = (self.durationTicks[index],
+                                 self.durationLevel[index],
+                                 self.metricalAccent[index],
+                                 bool(self.hasTupletChildren[index]),
+                                 tuple(signatures[child] for child in
+                                       self.getChildIndexes(index)))
+        return signatures[0]
+
+
+    def getNode(self, index):
+        return FlatRhythmTreeNode(self, index)
+
+
+    def getValue(self, index):
+        return self.getDuration(index)
+
+
+    def getDuration(self, index):
+        return ticksToDuration(self.durationTicks[index], self.ticksPerQuarter)
+
+
+    def _appendData(self, node):
+        self.durationTicks.append(node.getDurationTicks(self.ticksPerQuarter))
+        self.durationLevel.append(node.durationLevel)
+        self.metricalAccent.append(node.metricalAccent)
+        self.hasTupletChildren.append(node.hasTupletChildren)
+
+
+class FlatRhythmTreeNode(FlatTreeNode):
+    """FlatRhythmTreeNode is a node of a FlatRhythmTree"""
+
+    __slots__ = ()
+
+    def __str__(self, level=0):
+        representation = "  " * level + str(self.getDuration()) + "\n"
+        for child in self.children:
+            representation += child.__str__(level+1)
+        return representation
+
+
+    @property
+    def duration(self):
+        return self.tree.getDuration(self.index)
+
+
+    @property
+    def durationLevel(self):
+        return self.tree.durationLevel[self.index]
+
+
+    @property
+    def metricalAccent(self):
+        return self.tree.metricalAccent[self.index]
+
+
+    @property
+    def hasTupletChildren(self):
+        return bool(self.tree.hasTupletChildren[self.index])
+
+
+    def getDuration(self):
+        return self.tree.getDuration(self.index)
+
+
+    def getDurationTicks(self, ticksPerQuarter=None):
+        durationTicks = self.tree.durationTicks[self.index]
+        if ticksPerQuarter is None:
+            return durationTicks
+        return convertTicks(durationTicks, self.tree.ticksPerQuarter,
+                            ticksPerQuarter)
+
+
+    def getTicksPerQuarter(self):
+        return self.tree.ticksPerQuarter
+
+
+    def getDurationLevel(self):
+        return self.tree.durationLevel[self.index]
+
+
+    def getMetricalAccent(self):
+        return self.tree.metricalAccent[self.index]
+
+
+    def getLowestDurationLevel(self):
+        return self.tree.lowestDurationLevel
+
+
+    def getHasTupletChildren(self):
+        return bool(self.tree.hasTupletChildren[self.index])
+
+
+    def calculateTupletItemDuration(self, tupletType):
+        return self.getDuration() / tupletType
+
+
+    def hasTupletAncestors(self, value=False):
+        """Same as RhythmTree.hasTupletAncestors"""
+
+        # return up the stack if we're at the leaves
+        if not self.hasChildren():
+            return value
+        elif value == True:
+            return value
+
+        if self.getHasTupletChildren():
+            return True
+
+        # expand node
+        for child in self.getChildren():
+            value = child.hasTupletAncestors()
+
+        return value
+
+
+    def getDurationCandidates(self, numDots):
+        """Returns all the durations in the rhythmic space available after the
+        current one, following the same rules as
+        RhythmTree.getDurationCandidates
+
+        Args:
+            numDots (int): Number of dots current rhythmic space
+
+        Returns:
+            candidateDurations (tuple): Tuple of FlatRhythmTreeNode objects,
+                                        or None if there are no candidates
+        """
+
+        if numDots > MAXNUMDOTS:
+            raise ValueError("%s dots are not supported" % numDots)
+
+        tree = self.tree
+
+        # handle case we're at the root of the tree
+        if numDots == 0 and not self.hasParent():
+            return self._getLeftView(self.index)
+
+        if numDots == 0:
+            ancestor = self._getFirstAncestorIndexNotLastChild()
+            if ancestor == NONODE:
+                return None
+            return self._getLeftView(tree.nextSibling[ancestor])
+
+        LASTCHILDINDEX = 1
+        rightSibling = tree.nextSibling[self.index]
+        if rightSibling == NONODE:
+            return None
+        targetDuration = self._getNode(rightSibling)._getDescendantIndexAtIndex(
+                                                    numDots, LASTCHILDINDEX)
+        if targetDuration == NONODE:
+            return None
+        return self._getLeftView(targetDuration)
+
+
+    def _getLeftView(self, index):
+        """Returns the nodes found traversing down the tree from 'index' and
+        picking the 0-index children, included the node at 'index'
+        """
+        firstChild = self.tree.firstChild
+        candidateDurations = []
+        while index != NONODE:
+            candidateDurations.append(self._getNode(index))
+            index = firstChild[index]
+        return tuple(candidateDurations)
@@ -0,0 +1,437 @@
+from array import array
+
+# index used in the navigation arrays when there is no such node
+NONODE = -1
+
+
+class FlatTree(object):
+    """FlatTree is an array-backed alternative to Tree. Nodes are integer
+    indexes into parallel arrays which store the structure of the tree, so
+    nodes don't need an object each and navigation doesn't need recursion or
+    sibling list lookups. Nodes are accessed through FlatTreeNode objects,
+    which expose the navigation API of Tree.
+
+    Attributes:
+        parent (array): Index of the parent of each node
+        firstChild (array): Index of the first child of each node
+        lastChild (array): Index of the last child of each node
+        nextSibling (array): Index of the right sibling of each node
+        prevSibling (array): Index of the left sibling of each node
+        depth (array): Depth of each node, 0 being the root
+        childIndex (array): Index of each node in the children of its parent
+        numChildren (array): Number of children of each node
+    """
+
+    # arrays which are copied by copy. Subclasses add the arrays of their data
+    _arrayNames = ("parent", "firstChild", "lastChild", "nextSibling",
+                   "prevSibling", "depth", "childIndex", "numChildren")
+
+    def __init__(self):
+        super(FlatTree, self).__init__()
+        self.parent = array("l")
+        self.firstChild = array("l")
+        self.lastChild = array("l")
+        self.nextSibling = array("l")
+        self.prevSibling = array("l")
+        self.depth = array("l")
+        self.childIndex = array("l")
+        self.numChildren = array("l")
+        self._values = []
+
+
+    def __len__(self):
+        return len(self.parent)
+
+
+    def __str__(self):
+        return self.getRoot().__str__()
+
+
+    @classmethod
+    def fromTree(cls, tree):
+        """Creates a flat copy of a Tree. Nodes are stored in breadth-first
+        order.
+
+        Args:
+            tree (Tree): Root of the tree to be copied
+
+        Returns:
+            flatTree (FlatTree):
+        """
+        flatTree = cls()
+        flatTree.addSubtree(tree)
+        return flatTree
+
+
+    def addSubtree(self, tree, parentIndex=NONODE):
+        """Appends a copy of a Tree to the children of a node. If parentIndex
+        is NONODE the tree becomes the root.
+
+        Args:
+            tree (Tree): Root of the tree to be copied
+            parentIndex (int): Index of the node the tree gets appended to
+
+        Returns:
+            index (int): Index of the root of the copied tree
+        """
+        rootIndex = self.addNode(tree, parentIndex)
+        queue = [(tree, rootIndex)]
+        for node, index in queue:
+            for child in node.children:
+                queue.append((child, self.addNode(child, index)))
+        return rootIndex
+
+
+    def addNode(self, node, parentIndex=NONODE):
+        """Appends a node to the children of a node. If parentIndex is NONODE
+        the node becomes the root.
+
+        Args:
+            node (Tree): Node whose data is copied. Its children aren't
+            parentIndex (int): Index of the parent
+
+        Returns:
+            index (int): Index of the new node
+        """
+        index = self._appendStructure(parentIndex)
+        self._appendData(node)
+        return index
+
+
+    def removeChildren(self, index):
+        """Detaches the children of a node. Arrays only grow, so the
+        descendants of the node stay in them, but can't be reached from the
+        root anymore.
+
+        Args:
+            index (int): Index of the node
+        """
+        self.firstChild[index] = NONODE
+        self.lastChild[index] = NONODE
+        self.numChildren[index] = 0
+
+
+    def copy(self):
+        """Returns a copy of the tree which can be modified independently"""
+        flatTree = self.__class__()
+        for name in self._arrayNames:
+            setattr(flatTree, name, getattr(self, name)[:])
+        flatTree._values = list(self._values)
+        return flatTree
+
+
+    def _appendStructure(self, parentIndex):
+        """Appends a node to the navigation arrays, as the last child of
+        'parentIndex'
+
+        Args:
+            parentIndex (int): Index of the parent, or NONODE for the root
+
+        Returns:
+            index (int): Index of the new node
+        """
+        index = len(self.parent)
+        if parentIndex == NONODE and index > 0:
+            raise ValueError("The tree already has a root")
+
+        self.parent.append(parentIndex)
+        self.firstChild.append(NONODE)
+        self.lastChild.append(NONODE)
+        self.nextSibling.append(NONODE)
+        self.numChildren.append(0)
+
+        if parentIndex == NONODE:
+            self.prevSibling.append(NONODE)
+            self.depth.append(0)
+            self.childIndex.append(0)
+        else:
+            prevSibling = self.lastChild[parentIndex]
+            self.prevSibling.append(prevSibling)
+            self.depth.append(self.depth[parentIndex] + 1)
+            self.childIndex.append(self.numChildren[parentIndex])
+            if prevSibling == NONODE:
+                self.firstChild[parentIndex] = index
+            else:
+                self.nextSibling[prevSibling] = index
+            self.lastChild[parentIndex] = index
+            self.numChildren[parentIndex] += 1
+        return index
+
+
+    def getNode(self, index):
+        return FlatTreeNode(self, index)
+
+
+    def getRoot(self):
+        return self.getNode(0)
+
+
+    def getValue(self, index):
+        return self._values[index]
+
+
+    def getChildIndexes(self, index):
+        """Returns the indexes of the children of a node"""
+        children = []
+        child = self.firstChild[index]
+        while child != NONODE:
+            children.append(child)
+            child = self.nextSibling[child]
+        return children
+
+
+    def getChildAtIndex(self, index, childIndex):
+        """Returns the index of the child number 'childIndex' of a node, or
+        NONODE if the node doesn't have that many children"""
+        if childIndex >= self.numChildren[index]:
+            return NONODE
+        child = self.firstChild[index]
+        for _ in range(childIndex):
+            child = self.nextSibling[child]
+        return child
+
+
+    def _appendData(self, node):
+        """Stores the data of a node. Subclasses store their own data"""
+        self._values.append(node.value)
+
+
+class FlatTreeNode(object):
+    """FlatTreeNode is a node of a FlatTree. It provides the navigation API
+    of Tree by reading the arrays of the tree.
+
+    Attributes:
+        tree (FlatTree): Tree the node belongs to
+        index (int): Index of the node in the tree arrays
+    """
+
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        super(FlatTreeNode, self).__init__()
+        self.tree = tree
+        self.index = index
+
+
+    def __eq__(self, other):
+        if not isinstance(other, FlatTreeNode):
+            return NotImplemented
+        return self.tree is other.tree and self.index == other.index
+
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+
+    def __str__(self, level=0):
+        representation = "  " * level + str(self.value) + "\n"
+        for child in self.children:
+            representation += child.__str__(level+1)
+        return representation
+
+
+    @property
+    def value(self):
+        return self.tree.getValue(self.index)
+
+
+    @property
+    def children(self):
+        return self.getChildren()
+
+
+    @property
+    def parent(self):
+        return self.getParent()
+
+
+    def addChild(self, child):
+        """Appends a copy of a Tree to the children of the node
+
+        Args:
+            child (Tree): Child to be appended
+        """
+        self.tree.addSubtree(child, self.index)
+
+
+    def addChildren(self, children):
+        """Appends copies of Trees to the children of the node
+
+        Args:
+            children (list): List of children Trees to be added
+        """
+        for child in children:
+            self.tree.addSubtree(child, self.index)
+
+
+    def hasChildren(self):
+        return self.tree.numChildren[self.index] > 0
+
+
+    def hasParent(self):
+        return self.tree.parent[self.index] != NONODE
+
+
+    def hasDescendant(self, depth, startLevel=0):
+        """Boolean method that checks whether the node has descendant of
+        x depth, expanding first children.
+
+        Args:
+            depth (int): depth of descendant to be checked
+        """
+        firstChild = self.tree.firstChild
+        index = self.index
+        for _ in range(depth - startLevel):
+            index = firstChild[index]
+            if index == NONODE:
+                return False
+        return True
+
+
+    def hasAncestor(self, height, startLevel=0):
+        """Boolean method that checks whether the node has ancestor of
+        x height.
+
+        Args:
+            height (int): height of ancestor to be checked
+        """
+        return self.tree.depth[self.index] >= height - startLevel
+
+
+    def isLastChild(self):
+        """Boolean method that checks whether node is last child.
+        Returns True if node is root
+        """
+        return self.tree.nextSibling[self.index] == NONODE
+
+
+    def isTheLastChild(self):
+        return self.isLastChild()
+
+
+    def isFirstChild(self):
+        """Boolean method that checks if node is the first child. Returns
+        'None' if node is root.
+        """
+        if not self.hasParent():
+            return None
+        return self.tree.prevSibling[self.index] == NONODE
+
+
+    def getChild(self, childIndex):
+        """Returns child by index, or None if there's no such child"""
+        child = self.tree.getChildAtIndex(self.index, childIndex)
+        if child == NONODE:
+            return None
+        return self._getNode(child)
+
+
+    def getChildren(self):
+        return [self._getNode(i) for i in self.tree.getChildIndexes(self.index)]
+
+
+    def getParent(self):
+        return self._getNode(self.tree.parent[self.index])
+
+
+    def getRoot(self):
+        return self._getNode(0)
+
+
+    def getRightSibling(self):
+        """Returns right sibling with same parent if possible. If there's no
+        right sibling, returns None"""
+        return self._getNode(self.tree.nextSibling[self.index])
+
+
+    def getLeftSibling(self):
+        """Returns left sibling with same parent if possible. If there's no
+        left sibling, returns None"""
+        return self._getNode(self.tree.prevSibling[self.index])
+
+
+    def getFirstAncestorNotLastChild(self):
+        """Returns the first node, starting from the current one and moving
+        up the tree, which is not a last child. Returns None if such a node
+        doesn't exist.
+        """
+        index = self._getFirstAncestorIndexNotLastChild()
+        return self._getNode(index)
+
+
+    def getDescendantAtIndex(self, depth, indexChild, startLevel=0):
+        """Returns node at 'depth' levels below, expanding the
+        indexChild at each level. Returns None if it doesn't exist.
+
+        Args:
+             depth (int): No. of levels below the node
+             indexChild (int): Index of children to be expanded at each level
+             startLevel (int): We start from 0
+        """
+        index = self._getDescendantIndexAtIndex(depth - startLevel,
+                                                indexChild)
+        return self._getNode(index)
+
+
+    def collectDescendantsAtRecursiveIndex(self, depth, indexChild,
+                                           startLevel, targetNodes=None):
+        """Returns all nodes below current level until 'depth' level, expanding
+        indexChild at each level. Returns None if they don't exist.
+
+        Args:
+             depth (int): No. of levels below the node
+             indexChild (int): Index of children to be expanded at each level
+             startLevel (int): We start from 0
+        """
+        if targetNodes is None:
+            targetNodes = []
+        index = self.index
+        targetNodes.append(self)
+        for _ in range(depth - startLevel):
+            index = self.tree.getChildAtIndex(index, indexChild)
+            if index == NONODE:
+                return None
+            targetNodes.append(self._getNode(index))
+        return targetNodes
+
+
+    def _getIndexOfNodeInSiblingList(self):
+        """Returns index of node in the children list of the parent. If node
+        doesn't have a parent returns None.
+        """
+        if not self.hasParent():
+            return None
+        return self.tree.childIndex[self.index]
+
+
+    def _getFirstAncestorIndexNotLastChild(self):
+        nextSibling = self.tree.nextSibling
+        parent = self.tree.parent
+        index = self.index
+        while nextSibling[index] == NONODE:
+            index = parent[index]
+            if index == NONODE:
+                return NONODE
+        return index
+
+
+    def _getDescendantIndexAtIndex(self, depth, indexChild):
+        index = self.index
+        for _ in range(depth):
+            index = self.tree.getChildAtIndex(index, indexChild)
+            if index == NONODE:
+                return NONODE
+        return index
+
+
+    def _getNode(self, index):
+        if index == NONODE:
+            return None
+        return self.__class__(self.tree, index)
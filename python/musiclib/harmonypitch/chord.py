@@ -1,33 +1,276 @@
+from collections import OrderedDict
+from types import MappingProxyType
+import numpy as np
+from musiclib.ticks import TICKSPERQUARTER
 from .event import Event
 from .scale import Scale
 
 MAJORDTHIRD = 4
 MINORTHIRD = 3
 
-noteTypes = ["fundamental", "3rd", "5th", "7th", "9th", "11th"]
+NUMPITCHCLASSES = 12
 
+# bits of a pitch class mask, bit i is set if pitch class i is in the set
+PITCHCLASSMASK = (1 << NUMPITCHCLASSES) - 1
 
-class Chord(Event):
-    def __init__(self, code="0+-", inversion="root", onset=0, duration=8,
-                 tonic=0, octave=0, scale="ionian"):
-        super(Chord, self).__init__(onset, duration)
+noteTypes = ["fundamental", "3rd", "5th", "7th", "9th", "11th"]
+
+# max number of chord shapes kept by the interning cache
+CHORDSHAPECACHESIZE = 4096
+
+# interned chord shapes keyed by (code, tonic, octave, scale), least
+# recently used first
+chordShapes = OrderedDict()
+
+# number of octaves the pitches of a chord are expanded over
+NUMOCTAVES = 8
+
+# max number of pitch ranges kept by the range cache
+PITCHRANGECACHESIZE = 256
+
+# read-only {pitch: noteType} dicts of the pitches of chords in a range,
+# keyed by (chord shape, low, high), least recently used first
+pitchRanges = OrderedDict()
+
+
+class ChordShape(object):
+    """ChordShape holds the data of a chord which only depends on its code,
+    tonic, octave and scale. Shapes are interned with ChordShape.get, so
+    they are computed once and shared by all the chords with the same shape,
+    and they must not be modified.
+
+    Attributes:
+        code (str): Chord code
+        tonic (int):
+        octave (int):
+        scale (Scale): Interned scale
+        pitchSet (list): List of pitches
+        pitchClassSet (list): List of pitch classes
+        pitchClassMask (int): 12 bit mask of the pitch classes
+        triadType (str):
+        chordNoteTypes (dict): Note type of each pitch class
+        pitches (numpy.ndarray): Sorted pitches of the chord notes over
+                                 NUMOCTAVES octaves. Read-only
+        noteTypeCodes (numpy.ndarray): Index in noteTypes of the note type of
+                                       each pitch. Read-only
+    """
+
+    def __init__(self, code, tonic=0, octave=0, scale="ionian"):
+        super(ChordShape, self).__init__()
         self.code = code
-        self.inversion = inversion
         self.tonic = tonic
         self.octave = octave
-        self.scale = Scale(scale)
-        self.pitchSet = Chord.fromCodeToPitchSet(self.code, self.tonic,
-                                                 self.octave)
-        self.pitchClassSet = Chord.fromCodeToPitchClassSet(self.code,
-                                            self.tonic, self.octave)
+        self.scale = Scale.get(scale)
+        self.pitchSet = Chord.fromCodeToPitchSet(code, tonic, octave)
+        self.pitchClassSet = [p % NUMPITCHCLASSES for p in self.pitchSet]
+        self.pitchClassMask = Chord.fromPitchClassSetToMask(
+            self.pitchClassSet)
         self.triadType = self._inferTriadTypeFromCode()
-        self.chordNoteTypes = self._assignChordNoteTypes(self.pitchSet)
+        self.chordNoteTypes = self._assignChordNoteTypes()
+        self.pitches, self.noteTypeCodes = self._expandPitches()
+
+
+    @classmethod
+    def get(cls, code, tonic=0, octave=0, scale="ionian"):
+        """Returns the interned shape of a chord, creating it the first time
+        it's requested
+
+        Args:
+            code (str): Chord code
+            tonic (int):
+            octave (int):
+            scale (str): Name of the scale
+
+        Returns:
+            shape (ChordShape):
+        """
+        key = (code, tonic, octave, scale)
+        shape = chordShapes.get(key)
+        if shape is not None:
+            chordShapes.move_to_end(key)
+            return shape
+
+        shape = cls(code, tonic, octave, scale)
+        chordShapes[key] = shape
+
+        # evict least recently used shape
+        if len(chordShapes) > CHORDSHAPECACHESIZE:
+            chordShapes.popitem(last=False)
+        return shape
+
+
+    def getPitchRange(self, low, high):
+        """Returns the pitches of the chord notes in a range, found with two
+        bisections
+
+        Args:
+            low (int): Lowest pitch of the range
+            high (int): Highest pitch of the range
+
+        Returns:
+            pitches (numpy.ndarray): Read-only view of the sorted pitches
+            noteTypeCodes (numpy.ndarray): Read-only view of the index in
+                                           noteTypes of each pitch
+        """
+        start = np.searchsorted(self.pitches, low, side="left")
+        end = np.searchsorted(self.pitches, high, side="right")
+        return self.pitches[start:end], self.noteTypeCodes[start:end]
+
+
+    def getPitchesTypes(self, low, high):
+        """Returns the pitches of the chord notes in a range with their note
+        types. Results are cached, so they are only computed the first time
+        a range is requested.
+
+        Args:
+            low (int): Lowest pitch of the range
+            high (int): Highest pitch of the range
+
+        Returns:
+            pitchChordNoteTypes (MappingProxyType): Read-only dict of the type
+                                                    {pitch: noteType}, sorted
+                                                    by pitch
+        """
+        key = (self, low, high)
+        pitchChordNoteTypes = pitchRanges.get(key)
+        if pitchChordNoteTypes is not None:
+            pitchRanges.move_to_end(key)
+            return pitchChordNoteTypes
+
+        pitches, noteTypeCodes = self.getPitchRange(low, high)
+        pitchChordNoteTypes = MappingProxyType(
+            {pitch: noteTypes[code]
+             for pitch, code in zip(pitches.tolist(), noteTypeCodes.tolist())})
+        pitchRanges[key] = pitchChordNoteTypes
+
+        # evict least recently used range
+        if len(pitchRanges) > PITCHRANGECACHESIZE:
+            pitchRanges.popitem(last=False)
+        return pitchChordNoteTypes
+
+
+    def _expandPitches(self):
+        """Calculates the pitches of the chord notes accross NUMOCTAVES
+        octaves, with the note type of each of them
+
+        Returns:
+            pitches (numpy.ndarray):
+            noteTypeCodes (numpy.ndarray):
+        """
+        pitchTypes = {p + 12*i: self.chordNoteTypes[p % 12]
+                      for p in self.pitchSet for i in range(NUMOCTAVES)}
+        sortedPitches = sorted(pitchTypes)
+
+        pitches = np.array(sortedPitches, dtype=np.intp)
+        noteTypeCodes = np.array([noteTypes.index(pitchTypes[p])
+                                  for p in sortedPitches], dtype=np.intp)
+        pitches.flags.writeable = False
+        noteTypeCodes.flags.writeable = False
+        return pitches, noteTypeCodes
+
+
+    def _assignChordNoteTypes(self):
+        """Assigns pitch to type of notes e.g., fundamental, 3rd... as a
+        dict of the type {pitch class: noteType}
+
+        Returns:
+            chordNoteTypes (dict):
+        """
+        chordNoteTypes = {}
+
+        # iterate through the notes of the chord and assign them a note type
+        for i, pitch in enumerate(self.pitchSet):
+            chordNoteTypes[pitch % 12] = noteTypes[i]
+        return chordNoteTypes
+
+
+    def _inferTriadTypeFromCode(self):
+        """Returns the triad type (i.e., "major", "minor", "augmented",
+        "diminished" of a chord code
+
+        Returns:
+            triadType (str):
+        """
+        thirdAndFifth = self.code[1:3]
+
+        # analyse the 3rd and 5th to infer the triad type
+        if thirdAndFifth == "+-":
+            triadType = "major"
+        elif thirdAndFifth == "-+":
+            triadType = "minor"
+        elif thirdAndFifth == "++":
+            triadType = "augmented"
+        else:
+            triadType = "diminished"
+        return triadType
+
+
+class Chord(Event):
+    """Chord is a chord event. The data which only depends on the code,
+    tonic, octave and scale is kept in an interned ChordShape, so a chord
+    only carries its own onset, duration and inversion. Onset and duration
+    can be given in quarter notes or in ticks (see Event).
+    """
+
+    def __init__(self, code="0+-", inversion="root", onset=0, duration=8,
+                 tonic=0, octave=0, scale="ionian",
+                 ticksPerQuarter=TICKSPERQUARTER, onsetTicks=None,
+                 durationTicks=None):
+        super(Chord, self).__init__(onset, duration, ticksPerQuarter,
+                                    onsetTicks, durationTicks)
+        self.inversion = inversion
+        self.shape = ChordShape.get(code, tonic, octave, scale)
 
 
     def __str__(self):
         return self.code
 
 
+    @property
+    def code(self):
+        return self.shape.code
+
+
+    @property
+    def tonic(self):
+        return self.shape.tonic
+
+
+    @property
+    def octave(self):
+        return self.shape.octave
+
+
+    @property
+    def scale(self):
+        return self.shape.scale
+
+
+    @property
+    def pitchSet(self):
+        return self.shape.pitchSet
+
+
+    @property
+    def pitchClassSet(self):
+        return self.shape.pitchClassSet
+
+
+    @property
+    def pitchClassMask(self):
+        return self.shape.pitchClassMask
+
+
+    @property
+    def triadType(self):
+        return self.shape.triadType
+
+
+    @property
+    def _chordNoteTypes(self):
+        return self.shape.chordNoteTypes
+
+
     @staticmethod
     def fromCodeToPitchSet(code, tonic=0, octave=0):
         """Converts a chord code into a pitch set
@@ -83,15 +326,12 @@ class Chord(Event):
             numCommonChordTones (int): Number of common chords between 2 chords
         """
 
-        # convert codes into pitch class sets
-        pcs1 = set(Chord.fromCodeToPitchClassSet(code1))
-        pcs2 = set(Chord.fromCodeToPitchClassSet(code2))
-
-        # calculate intersection between 2 pitch class sets
-        psDifference = pcs1.intersection(pcs2)
+        # convert codes into pitch class masks
+        mask1 = Chord.fromCodeToPitchClassMask(code1)
+        mask2 = Chord.fromCodeToPitchClassMask(code2)
 
-        numCommonChordTones = len(psDifference)
-        return numCommonChordTones
+        # count the pitch classes in the intersection of the 2 masks
+        return Chord.countPitchClasses(mask1 & mask2)
 
 
     @staticmethod
@@ -116,6 +356,81 @@ class Chord(Event):
         return pcs
 
 
+    @staticmethod
+    def fromCodeToPitchClassMask(code, tonic=0, octave=0):
+        """Returns the pitch class mask of a chord code
+
+        Args:
+            code (str): Chord code
+            tonic (int):
+            octave (int):
+
+        Returns:
+            mask (int): 12 bit mask, bit i is set if pitch class i is in the
+                        chord
+        """
+        return Chord.fromPitchClassSetToMask(
+            Chord.fromCodeToPitchClassSet(code, tonic, octave))
+
+
+    @staticmethod
+    def fromPitchClassSetToMask(pitchClassSet):
+        """Returns the mask of a pitch class set
+
+        Args:
+            pitchClassSet (list): List of pitch classes
+
+        Returns:
+            mask (int):
+        """
+        mask = 0
+        for pc in pitchClassSet:
+            mask |= 1 << pc
+        return mask
+
+
+    @staticmethod
+    def fromMaskToPitchClassSet(mask):
+        """Returns the sorted pitch classes of a mask
+
+        Args:
+            mask (int):
+
+        Returns:
+            pitchClassSet (list):
+        """
+        return [pc for pc in range(NUMPITCHCLASSES) if mask >> pc & 1]
+
+
+    @staticmethod
+    def countPitchClasses(mask):
+        """Returns the number of pitch classes of a mask
+
+        Args:
+            mask (int):
+
+        Returns:
+            numPitchClasses (int):
+        """
+        return bin(mask).count("1")
+
+
+    @staticmethod
+    def transposePitchClassMask(mask, semitones):
+        """Transposes a pitch class mask by rotating its bits
+
+        Args:
+            mask (int):
+            semitones (int): Interval of the transposition, can be negative
+
+        Returns:
+            transposedMask (int):
+        """
+        semitones %= NUMPITCHCLASSES
+        return ((mask << semitones) |
+                (mask >> (NUMPITCHCLASSES - semitones))) & PITCHCLASSMASK
+
+
     @staticmethod
     def createNumCommonChordTonesMatrix(codes):
         """Utility method that creates a 2x2 matrix with the common number
@@ -128,14 +443,16 @@ class Chord(Event):
             matrix (dict of dict):
         """
         matrix = {}
+        masks = [Chord.fromCodeToPitchClassMask(code) for code in codes]
 
         # step through codes in the given list of codes
-        for code in codes:
+        for code, mask in zip(codes, masks):
             matrix[code] = {}
-            for targetCode in codes:
+            for targetCode, targetMask in zip(codes, masks):
 
                 # calculate number of common chord tones
-                numCommonChordTones = Chord.calcNumCommonChordTones(code, targetCode)
+                numCommonChordTones = Chord.countPitchClasses(mask &
+                                                              targetMask)
 
                 # add number of commonchord tones to the dictionary
                 matrix[code][targetCode] = numCommonChordTones
@@ -152,33 +469,12 @@ class Chord(Event):
                 second indicates the high boundary
 
         Returns:
-            pitchChordNoteTypes (dict): List of pitches of the chord in the
-                given pitch range with associated type (e.g., fundamental,
-                3rd...)
+            pitchChordNoteTypes (MappingProxyType): Read-only dict of the
+                pitches of the chord in the given pitch range with
+                associated type (e.g., fundamental, 3rd...), sorted by pitch.
+                It's shared by all the chords with the same shape
         """
-        NUMOCTAVES = 8
-
-        pitchSet = self.pitchSet
-
-        # calculate chord note pitches accross 8 octaves
-        pitchesChordNotes = [p + 12*i for p in pitchSet for i in range(
-            NUMOCTAVES)]
-
-
-        # filter the chord note pitches based on the pitchRange
-        pitchesChordNotes = list(filter(lambda p: pitchRange[0] <= p <= pitchRange[1],
-                                            pitchesChordNotes))
-        pitchesChordNotes.sort()
-
-        pitchChordNoteTypes = {}
-
-        # go through the pitches and add info about their type
-        for pitch in pitchesChordNotes:
-            pc = pitch % 12
-            type = self._chordNoteTypes[pc]
-            pitchChordNoteTypes[pitch] = type
-
-        return pitchChordNoteTypes
+        return self.shape.getPitchesTypes(pitchRange[0], pitchRange[1])
 
 
     def assignDissonance(self, dissonanceType):
@@ -200,11 +496,11 @@ class Chord(Event):
             ps = Chord.fromCodeToPitchSet(code)
             psDissonance = ps[-1]
             pcsDissonance = psDissonance % 12
-            pitchClassSet = self.getPitchClassSet()
 
             # check that dissonance is part of the scale and that it's not
             # already used in the chord
-            if psDissonance in expandedScale and pcsDissonance not in pitchClassSet:
+            if psDissonance in expandedScale and \
+                    not self.pitchClassMask >> pcsDissonance & 1:
                 continue
 
             # add major third
@@ -229,57 +525,19 @@ class Chord(Event):
         return self.pitchClassSet
 
 
+    def getPitchClassMask(self):
+        return self.pitchClassMask
+
+
     def setCode(self, code):
-        self.code = code
-        self.pitchSet = Chord.fromCodeToPitchSet(self.code, self.tonic,
-                                                 self.octave)
-        self.pitchClassSet = Chord.fromCodeToPitchClassSet(self.code,
-                                                           self.tonic,
-                                                           self.octave)
-        self.triadType = self._inferTriadTypeFromCode()
+        self.shape = ChordShape.get(code, self.tonic, self.octave,
+                                    self.scale.getName())
 
 
     def getPitchSet(self):
         return self.pitchSet
 
 
-    def _assignChordNoteTypes(self, pitchSet):
-        """Assigns pitch to type of notes e.g., fundamental, 3rd... as a
-        dict of the type {pitch: noteType}
-
-        Args:
-            pitchSet (list):
-
-        """
-        self._chordNoteTypes = {}
-
-        # iterate through the notes of the chord and assign them a note type
-        for i, pitch in enumerate(pitchSet):
-            self._chordNoteTypes[pitch % 12] = noteTypes[i]
-
-
-
-    def _inferTriadTypeFromCode(self):
-        """Returns the triad type (i.e., "major", "minor", "augmented",
-        "diminished" of a chord code
-
-        Returns:
-            triadType (str):
-        """
-        thirdAndFifth = self.code[1:3]
-
-        # analyse the 3rd and 5th to infer the triad type
-        if thirdAndFifth == "+-":
-            triadType = "major"
-        elif thirdAndFifth == "-+":
-            triadType = "minor"
-        elif thirdAndFifth == "++":
-            triadType = "augmented"
-        else:
-            triadType = "diminished"
-        return triadType
-
-
 
     # We're not using this method!!
     def _getPitchOfDissonance(self, numStacked3rd, root, symbl):
@@ -0,0 +1,142 @@
+import os
+import numpy as np
+from ..probability import Distribution, getRandom
+
+
+def quantizeFeature(value, minVal, maxVal, gridSize):
+    """Returns the index of the grid point closest to the value of a feature.
+    Values outside [minVal, maxVal] fall in the first or last point.
+
+    Args:
+        value (float): Value of the feature
+        minVal (float): First point of the grid
+        maxVal (float): Last point of the grid
+        gridSize (int): Number of points of the grid
+
+    Returns:
+        bucket (int):
+    """
+    bucket = int(round((value - minVal) / (maxVal - minVal) *
+                       (gridSize - 1)))
+    return min(max(bucket, 0), gridSize - 1)
+
+
+def getGridValue(bucket, minVal, maxVal, gridSize):
+    """Returns the value of the feature at a point of the grid
+
+    Args:
+        bucket (int): Index of the point
+        minVal (float): First point of the grid
+        maxVal (float): Last point of the grid
+        gridSize (int): Number of points of the grid
+
+    Returns:
+        value (float):
+    """
+    return minVal + bucket * (maxVal - minVal) / (gridSize - 1)
+
+
+class ChordDecisionTables(object):
+    """ChordDecisionTables holds the alias tables of the triad distributions
+    of a chord profile, for fixed values of the emotional features. There's
+    a table for every metrical accent level and previous triad, so deciding
+    a triad is a table lookup and one random number.
+
+    Attributes:
+        aliasProbs (numpy.ndarray): Probability of keeping each column of
+                                    the alias tables. Its shape is (metrical
+                                    accent levels, previous triads + 1,
+                                    triads). The last previous triad is for
+                                    the first chord of a progression
+        aliases (numpy.ndarray): Triad used when a column isn't kept, with
+                                 the same shape as 'aliasProbs'
+    """
+
+    def __init__(self, aliasProbs, aliases):
+        super(ChordDecisionTables, self).__init__()
+        self.aliasProbs = aliasProbs
+        self.aliases = aliases
+
+
+    @classmethod
+    def fromScores(cls, scores):
+        """Creates the alias tables of triad scores
+
+        Args:
+            scores (numpy.ndarray): Non-negative scores, with the shape of
+                                    the tables
+
+        Returns:
+            tables (ChordDecisionTables):
+        """
+        rows = scores.reshape(-1, scores.shape[-1])
+        aliasProbs = np.empty(rows.shape)
+        aliases = np.empty(rows.shape, dtype=np.intp)
+        for i, row in enumerate(rows):
+            probabilities = (row / row.sum()).tolist()
+            aliasProbs[i], aliases[i] = Distribution._createAliasTable(
+                probabilities)
+        return cls(aliasProbs.reshape(scores.shape),
+                   aliases.reshape(scores.shape))
+
+
+    @classmethod
+    def load(cls, path):
+        """Loads tables saved with save
+
+        Args:
+            path (str):
+
+        Returns:
+            tables (ChordDecisionTables):
+        """
+        with np.load(path) as data:
+            return cls(data["aliasProbs"], data["aliases"])
+
+
+    def save(self, path):
+        """Saves the tables to a .npz file. The file is written to a
+        temporary path first, so that processes sharing the file never read
+        it half written.
+
+        Args:
+            path (str):
+        """
+        tempPath = "{}.{}.tmp".format(path, os.getpid())
+        with open(tempPath, "wb") as f:
+            np.savez(f, aliasProbs=self.aliasProbs, aliases=self.aliases)
+        os.replace(tempPath, path)
+
+
+    def getNumTriads(self):
+        return self.aliasProbs.shape[-1]
+
+
+    def decideTriad(self, previousTriadIndex, metricalAccentLevel,
+                    random=None):
+        """Decides a triad with one random number
+
+        Args:
+            previousTriadIndex (int): Index of the previous triad, or None
+                                      for the first chord
+            metricalAccentLevel (int):
+            random (random.Random): If None, the active random manager
+
+        Returns:
+            triadIndex (int):
+        """
+        if previousTriadIndex is None:
+            previousTriadIndex = -1
+        aliasProbs = self.aliasProbs[metricalAccentLevel, previousTriadIndex]
+
+        numTriads = len(aliasProbs)
+        scaled = getRandom(random).random() * numTriads
+        index = int(scaled)
+
+        # guard against r rounding up to the number of triads
+        if index >= numTriads:
+            index = numTriads - 1
+        if scaled - index >= aliasProbs[index]:
+            index = int(self.aliases[metricalAccentLevel, previousTriadIndex,
+                                     index])
+        return index
@@ -91,7 +91,7 @@ class ChordProfile(object):
         if quality not in chordProfileData[scale]:
             raise ValueError("%s chord profile quality is not available for "
                              "%s scale" % (quality, scale))
-        self.scale = Scale(scale)
+        self.scale = Scale.get(scale)
         self.quality = quality
         self.scores = chordProfileData[scale][quality]["scores"]
         self.cadenceProb = chordProfileData[scale][quality]["cadenceProb"]
@@ -1,8 +1,47 @@
+from musiclib.ticks import TICKSPERQUARTER, convertTicks, durationToTicks, \
+    ticksToDuration
+
+
 class Event(object):
-    def __init__(self, onset=0.0, duration=1.0):
+    """Event is something which happens in time, like a chord. Its onset and
+    duration are stored in integer ticks, and the onset and duration in
+    quarter notes are derived from them.
+
+    Attributes:
+        onsetTicks (int):
+        durationTicks (int):
+        ticksPerQuarter (int): Resolution of the ticks
+        onset (float): Onset in quarter notes
+        duration (float): Duration in quarter notes
+    """
+
+    def __init__(self, onset=0.0, duration=1.0,
+                 ticksPerQuarter=TICKSPERQUARTER, onsetTicks=None,
+                 durationTicks=None):
         super(Event, self).__init__()
-        self.onset = onset
-        self.duration = duration
+        self.ticksPerQuarter = ticksPerQuarter
+        if onsetTicks is None:
+            onsetTicks = durationToTicks(onset, ticksPerQuarter)
+        if durationTicks is None:
+            durationTicks = durationToTicks(duration, ticksPerQuarter)
+        self.onsetTicks = int(onsetTicks)
+        self.durationTicks = int(durationTicks)
+
+    @property
+    def onset(self):
+        return ticksToDuration(self.onsetTicks, self.ticksPerQuarter)
+
+    @onset.setter
+    def onset(self, onset):
+        self.onsetTicks = durationToTicks(onset, self.ticksPerQuarter)
+
+    @property
+    def duration(self):
+        return ticksToDuration(self.durationTicks, self.ticksPerQuarter)
+
+    @duration.setter
+    def duration(self, duration):
+        self.durationTicks = durationToTicks(duration, self.ticksPerQuarter)
 
     def getOnset(self):
         return self.onset
@@ -10,6 +49,27 @@ class Event(object):
     def getDuration(self):
         return self.duration
 
+    def getOnsetTicks(self, ticksPerQuarter=None):
+        if ticksPerQuarter is None:
+            return self.onsetTicks
+        return convertTicks(self.onsetTicks, self.ticksPerQuarter,
+                            ticksPerQuarter)
+
+    def getDurationTicks(self, ticksPerQuarter=None):
+        if ticksPerQuarter is None:
+            return self.durationTicks
+        return convertTicks(self.durationTicks, self.ticksPerQuarter,
+                            ticksPerQuarter)
+
+    def getTicksPerQuarter(self):
+        return self.ticksPerQuarter
+
+    def setOnsetTicks(self, onsetTicks):
+        self.onsetTicks = int(onsetTicks)
+
+    def setDurationTicks(self, durationTicks):
+        self.durationTicks = int(durationTicks)
+
     def setOnset(self, onset):
         if isinstance(onset, int):
             self.onset = onset
@@ -1,9 +1,15 @@
+import hashlib
+import os
+from collections import OrderedDict
+import numpy as np
 from .chordprofile import ChordProfile
 from .chord import Chord
+from .chorddecisiontables import ChordDecisionTables, quantizeFeature, \
+    getGridValue
 from ..rhythmgenerator import RhythmGenerator
 from ..probability import *
+from ..ticks import TICKSPERQUARTER, ticksToDuration
 from melodrive.maths.scaling import linlin
-from melodrive.stats.randommanager import RandomManager
 from music21.stream import Stream
 from music21.note import Note
 
@@ -11,57 +17,16 @@ from music21.note import Note
 MINEMOTIONALFEATURES = -0.72
 MAXEMOTIONALFEATURES = 0.72
 
+# decoders of the chord progressions. GREEDY decides a chord at a time,
+# VITERBI finds the best scoring progression and SAMPLE draws a progression
+# with probability proportional to its score
+GREEDY = "greedy"
+VITERBI = "viterbi"
+SAMPLE = "sample"
 
-commonChordTonesTriads= {
-    '0+-': {'0+-': 3, '0-+': 2, '0++': 2, '0--': 1, '1+-': 0, '1-+': 1, '1++': 0, '1--': 2, '2+-': 0, '2-+': 0, '2++': 0, '2--': 0, '3+-': 1, '3-+': 0, '3++': 1, '3--': 0, '4+-': 1, '4-+': 2, '4++': 2, '4--': 2, '5+-': 1, '5-+': 1, '5++': 0, '5--': 0, '6+-': 0, '6-+': 0, '6++': 0, '6--': 1, '7+-': 1, '7-+': 1, '7++': 1, '7--': 1, '8+-': 1, '8-+': 0, '8++': 2, '8--': 0, '9+-': 1, '9-+': 2, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 1, 'b--': 0},
-    '0-+': {'0+-': 2, '0-+': 3, '0++': 1, '0--': 2, '1+-': 0, '1-+': 0, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 0, '2--': 0, '3+-': 2, '3-+': 1, '3++': 2, '3--': 1, '4+-': 0, '4-+': 1, '4++': 1, '4--': 1, '5+-': 1, '5-+': 1, '5++': 0, '5--': 0, '6+-': 0, '6-+': 0, '6++': 0, '6--': 1, '7+-': 1, '7-+': 1, '7++': 2, '7--': 1, '8+-': 2, '8-+': 1, '8++': 1, '8--': 0, '9+-': 0, '9-+': 1, '9++': 0, '9--': 2, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 0, 'b+-': 1, 'b-+': 0, 'b++': 2, 'b--': 0},
-    '0++': {'0+-': 2, '0-+': 1, '0++': 3, '0--': 1, '1+-': 1, '1-+': 2, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 0, '3--': 0, '4+-': 2, '4-+': 1, '4++': 3, '4--': 1, '5+-': 1, '5-+': 2, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 0, '7--': 0, '8+-': 2, '8-+': 1, '8++': 3, '8--': 1, '9+-': 1, '9-+': 2, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 0},
-    '0--': {'0+-': 1, '0-+': 2, '0++': 1, '0--': 3, '1+-': 0, '1-+': 0, '1++': 0, '1--': 0, '2+-': 1, '2-+': 0, '2++': 1, '2--': 0, '3+-': 1, '3-+': 2, '3++': 1, '3--': 2, '4+-': 0, '4-+': 0, '4++': 1, '4--': 0, '5+-': 1, '5-+': 1, '5++': 0, '5--': 0, '6+-': 1, '6-+': 1, '6++': 1, '6--': 2, '7+-': 0, '7-+': 0, '7++': 1, '7--': 0, '8+-': 2, '8-+': 1, '8++': 1, '8--': 0, '9+-': 0, '9-+': 1, '9++': 0, '9--': 2, 'a+-': 0, 'a-+': 0, 'a++': 1, 'a--': 0, 'b+-': 2, 'b-+': 1, 'b++': 1, 'b--': 0},
-    '1+-': {'0+-': 0, '0-+': 0, '0++': 1, '0--': 0, '1+-': 3, '1-+': 2, '1++': 2, '1--': 1, '2+-': 0, '2-+': 1, '2++': 0, '2--': 2, '3+-': 0, '3-+': 0, '3++': 0, '3--': 0, '4+-': 1, '4-+': 0, '4++': 1, '4--': 0, '5+-': 1, '5-+': 2, '5++': 2, '5--': 2, '6+-': 1, '6-+': 1, '6++': 0, '6--': 0, '7+-': 0, '7-+': 0, '7++': 0, '7--': 1, '8+-': 1, '8-+': 1, '8++': 1, '8--': 1, '9+-': 1, '9-+': 0, '9++': 2, '9--': 0, 'a+-': 1, 'a-+': 2, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 1},
-    '1-+': {'0+-': 1, '0-+': 0, '0++': 2, '0--': 0, '1+-': 2, '1-+': 3, '1++': 1, '1--': 2, '2+-': 0, '2-+': 0, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 0, '3--': 0, '4+-': 2, '4-+': 1, '4++': 2, '4--': 1, '5+-': 0, '5-+': 1, '5++': 1, '5--': 1, '6+-': 1, '6-+': 1, '6++': 0, '6--': 0, '7+-': 0, '7-+': 0, '7++': 0, '7--': 1, '8+-': 1, '8-+': 1, '8++': 2, '8--': 1, '9+-': 2, '9-+': 1, '9++': 1, '9--': 0, 'a+-': 0, 'a-+': 1, 'a++': 0, 'a--': 2, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 0},
-    '1++': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 0, '1+-': 2, '1-+': 1, '1++': 3, '1--': 1, '2+-': 1, '2-+': 2, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 0, '4--': 0, '5+-': 2, '5-+': 1, '5++': 3, '5--': 1, '6+-': 1, '6-+': 2, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 0, '8--': 0, '9+-': 2, '9-+': 1, '9++': 3, '9--': 1, 'a+-': 1, 'a-+': 2, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 1},
-    '1--': {'0+-': 2, '0-+': 1, '0++': 1, '0--': 0, '1+-': 1, '1-+': 2, '1++': 1, '1--': 3, '2+-': 0, '2-+': 0, '2++': 0, '2--': 0, '3+-': 1, '3-+': 0, '3++': 1, '3--': 0, '4+-': 1, '4-+': 2, '4++': 1, '4--': 2, '5+-': 0, '5-+': 0, '5++': 1, '5--': 0, '6+-': 1, '6-+': 1, '6++': 0, '6--': 0, '7+-': 1, '7-+': 1, '7++': 1, '7--': 2, '8+-': 0, '8-+': 0, '8++': 1, '8--': 0, '9+-': 2, '9-+': 1, '9++': 1, '9--': 0, 'a+-': 0, 'a-+': 1, 'a++': 0, 'a--': 2, 'b+-': 0, 'b-+': 0, 'b++': 1, 'b--': 0},
-    '2+-': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 1, '1--': 0, '2+-': 3, '2-+': 2, '2++': 2, '2--': 1, '3+-': 0, '3-+': 1, '3++': 0, '3--': 2, '4+-': 0, '4-+': 0, '4++': 0, '4--': 0, '5+-': 1, '5-+': 0, '5++': 1, '5--': 0, '6+-': 1, '6-+': 2, '6++': 2, '6--': 2, '7+-': 1, '7-+': 1, '7++': 0, '7--': 0, '8+-': 0, '8-+': 0, '8++': 0, '8--': 1, '9+-': 1, '9-+': 1, '9++': 1, '9--': 1, 'a+-': 1, 'a-+': 0, 'a++': 2, 'a--': 0, 'b+-': 1, 'b-+': 2, 'b++': 0, 'b--': 1},
-    '2-+': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 0, '1+-': 1, '1-+': 0, '1++': 2, '1--': 0, '2+-': 2, '2-+': 3, '2++': 1, '2--': 2, '3+-': 0, '3-+': 0, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 0, '4--': 0, '5+-': 2, '5-+': 1, '5++': 2, '5--': 1, '6+-': 0, '6-+': 1, '6++': 1, '6--': 1, '7+-': 1, '7-+': 1, '7++': 0, '7--': 0, '8+-': 0, '8-+': 0, '8++': 0, '8--': 1, '9+-': 1, '9-+': 1, '9++': 2, '9--': 1, 'a+-': 2, 'a-+': 1, 'a++': 1, 'a--': 0, 'b+-': 0, 'b-+': 1, 'b++': 0, 'b--': 2},
-    '2++': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 0, '1--': 0, '2+-': 2, '2-+': 1, '2++': 3, '2--': 1, '3+-': 1, '3-+': 2, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 0, '5--': 0, '6+-': 2, '6-+': 1, '6++': 3, '6--': 1, '7+-': 1, '7-+': 2, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 0, '9--': 0, 'a+-': 2, 'a-+': 1, 'a++': 3, 'a--': 1, 'b+-': 1, 'b-+': 2, 'b++': 0, 'b--': 1},
-    '2--': {'0+-': 0, '0-+': 0, '0++': 1, '0--': 0, '1+-': 2, '1-+': 1, '1++': 1, '1--': 0, '2+-': 1, '2-+': 2, '2++': 1, '2--': 3, '3+-': 0, '3-+': 0, '3++': 0, '3--': 0, '4+-': 1, '4-+': 0, '4++': 1, '4--': 0, '5+-': 1, '5-+': 2, '5++': 1, '5--': 2, '6+-': 0, '6-+': 0, '6++': 1, '6--': 0, '7+-': 1, '7-+': 1, '7++': 0, '7--': 0, '8+-': 1, '8-+': 1, '8++': 1, '8--': 2, '9+-': 0, '9-+': 0, '9++': 1, '9--': 0, 'a+-': 2, 'a-+': 1, 'a++': 1, 'a--': 0, 'b+-': 0, 'b-+': 1, 'b++': 0, 'b--': 2},
-    '3+-': {'0+-': 1, '0-+': 2, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 1, '2--': 0, '3+-': 3, '3-+': 2, '3++': 2, '3--': 1, '4+-': 0, '4-+': 1, '4++': 0, '4--': 2, '5+-': 0, '5-+': 0, '5++': 0, '5--': 0, '6+-': 1, '6-+': 0, '6++': 1, '6--': 0, '7+-': 1, '7-+': 2, '7++': 2, '7--': 2, '8+-': 1, '8-+': 1, '8++': 0, '8--': 0, '9+-': 0, '9-+': 0, '9++': 0, '9--': 1, 'a+-': 1, 'a-+': 1, 'a++': 1, 'a--': 1, 'b+-': 1, 'b-+': 0, 'b++': 2, 'b--': 0},
-    '3-+': {'0+-': 0, '0-+': 1, '0++': 0, '0--': 2, '1+-': 0, '1-+': 0, '1++': 0, '1--': 0, '2+-': 1, '2-+': 0, '2++': 2, '2--': 0, '3+-': 2, '3-+': 3, '3++': 1, '3--': 2, '4+-': 0, '4-+': 0, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 0, '5--': 0, '6+-': 2, '6-+': 1, '6++': 2, '6--': 1, '7+-': 0, '7-+': 1, '7++': 1, '7--': 1, '8+-': 1, '8-+': 1, '8++': 0, '8--': 0, '9+-': 0, '9-+': 0, '9++': 0, '9--': 1, 'a+-': 1, 'a-+': 1, 'a++': 2, 'a--': 1, 'b+-': 2, 'b-+': 1, 'b++': 1, 'b--': 0},
-    '3++': {'0+-': 1, '0-+': 2, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 0, '2--': 0, '3+-': 2, '3-+': 1, '3++': 3, '3--': 1, '4+-': 1, '4-+': 2, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 0, '6--': 0, '7+-': 2, '7-+': 1, '7++': 3, '7--': 1, '8+-': 1, '8-+': 2, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 0, 'b+-': 2, 'b-+': 1, 'b++': 3, 'b--': 1},
-    '3--': {'0+-': 0, '0-+': 1, '0++': 0, '0--': 2, '1+-': 0, '1-+': 0, '1++': 1, '1--': 0, '2+-': 2, '2-+': 1, '2++': 1, '2--': 0, '3+-': 1, '3-+': 2, '3++': 1, '3--': 3, '4+-': 0, '4-+': 0, '4++': 0, '4--': 0, '5+-': 1, '5-+': 0, '5++': 1, '5--': 0, '6+-': 1, '6-+': 2, '6++': 1, '6--': 2, '7+-': 0, '7-+': 0, '7++': 1, '7--': 0, '8+-': 1, '8-+': 1, '8++': 0, '8--': 0, '9+-': 1, '9-+': 1, '9++': 1, '9--': 2, 'a+-': 0, 'a-+': 0, 'a++': 1, 'a--': 0, 'b+-': 2, 'b-+': 1, 'b++': 1, 'b--': 0},
-    '4+-': {'0+-': 1, '0-+': 0, '0++': 2, '0--': 0, '1+-': 1, '1-+': 2, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 1, '3--': 0, '4+-': 3, '4-+': 2, '4++': 2, '4--': 1, '5+-': 0, '5-+': 1, '5++': 0, '5--': 2, '6+-': 0, '6-+': 0, '6++': 0, '6--': 0, '7+-': 1, '7-+': 0, '7++': 1, '7--': 0, '8+-': 1, '8-+': 2, '8++': 2, '8--': 2, '9+-': 1, '9-+': 1, '9++': 0, '9--': 0, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 1, 'b+-': 1, 'b-+': 1, 'b++': 1, 'b--': 1},
-    '4-+': {'0+-': 2, '0-+': 1, '0++': 1, '0--': 0, '1+-': 0, '1-+': 1, '1++': 0, '1--': 2, '2+-': 0, '2-+': 0, '2++': 0, '2--': 0, '3+-': 1, '3-+': 0, '3++': 2, '3--': 0, '4+-': 2, '4-+': 3, '4++': 1, '4--': 2, '5+-': 0, '5-+': 0, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 0, '6--': 0, '7+-': 2, '7-+': 1, '7++': 2, '7--': 1, '8+-': 0, '8-+': 1, '8++': 1, '8--': 1, '9+-': 1, '9-+': 1, '9++': 0, '9--': 0, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 1, 'b+-': 1, 'b-+': 1, 'b++': 2, 'b--': 1},
-    '4++': {'0+-': 2, '0-+': 1, '0++': 3, '0--': 1, '1+-': 1, '1-+': 2, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 0, '3--': 0, '4+-': 2, '4-+': 1, '4++': 3, '4--': 1, '5+-': 1, '5-+': 2, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 0, '7--': 0, '8+-': 2, '8-+': 1, '8++': 3, '8--': 1, '9+-': 1, '9-+': 2, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 0},
-    '4--': {'0+-': 2, '0-+': 1, '0++': 1, '0--': 0, '1+-': 0, '1-+': 1, '1++': 0, '1--': 2, '2+-': 0, '2-+': 0, '2++': 1, '2--': 0, '3+-': 2, '3-+': 1, '3++': 1, '3--': 0, '4+-': 1, '4-+': 2, '4++': 1, '4--': 3, '5+-': 0, '5-+': 0, '5++': 0, '5--': 0, '6+-': 1, '6-+': 0, '6++': 1, '6--': 0, '7+-': 1, '7-+': 2, '7++': 1, '7--': 2, '8+-': 0, '8-+': 0, '8++': 1, '8--': 0, '9+-': 1, '9-+': 1, '9++': 0, '9--': 0, 'a+-': 1, 'a-+': 1, 'a++': 1, 'a--': 2, 'b+-': 0, 'b-+': 0, 'b++': 1, 'b--': 0},
-    '5+-': {'0+-': 1, '0-+': 1, '0++': 1, '0--': 1, '1+-': 1, '1-+': 0, '1++': 2, '1--': 0, '2+-': 1, '2-+': 2, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 1, '4--': 0, '5+-': 3, '5-+': 2, '5++': 2, '5--': 1, '6+-': 0, '6-+': 1, '6++': 0, '6--': 2, '7+-': 0, '7-+': 0, '7++': 0, '7--': 0, '8+-': 1, '8-+': 0, '8++': 1, '8--': 0, '9+-': 1, '9-+': 2, '9++': 2, '9--': 2, 'a+-': 1, 'a-+': 1, 'a++': 0, 'a--': 0, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 1},
-    '5-+': {'0+-': 1, '0-+': 1, '0++': 2, '0--': 1, '1+-': 2, '1-+': 1, '1++': 1, '1--': 0, '2+-': 0, '2-+': 1, '2++': 0, '2--': 2, '3+-': 0, '3-+': 0, '3++': 0, '3--': 0, '4+-': 1, '4-+': 0, '4++': 2, '4--': 0, '5+-': 2, '5-+': 3, '5++': 1, '5--': 2, '6+-': 0, '6-+': 0, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 0, '7--': 0, '8+-': 2, '8-+': 1, '8++': 2, '8--': 1, '9+-': 0, '9-+': 1, '9++': 1, '9--': 1, 'a+-': 1, 'a-+': 1, 'a++': 0, 'a--': 0, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 1},
-    '5++': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 0, '1+-': 2, '1-+': 1, '1++': 3, '1--': 1, '2+-': 1, '2-+': 2, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 0, '4--': 0, '5+-': 2, '5-+': 1, '5++': 3, '5--': 1, '6+-': 1, '6-+': 2, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 0, '8--': 0, '9+-': 2, '9-+': 1, '9++': 3, '9--': 1, 'a+-': 1, 'a-+': 2, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 1},
-    '5--': {'0+-': 0, '0-+': 0, '0++': 1, '0--': 0, '1+-': 2, '1-+': 1, '1++': 1, '1--': 0, '2+-': 0, '2-+': 1, '2++': 0, '2--': 2, '3+-': 0, '3-+': 0, '3++': 1, '3--': 0, '4+-': 2, '4-+': 1, '4++': 1, '4--': 0, '5+-': 1, '5-+': 2, '5++': 1, '5--': 3, '6+-': 0, '6-+': 0, '6++': 0, '6--': 0, '7+-': 1, '7-+': 0, '7++': 1, '7--': 0, '8+-': 1, '8-+': 2, '8++': 1, '8--': 2, '9+-': 0, '9-+': 0, '9++': 1, '9--': 0, 'a+-': 1, 'a-+': 1, 'a++': 0, 'a--': 0, 'b+-': 1, 'b-+': 1, 'b++': 1, 'b--': 2},
-    '6+-': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 1, '1+-': 1, '1-+': 1, '1++': 1, '1--': 1, '2+-': 1, '2-+': 0, '2++': 2, '2--': 0, '3+-': 1, '3-+': 2, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 1, '5--': 0, '6+-': 3, '6-+': 2, '6++': 2, '6--': 1, '7+-': 0, '7-+': 1, '7++': 0, '7--': 2, '8+-': 0, '8-+': 0, '8++': 0, '8--': 0, '9+-': 1, '9-+': 0, '9++': 1, '9--': 0, 'a+-': 1, 'a-+': 2, 'a++': 2, 'a--': 2, 'b+-': 1, 'b-+': 1, 'b++': 0, 'b--': 0},
-    '6-+': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 1, '1+-': 1, '1-+': 1, '1++': 2, '1--': 1, '2+-': 2, '2-+': 1, '2++': 1, '2--': 0, '3+-': 0, '3-+': 1, '3++': 0, '3--': 2, '4+-': 0, '4-+': 0, '4++': 0, '4--': 0, '5+-': 1, '5-+': 0, '5++': 2, '5--': 0, '6+-': 2, '6-+': 3, '6++': 1, '6--': 2, '7+-': 0, '7-+': 0, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 0, '8--': 0, '9+-': 2, '9-+': 1, '9++': 2, '9--': 1, 'a+-': 0, 'a-+': 1, 'a++': 1, 'a--': 1, 'b+-': 1, 'b-+': 1, 'b++': 0, 'b--': 0},
-    '6++': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 0, '1--': 0, '2+-': 2, '2-+': 1, '2++': 3, '2--': 1, '3+-': 1, '3-+': 2, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 0, '5--': 0, '6+-': 2, '6-+': 1, '6++': 3, '6--': 1, '7+-': 1, '7-+': 2, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 0, '9--': 0, 'a+-': 2, 'a-+': 1, 'a++': 3, 'a--': 1, 'b+-': 1, 'b-+': 2, 'b++': 0, 'b--': 1},
-    '6--': {'0+-': 1, '0-+': 1, '0++': 1, '0--': 2, '1+-': 0, '1-+': 0, '1++': 1, '1--': 0, '2+-': 2, '2-+': 1, '2++': 1, '2--': 0, '3+-': 0, '3-+': 1, '3++': 0, '3--': 2, '4+-': 0, '4-+': 0, '4++': 1, '4--': 0, '5+-': 2, '5-+': 1, '5++': 1, '5--': 0, '6+-': 1, '6-+': 2, '6++': 1, '6--': 3, '7+-': 0, '7-+': 0, '7++': 0, '7--': 0, '8+-': 1, '8-+': 0, '8++': 1, '8--': 0, '9+-': 1, '9-+': 2, '9++': 1, '9--': 2, 'a+-': 0, 'a-+': 0, 'a++': 1, 'a--': 0, 'b+-': 1, 'b-+': 1, 'b++': 0, 'b--': 0},
-    '7+-': {'0+-': 1, '0-+': 1, '0++': 0, '0--': 0, '1+-': 0, '1-+': 0, '1++': 0, '1--': 1, '2+-': 1, '2-+': 1, '2++': 1, '2--': 1, '3+-': 1, '3-+': 0, '3++': 2, '3--': 0, '4+-': 1, '4-+': 2, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 1, '6--': 0, '7+-': 3, '7-+': 2, '7++': 2, '7--': 1, '8+-': 0, '8-+': 1, '8++': 0, '8--': 2, '9+-': 0, '9-+': 0, '9++': 0, '9--': 0, 'a+-': 1, 'a-+': 0, 'a++': 1, 'a--': 0, 'b+-': 1, 'b-+': 2, 'b++': 2, 'b--': 2},
-    '7-+': {'0+-': 1, '0-+': 1, '0++': 0, '0--': 0, '1+-': 0, '1-+': 0, '1++': 0, '1--': 1, '2+-': 1, '2-+': 1, '2++': 2, '2--': 1, '3+-': 2, '3-+': 1, '3++': 1, '3--': 0, '4+-': 0, '4-+': 1, '4++': 0, '4--': 2, '5+-': 0, '5-+': 0, '5++': 0, '5--': 0, '6+-': 1, '6-+': 0, '6++': 2, '6--': 0, '7+-': 2, '7-+': 3, '7++': 1, '7--': 2, '8+-': 0, '8-+': 0, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 0, '9--': 0, 'a+-': 2, 'a-+': 1, 'a++': 2, 'a--': 1, 'b+-': 0, 'b-+': 1, 'b++': 1, 'b--': 1},
-    '7++': {'0+-': 1, '0-+': 2, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 0, '2--': 0, '3+-': 2, '3-+': 1, '3++': 3, '3--': 1, '4+-': 1, '4-+': 2, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 0, '6--': 0, '7+-': 2, '7-+': 1, '7++': 3, '7--': 1, '8+-': 1, '8-+': 2, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 0, 'b+-': 2, 'b-+': 1, 'b++': 3, 'b--': 1},
-    '7--': {'0+-': 1, '0-+': 1, '0++': 0, '0--': 0, '1+-': 1, '1-+': 1, '1++': 1, '1--': 2, '2+-': 0, '2-+': 0, '2++': 1, '2--': 0, '3+-': 2, '3-+': 1, '3++': 1, '3--': 0, '4+-': 0, '4-+': 1, '4++': 0, '4--': 2, '5+-': 0, '5-+': 0, '5++': 1, '5--': 0, '6+-': 2, '6-+': 1, '6++': 1, '6--': 0, '7+-': 1, '7-+': 2, '7++': 1, '7--': 3, '8+-': 0, '8-+': 0, '8++': 0, '8--': 0, '9+-': 1, '9-+': 0, '9++': 1, '9--': 0, 'a+-': 1, 'a-+': 2, 'a++': 1, 'a--': 2, 'b+-': 0, 'b-+': 0, 'b++': 1, 'b--': 0},
-    '8+-': {'0+-': 1, '0-+': 2, '0++': 2, '0--': 2, '1+-': 1, '1-+': 1, '1++': 0, '1--': 0, '2+-': 0, '2-+': 0, '2++': 0, '2--': 1, '3+-': 1, '3-+': 1, '3++': 1, '3--': 1, '4+-': 1, '4-+': 0, '4++': 2, '4--': 0, '5+-': 1, '5-+': 2, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 1, '7--': 0, '8+-': 3, '8-+': 2, '8++': 2, '8--': 1, '9+-': 0, '9-+': 1, '9++': 0, '9--': 2, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 0, 'b+-': 1, 'b-+': 0, 'b++': 1, 'b--': 0},
-    '8-+': {'0+-': 0, '0-+': 1, '0++': 1, '0--': 1, '1+-': 1, '1-+': 1, '1++': 0, '1--': 0, '2+-': 0, '2-+': 0, '2++': 0, '2--': 1, '3+-': 1, '3-+': 1, '3++': 2, '3--': 1, '4+-': 2, '4-+': 1, '4++': 1, '4--': 0, '5+-': 0, '5-+': 1, '5++': 0, '5--': 2, '6+-': 0, '6-+': 0, '6++': 0, '6--': 0, '7+-': 1, '7-+': 0, '7++': 2, '7--': 0, '8+-': 2, '8-+': 3, '8++': 1, '8--': 2, '9+-': 0, '9-+': 0, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 0, 'b+-': 2, 'b-+': 1, 'b++': 2, 'b--': 1},
-    '8++': {'0+-': 2, '0-+': 1, '0++': 3, '0--': 1, '1+-': 1, '1-+': 2, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 0, '3--': 0, '4+-': 2, '4-+': 1, '4++': 3, '4--': 1, '5+-': 1, '5-+': 2, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 0, '7--': 0, '8+-': 2, '8-+': 1, '8++': 3, '8--': 1, '9+-': 1, '9-+': 2, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 0},
-    '8--': {'0+-': 0, '0-+': 0, '0++': 1, '0--': 0, '1+-': 1, '1-+': 1, '1++': 0, '1--': 0, '2+-': 1, '2-+': 1, '2++': 1, '2--': 2, '3+-': 0, '3-+': 0, '3++': 1, '3--': 0, '4+-': 2, '4-+': 1, '4++': 1, '4--': 0, '5+-': 0, '5-+': 1, '5++': 0, '5--': 2, '6+-': 0, '6-+': 0, '6++': 1, '6--': 0, '7+-': 2, '7-+': 1, '7++': 1, '7--': 0, '8+-': 1, '8-+': 2, '8++': 1, '8--': 3, '9+-': 0, '9-+': 0, '9++': 0, '9--': 0, 'a+-': 1, 'a-+': 0, 'a++': 1, 'a--': 0, 'b+-': 1, 'b-+': 2, 'b++': 1, 'b--': 2},
-    '9+-': {'0+-': 1, '0-+': 0, '0++': 1, '0--': 0, '1+-': 1, '1-+': 2, '1++': 2, '1--': 2, '2+-': 1, '2-+': 1, '2++': 0, '2--': 0, '3+-': 0, '3-+': 0, '3++': 0, '3--': 1, '4+-': 1, '4-+': 1, '4++': 1, '4--': 1, '5+-': 1, '5-+': 0, '5++': 2, '5--': 0, '6+-': 1, '6-+': 2, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 1, '8--': 0, '9+-': 3, '9-+': 2, '9++': 2, '9--': 1, 'a+-': 0, 'a-+': 1, 'a++': 0, 'a--': 2, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 0},
-    '9-+': {'0+-': 2, '0-+': 1, '0++': 2, '0--': 1, '1+-': 0, '1-+': 1, '1++': 1, '1--': 1, '2+-': 1, '2-+': 1, '2++': 0, '2--': 0, '3+-': 0, '3-+': 0, '3++': 0, '3--': 1, '4+-': 1, '4-+': 1, '4++': 2, '4--': 1, '5+-': 2, '5-+': 1, '5++': 1, '5--': 0, '6+-': 0, '6-+': 1, '6++': 0, '6--': 2, '7+-': 0, '7-+': 0, '7++': 0, '7--': 0, '8+-': 1, '8-+': 0, '8++': 2, '8--': 0, '9+-': 2, '9-+': 3, '9++': 1, '9--': 2, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 0},
-    '9++': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 0, '1+-': 2, '1-+': 1, '1++': 3, '1--': 1, '2+-': 1, '2-+': 2, '2++': 0, '2--': 1, '3+-': 0, '3-+': 0, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 0, '4--': 0, '5+-': 2, '5-+': 1, '5++': 3, '5--': 1, '6+-': 1, '6-+': 2, '6++': 0, '6--': 1, '7+-': 0, '7-+': 0, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 0, '8--': 0, '9+-': 2, '9-+': 1, '9++': 3, '9--': 1, 'a+-': 1, 'a-+': 2, 'a++': 0, 'a--': 1, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 1},
-    '9--': {'0+-': 1, '0-+': 2, '0++': 1, '0--': 2, '1+-': 0, '1-+': 0, '1++': 1, '1--': 0, '2+-': 1, '2-+': 1, '2++': 0, '2--': 0, '3+-': 1, '3-+': 1, '3++': 1, '3--': 2, '4+-': 0, '4-+': 0, '4++': 1, '4--': 0, '5+-': 2, '5-+': 1, '5++': 1, '5--': 0, '6+-': 0, '6-+': 1, '6++': 0, '6--': 2, '7+-': 0, '7-+': 0, '7++': 1, '7--': 0, '8+-': 2, '8-+': 1, '8++': 1, '8--': 0, '9+-': 1, '9-+': 2, '9++': 1, '9--': 3, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 0, 'b+-': 1, 'b-+': 0, 'b++': 1, 'b--': 0},
-    'a+-': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 0, '1+-': 1, '1-+': 0, '1++': 1, '1--': 0, '2+-': 1, '2-+': 2, '2++': 2, '2--': 2, '3+-': 1, '3-+': 1, '3++': 0, '3--': 0, '4+-': 0, '4-+': 0, '4++': 0, '4--': 1, '5+-': 1, '5-+': 1, '5++': 1, '5--': 1, '6+-': 1, '6-+': 0, '6++': 2, '6--': 0, '7+-': 1, '7-+': 2, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 1, '9--': 0, 'a+-': 3, 'a-+': 2, 'a++': 2, 'a--': 1, 'b+-': 0, 'b-+': 1, 'b++': 0, 'b--': 2},
-    'a-+': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 0, '1+-': 2, '1-+': 1, '1++': 2, '1--': 1, '2+-': 0, '2-+': 1, '2++': 1, '2--': 1, '3+-': 1, '3-+': 1, '3++': 0, '3--': 0, '4+-': 0, '4-+': 0, '4++': 0, '4--': 1, '5+-': 1, '5-+': 1, '5++': 2, '5--': 1, '6+-': 2, '6-+': 1, '6++': 1, '6--': 0, '7+-': 0, '7-+': 1, '7++': 0, '7--': 2, '8+-': 0, '8-+': 0, '8++': 0, '8--': 0, '9+-': 1, '9-+': 0, '9++': 2, '9--': 0, 'a+-': 2, 'a-+': 3, 'a++': 1, 'a--': 2, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 1},
-    'a++': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 0, '1--': 0, '2+-': 2, '2-+': 1, '2++': 3, '2--': 1, '3+-': 1, '3-+': 2, '3++': 0, '3--': 1, '4+-': 0, '4-+': 0, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 0, '5--': 0, '6+-': 2, '6-+': 1, '6++': 3, '6--': 1, '7+-': 1, '7-+': 2, '7++': 0, '7--': 1, '8+-': 0, '8-+': 0, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 0, '9--': 0, 'a+-': 2, 'a-+': 1, 'a++': 3, 'a--': 1, 'b+-': 1, 'b-+': 2, 'b++': 0, 'b--': 1},
-    'a--': {'0+-': 1, '0-+': 0, '0++': 1, '0--': 0, '1+-': 1, '1-+': 2, '1++': 1, '1--': 2, '2+-': 0, '2-+': 0, '2++': 1, '2--': 0, '3+-': 1, '3-+': 1, '3++': 0, '3--': 0, '4+-': 1, '4-+': 1, '4++': 1, '4--': 2, '5+-': 0, '5-+': 0, '5++': 1, '5--': 0, '6+-': 2, '6-+': 1, '6++': 1, '6--': 0, '7+-': 0, '7-+': 1, '7++': 0, '7--': 2, '8+-': 0, '8-+': 0, '8++': 1, '8--': 0, '9+-': 2, '9-+': 1, '9++': 1, '9--': 0, 'a+-': 1, 'a-+': 2, 'a++': 1, 'a--': 3, 'b+-': 0, 'b-+': 0, 'b++': 0, 'b--': 0},
-    'b+-': {'0+-': 0, '0-+': 1, '0++': 0, '0--': 2, '1+-': 0, '1-+': 0, '1++': 0, '1--': 0, '2+-': 1, '2-+': 0, '2++': 1, '2--': 0, '3+-': 1, '3-+': 2, '3++': 2, '3--': 2, '4+-': 1, '4-+': 1, '4++': 0, '4--': 0, '5+-': 0, '5-+': 0, '5++': 0, '5--': 1, '6+-': 1, '6-+': 1, '6++': 1, '6--': 1, '7+-': 1, '7-+': 0, '7++': 2, '7--': 0, '8+-': 1, '8-+': 2, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 1, 'a--': 0, 'b+-': 3, 'b-+': 2, 'b++': 2, 'b--': 1},
-    'b-+': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 0, '1--': 0, '2+-': 2, '2-+': 1, '2++': 2, '2--': 1, '3+-': 0, '3-+': 1, '3++': 1, '3--': 1, '4+-': 1, '4-+': 1, '4++': 0, '4--': 0, '5+-': 0, '5-+': 0, '5++': 0, '5--': 1, '6+-': 1, '6-+': 1, '6++': 2, '6--': 1, '7+-': 2, '7-+': 1, '7++': 1, '7--': 0, '8+-': 0, '8-+': 1, '8++': 0, '8--': 2, '9+-': 0, '9-+': 0, '9++': 0, '9--': 0, 'a+-': 1, 'a-+': 0, 'a++': 2, 'a--': 0, 'b+-': 2, 'b-+': 3, 'b++': 1, 'b--': 2},
-    'b++': {'0+-': 1, '0-+': 2, '0++': 0, '0--': 1, '1+-': 0, '1-+': 0, '1++': 0, '1--': 1, '2+-': 0, '2-+': 0, '2++': 0, '2--': 0, '3+-': 2, '3-+': 1, '3++': 3, '3--': 1, '4+-': 1, '4-+': 2, '4++': 0, '4--': 1, '5+-': 0, '5-+': 0, '5++': 0, '5--': 1, '6+-': 0, '6-+': 0, '6++': 0, '6--': 0, '7+-': 2, '7-+': 1, '7++': 3, '7--': 1, '8+-': 1, '8-+': 2, '8++': 0, '8--': 1, '9+-': 0, '9-+': 0, '9++': 0, '9--': 1, 'a+-': 0, 'a-+': 0, 'a++': 0, 'a--': 0, 'b+-': 2, 'b-+': 1, 'b++': 3, 'b--': 1},
-    'b--': {'0+-': 0, '0-+': 0, '0++': 0, '0--': 0, '1+-': 1, '1-+': 0, '1++': 1, '1--': 0, '2+-': 1, '2-+': 2, '2++': 1, '2--': 2, '3+-': 0, '3-+': 0, '3++': 1, '3--': 0, '4+-': 1, '4-+': 1, '4++': 0, '4--': 0, '5+-': 1, '5-+': 1, '5++': 1, '5--': 2, '6+-': 0, '6-+': 0, '6++': 1, '6--': 0, '7+-': 2, '7-+': 1, '7++': 1, '7--': 0, '8+-': 0, '8-+': 1, '8++': 0, '8--': 2, '9+-': 0, '9-+': 0, '9++': 1, '9--': 0, 'a+-': 2, 'a-+': 1, 'a++': 1, 'a--': 0, 'b+-': 1, 'b-+': 2, 'b++': 1, 'b--': 3},
-}
+# max number of chord decision tables kept in memory, one for each chord
+# profile and point of the emotional feature grid
+DECISIONTABLESCACHESIZE = 64
 
 
 # Score that takes into account the number of common chords between 2 chords
@@ -123,37 +88,74 @@ harmonicComplexity = {
 #       Get config data from dataset?
 
 class HarmonyPitchGenerator(object):
-    def __init__(self):
+    """HarmonyPitchGenerator generates chord progressions for harmonic
+    rhythms
+
+    Attributes:
+        random (random.Random): Random context all the decisions of the
+                                generator are drawn from. If None, the active
+                                random manager
+        featureGridSize (int): If not None, the harmonic complexity and
+                               min/maj ratio are quantized to a grid of this
+                               many points, and the greedy decoder decides
+                               triads with precomputed decision tables
+        tablesDir (str): If not None, directory the decision tables are
+                         persisted to, so that they are only computed once
+                         across processes
+    """
+
+    def __init__(self, random=None, featureGridSize=None, tablesDir=None,
+                 tablesCacheSize=DECISIONTABLESCACHESIZE):
         super(HarmonyPitchGenerator, self).__init__()
+        if featureGridSize is not None and featureGridSize < 2:
+            raise ValueError("The feature grid needs at least 2 points")
+        self.random = random
+        self.featureGridSize = featureGridSize
+        self.tablesDir = tablesDir
+        self._decisionTablesCacheSize = tablesCacheSize
 
         self._triadConsonanceScores = triadConsonanceScores
         self._commonChordTonesScores = commonChordTonesScores
-        self._commonChordTonesTriads = commonChordTonesTriads
         self.chordProfile = ChordProfile()
         self._candidateTriads = self._initCandidateTriads()
         self._weightMetrics = weightMetrics
         self._profileDistanceMaxImpact = harmonicComplexity["profileDistanceMaxImpact"]
         self._dissonanceData = harmonicComplexity["dissonance"]
+        self._dissonanceTypeDistr = Distribution(
+            self._dissonanceData["probDissonanceType"], random)
         self._minMajRationMaxImpact = minMajorRatioMaxImpact
 
+        # scores of the candidate triads which don't depend on the emotional
+        # features, so that the scores of a chord are computed with array
+        # operations
+        self._compileScoreTables()
+
 
     def generateHarmonyPitchMU(self, harmonicRhythm, harmonicComplexity,
-                               minMajRatio, structureLevelMU):
+                               minMajRatio, structureLevelMU, show=True,
+                               decoder=GREEDY):
         """Generates a chord progression for a harmonic rhythm sequence
 
         Args:
-            harmonicRhythm (list): List containing RhythmTree objects
+            harmonicRhythm (RhythmSequence): Harmonic rhythm. Can also be a
+                                             list of RhythmTree objects
             harmonicComplexity (float): Value of emotional feature
             minMajRatio (float): Value of emotional feature
             structureLevelMU (str):
+            show (bool): If True, the progression is played as MIDI
+            decoder (str): GREEDY, VITERBI or SAMPLE
 
         Returns:
             chordProgression (list): List of Chord objects
         """
+        if decoder not in (GREEDY, VITERBI, SAMPLE):
+            raise ValueError("Unknown chord progression decoder: {}".format(
+                decoder))
+
         # decide whether to have cadence
         cadenceProbDict = self.chordProfile.getCadenceProb()
         cadenceProb = cadenceProbDict[structureLevelMU]
-        random = RandomManager.getActive()
+        random = getRandom(self.random)
         r = random.random()
 
         cadenceChordProgression = []
@@ -162,10 +164,41 @@ class HarmonyPitchGenerator(object):
             if len(cadenceChordProgression) == len(harmonicRhythm):
                 return cadenceChordProgression
 
+        if decoder == GREEDY:
             # remove as many durations from harmonicRhythm as the
             # number of chords used for the cadence
-            harmonicRhythm = harmonicRhythm[:-len(cadenceChordProgression)]
+            numChords = len(harmonicRhythm) - len(cadenceChordProgression)
+            chordProgression = self._decideGreedyProgression(
+                harmonicRhythm[:numChords], harmonicComplexity, minMajRatio)
+        else:
+            chordProgression = self._decideLatticeProgression(
+                harmonicRhythm, cadenceChordProgression, harmonicComplexity,
+                minMajRatio, decoder)
+
+        # add up chord progression and chords for cadence
+        chordProgression += cadenceChordProgression
+
+        if show:
+            s = self._realizeM21Sequence(chordProgression)
+            s.show("midi")
+
+        return chordProgression
+
+
+    def _decideGreedyProgression(self, harmonicRhythm, harmonicComplexity,
+                                 minMajRatio):
+        """Decides the chords of a harmonic rhythm one at a time, given the
+        previous chord
 
+        Args:
+            harmonicRhythm (RhythmSequence): Harmonic rhythm without the
+                                             cadence
+            harmonicComplexity (float): Value of emotional feature
+            minMajRatio (float): Value of emotional feature
+
+        Returns:
+            chordProgression (list): List of Chord objects
+        """
         chordProgression = []
         previousTriadCode = None
         chordIndex = None
@@ -173,32 +206,24 @@ class HarmonyPitchGenerator(object):
         # step through all durations forming the harmonic rhythm to assign
         # chord
         for durationObj in harmonicRhythm:
-            duration = durationObj.getDuration()
-            scale = self.chordProfile.getScale().getName()
             metricalAccentLevel = durationObj.getMetricalAccent()
 
-            # calculate scores
-            scores = self._calcMetrics(previousTriadCode, chordIndex, metricalAccentLevel,
-                                harmonicComplexity, minMajRatio)
-
-            # choose triad
-            chord, chordIndex = self._decideTriad(scores, durationObj)
-            code = chord.getCode()
-
-            # get probability of adding dissonant thirds
-            dissonanceProb = self._calcDissonanceProb(harmonicComplexity,
-                                        metricalAccentLevel)
-            r = random.random()
+            if self.featureGridSize is None:
+                # calculate scores
+                scores = self._calcMetrics(previousTriadCode, chordIndex, metricalAccentLevel,
+                                    harmonicComplexity, minMajRatio)
 
-            # decide whether to apply dissonance
-            if r <= dissonanceProb:
+                # choose triad
+                chord, chordIndex = self._decideTriad(scores, durationObj)
+            else:
+                chord, chordIndex = self._decideTriadFromTables(
+                    chordIndex, metricalAccentLevel, harmonicComplexity,
+                    minMajRatio, durationObj)
 
-                # add dissonance(s)
-                code = self._decideDissonance(chord)
-
-            # create new chord
-            newChord = Chord(code, duration=duration, scale=scale,
-                             octave=4)
+            # create new chord, with dissonance(s) depending on harmonic
+            # complexity
+            newChord = self._createProgressionChord(chord, durationObj,
+                                                    harmonicComplexity)
 
             # append chord to progression
             chordProgression.append(newChord)
@@ -207,43 +232,190 @@ class HarmonyPitchGenerator(object):
             previousCode = newChord.getCode()
             previousTriadCode = previousCode[:3]
 
-        # add up chord progression and chords for cadence
-        chordProgression += cadenceChordProgression
+        return chordProgression
+
+
+    def _decideLatticeProgression(self, harmonicRhythm,
+                                  cadenceChordProgression, harmonicComplexity,
+                                  minMajRatio, decoder):
+        """Decides the chords of a harmonic rhythm all at once, as a path of
+        the lattice of the candidate triads
 
-        s = self._realizeM21Sequence(chordProgression)
-        s.show("midi")
+        Args:
+            harmonicRhythm (RhythmSequence): Harmonic rhythm, with the
+                                             cadence
+            cadenceChordProgression (list): Chords of the cadence, which
+                                            end the path of the lattice
+            harmonicComplexity (float): Value of emotional feature
+            minMajRatio (float): Value of emotional feature
+            decoder (str): VITERBI or SAMPLE
+
+        Returns:
+            chordProgression (list): List of Chord objects, without the
+                                     cadence
+        """
+        initialWeights, transitionWeights = self._buildTriadLattice(
+            harmonicRhythm, cadenceChordProgression, harmonicComplexity,
+            minMajRatio)
+
+        if decoder == VITERBI:
+            path = decodeViterbi(initialWeights, transitionWeights)
+        else:
+            path = sampleForwardBackward(initialWeights, transitionWeights,
+                                         self.random)
 
+        scale = self.chordProfile.getScale().getName()
+        numChords = len(harmonicRhythm) - len(cadenceChordProgression)
+        chordProgression = []
+        for i in range(numChords):
+            durationObj = harmonicRhythm[i]
+            triad = self._candidateTriads[path[i]]
+            chord = self._createChord(triad.getCode(), durationObj, scale)
+            chordProgression.append(self._createProgressionChord(
+                chord, durationObj, harmonicComplexity))
         return chordProgression
 
 
+    def _buildTriadLattice(self, harmonicRhythm, cadenceChordProgression,
+                           harmonicComplexity, minMajRatio):
+        """Builds the lattice of the candidate triads of a harmonic rhythm.
+        The weight of a triad is scored like by the greedy decoder given the
+        previous triad, and a triad can't follow itself. The last steps are
+        constrained to the triads of the cadence.
+
+        Args:
+            harmonicRhythm (RhythmSequence): Harmonic rhythm, with the
+                                             cadence
+            cadenceChordProgression (list): Chords of the cadence
+            harmonicComplexity (float): Value of emotional feature
+            minMajRatio (float): Value of emotional feature
+
+        Returns:
+            initialWeights (numpy.ndarray): Weight of each triad of the first
+                chord
+            transitionWeights (numpy.ndarray): One matrix for each following
+                chord, from the previous triads (rows) to its triads
+                (columns)
+        """
+        numSteps = len(harmonicRhythm)
+        numChords = numSteps - len(cadenceChordProgression)
+        numTriads = len(self._candidateTriads)
+
+        # scores of the triads at each metrical accent level, which don't
+        # depend on the previous triad
+        a = self._weightMetrics["consonance"]
+        b = self._weightMetrics["profileProminence"]
+        c = self._weightMetrics["commonChordTones"]
+        levelScores = a * self._getConsonanceRows(minMajRatio) + \
+            b * self._getProminenceRows(harmonicComplexity)
+        metricalAccentLevels = np.array(
+            [durationObj.getMetricalAccent() for durationObj in
+             harmonicRhythm], dtype=np.intp)
+        scores = levelScores[metricalAccentLevels]
+
+        # the cadence chords are the only options of the last steps
+        allowed = np.ones((numSteps, numTriads), dtype=bool)
+        for i, chord in enumerate(cadenceChordProgression):
+            allowed[numChords + i] = False
+            allowed[numChords + i, self._triadIndexes[chord.getCode()[:3]]] \
+                = True
+        scores = np.where(allowed, scores, 0.0)
+
+        transitionWeights = scores[1:, np.newaxis, :] + \
+            c * self._commonChordTonesMatrix[np.newaxis, :, :]
+        transitionWeights *= allowed[1:, np.newaxis, :]
+
+        # chords can't be repeated, though the cadence can start with the
+        # previous chord
+        triadIndexes = np.arange(numTriads)
+        transitionWeights[:max(numChords - 1, 0), triadIndexes,
+                          triadIndexes] = 0
+
+        return scores[0], transitionWeights
+
+
+    def _createProgressionChord(self, chord, durationObj, harmonicComplexity):
+        """Creates the chord of a progression from a triad, deciding whether
+        to add dissonance(s) to it
+
+        Args:
+            chord (Chord): Triad
+            durationObj (RhythmTree):
+            harmonicComplexity (float): Value of emotional feature
+
+        Returns:
+            newChord (Chord):
+        """
+        code = chord.getCode()
+        scale = self.chordProfile.getScale().getName()
+
+        # get probability of adding dissonant thirds
+        dissonanceProb = self._calcDissonanceProb(
+            harmonicComplexity, durationObj.getMetricalAccent())
+        r = getRandom(self.random).random()
+
+        # decide whether to apply dissonance
+        if r <= dissonanceProb:
+
+            # add dissonance(s)
+            code = self._decideDissonance(chord)
+
+        return self._createChord(code, durationObj, scale, octave=4)
+
+
     def _decideDissonance(self, chord):
         """Adds dissonance 3rds to a triad modifying chord object
 
         Args:
             chord (Chord): Chord object
         """
-        # transform distr in normalised cumulative distr
-        distr = toNormalisedCumulativeDistrDict(self._dissonanceData["probDissonanceType"])
-        dissonanceType = decideCumulativeDistrOutcomeDict(distr)
+        # decide type of dissonance
+        dissonanceType = self._dissonanceTypeDistr.sampleCumulative()
 
         # add dissonance
         code = chord.assignDissonance(dissonanceType)
         return code
 
 
+    @staticmethod
+    def _createChord(code, durationObj, scale, octave=0):
+        """Creates a chord with the duration of an element of the harmonic
+        rhythm, keeping its ticks
+
+        Args:
+            code (str): Chord code
+            durationObj (RhythmSequenceElement): Element of the harmonic
+                                                 rhythm. Can also be a
+                                                 RhythmTree
+            scale (str): Name of the scale
+            octave (int):
+
+        Returns:
+            chord (Chord):
+        """
+        return Chord(code, scale=scale, octave=octave,
+                     durationTicks=durationObj.getDurationTicks(),
+                     ticksPerQuarter=durationObj.getTicksPerQuarter())
+
+
     def _realizeM21Sequence(self, chords):
         s = Stream()
 
-        offset = 0
+        # offsets are accumulated in the ticks of the first chord, and only
+        # converted into quarter notes for music21
+        offsetTicks = 0
+        ticksPerQuarter = TICKSPERQUARTER
+        if len(chords) > 0:
+            ticksPerQuarter = chords[0].getTicksPerQuarter()
 
         # step through the template and add notes to stream
         for chord in chords:
-            duration = chord.getDuration()
+            offset = ticksToDuration(offsetTicks, ticksPerQuarter)
             for pitch in chord.getPitchSet():
                 n = Note(pitch)
-                n.duration.quarterLength = duration
+                n.duration.quarterLength = chord.getDuration()
                 s.insert(offset, n)
-            offset += duration
+            offsetTicks += chord.getDurationTicks(ticksPerQuarter)
         return s
 
 
@@ -251,12 +423,13 @@ class HarmonyPitchGenerator(object):
         """Applies a stock cadence
 
         Args:
-            harmonicRhythm (list): List of RhythmTree objects
+            harmonicRhythm (RhythmSequence): Harmonic rhythm. Can also be a
+                                             list of RhythmTree objects
 
         Returns:
             cadenceChordProgression (list): List of Chord objects
         """
-        random = RandomManager.getActive()
+        random = getRandom(self.random)
 
         # choose cadence to apply
         cadences = self.chordProfile.getCadences()
@@ -270,9 +443,8 @@ class HarmonyPitchGenerator(object):
         reversedHarmonicRhythm = reversed(harmonicRhythm[:])
         # create as many  cadence
         for count, durationObj in enumerate(reversedHarmonicRhythm):
-            duration = durationObj.getDuration()
             code = cadence[-count+1]
-            chord = Chord(code, duration=duration, scale=scale, octave=4)
+            chord = self._createChord(code, durationObj, scale, octave=4)
 
             if count >= len(cadence):
                 return cadenceChordProgression
@@ -287,7 +459,7 @@ class HarmonyPitchGenerator(object):
         """Decides a triad to be chosen
 
         Args:
-            scores (list): List of scores for the 48 triads
+            scores (numpy.ndarray): Scores of the 48 triads
             durationObj (RhythmTree):
 
         Returns:
@@ -297,18 +469,163 @@ class HarmonyPitchGenerator(object):
         scale = self.chordProfile.getScale().getName()
 
         # transform scores in normalised cumulative distr
-        distr = toNormalisedCumulativeDistr(scores)
+        distr = toNormalisedCumulativeDistrArray(scores)
 
-        codeIndex = decideCumulativeDistrOutcome(distr)
+        r = getRandom(self.random).random()
+        codeIndex = int(getCumulativeDistrOutcomeBatch(r, distr))
         nextTriad = self._candidateTriads[codeIndex]
 
         # create Chord object assigning duration
-        duration = durationObj.getDuration()
-        newChord = Chord(nextTriad.getCode(), duration=duration, scale=scale)
+        newChord = self._createChord(nextTriad.getCode(), durationObj, scale)
 
         return newChord, codeIndex
 
 
+    def _decideTriadFromTables(self, indexPreviousCode, metricalAccentLevel,
+                               harmonicComplexity, minMajRatio, durationObj):
+        """Decides a triad with the decision tables of the closest point of
+        the feature grid
+
+        Args:
+            indexPreviousCode (int): List index of previous code, or None
+            metricalAccentLevel (int):
+            harmonicComplexity (float): Value of emotion rule
+            minMajRatio (float): Value of emotion rule
+            durationObj (RhythmTree):
+
+        Returns:
+            newChord (str): Chord code of new triad
+            codeIndex (int): List index of new chord
+        """
+        scale = self.chordProfile.getScale().getName()
+        tables = self.getDecisionTables(harmonicComplexity, minMajRatio)
+        codeIndex = tables.decideTriad(indexPreviousCode, metricalAccentLevel,
+                                       self.random)
+        nextTriad = self._candidateTriads[codeIndex]
+
+        # create Chord object assigning duration
+        newChord = self._createChord(nextTriad.getCode(), durationObj, scale)
+
+        return newChord, codeIndex
+
+
+    def getDecisionTables(self, harmonicComplexity, minMajRatio):
+        """Returns the decision tables of the current chord profile at the
+        closest point of the feature grid. Tables are kept in a LRU cache,
+        and are loaded from the tables directory if they were persisted.
+
+        Args:
+            harmonicComplexity (float): Value of emotion rule
+            minMajRatio (float): Value of emotion rule
+
+        Returns:
+            tables (ChordDecisionTables):
+        """
+        gridSize = self.featureGridSize
+        if gridSize is None:
+            raise ValueError("Decision tables need a feature grid size")
+        harmonicComplexityBucket = quantizeFeature(
+            harmonicComplexity, MINEMOTIONALFEATURES, MAXEMOTIONALFEATURES,
+            gridSize)
+        minMajRatioBucket = quantizeFeature(
+            minMajRatio, MINEMOTIONALFEATURES, MAXEMOTIONALFEATURES,
+            gridSize)
+        key = (self.chordProfile.getScale().getName(),
+               self.chordProfile.quality, harmonicComplexityBucket,
+               minMajRatioBucket)
+
+        tables = self._decisionTables.get(key)
+        if tables is not None:
+            self._decisionTables.move_to_end(key)
+            return tables
+
+        path = None
+        if self.tablesDir is not None:
+            path = self._getDecisionTablesPath(key)
+        if path is not None and os.path.exists(path):
+            tables = ChordDecisionTables.load(path)
+        else:
+            tables = ChordDecisionTables.fromScores(
+                self._calcDecisionScores(
+                    getGridValue(harmonicComplexityBucket,
+                                 MINEMOTIONALFEATURES, MAXEMOTIONALFEATURES,
+                                 gridSize),
+                    getGridValue(minMajRatioBucket, MINEMOTIONALFEATURES,
+                                 MAXEMOTIONALFEATURES, gridSize)))
+            if path is not None:
+                os.makedirs(self.tablesDir, exist_ok=True)
+                tables.save(path)
+
+        # evict least recently used tables
+        self._decisionTables[key] = tables
+        if len(self._decisionTables) > self._decisionTablesCacheSize:
+            self._decisionTables.popitem(last=False)
+        return tables
+
+
+    def precomputeDecisionTables(self):
+        """Computes the decision tables of the current chord profile at all
+        the points of the feature grid, persisting them if there's a tables
+        directory. Only the most recently used ones are kept in memory."""
+        gridValues = [getGridValue(bucket, MINEMOTIONALFEATURES,
+                                   MAXEMOTIONALFEATURES, self.featureGridSize)
+                      for bucket in range(self.featureGridSize)]
+        for harmonicComplexity in gridValues:
+            for minMajRatio in gridValues:
+                self.getDecisionTables(harmonicComplexity, minMajRatio)
+
+
+    def _calcDecisionScores(self, harmonicComplexity, minMajRatio):
+        """Returns the combined scores of the candidate triads for every
+        metrical accent level and previous triad, as _calcMetrics does
+
+        Args:
+            harmonicComplexity (float): Value of emotion rule
+            minMajRatio (float): Value of emotion rule
+
+        Returns:
+            scores (numpy.ndarray): Its shape is (metrical accent levels,
+                                    triads + 1, triads). The last previous
+                                    triad is for the first chord
+        """
+        a = self._weightMetrics["consonance"]
+        b = self._weightMetrics["profileProminence"]
+        c = self._weightMetrics["commonChordTones"]
+        levelScores = a * self._getConsonanceRows(minMajRatio) + \
+            b * self._getProminenceRows(harmonicComplexity)
+
+        # the first chord has no common chord tones score
+        numTriads = len(self._candidateTriads)
+        commonChordTones = np.zeros((numTriads + 1, numTriads))
+        commonChordTones[:numTriads] = c * self._commonChordTonesMatrix
+
+        scores = levelScores[:, np.newaxis, :] + \
+            commonChordTones[np.newaxis, :, :]
+
+        # reduce to 0 score of previous code
+        triadIndexes = np.arange(numTriads)
+        scores[:, triadIndexes, triadIndexes] = 0
+        return scores
+
+
+    def _getDecisionTablesPath(self, key):
+        """Returns the file of persisted decision tables. Its name includes
+        a digest of the score data, so that tables computed with different
+        scores are never loaded."""
+        scale, quality, harmonicComplexityBucket, minMajRatioBucket = key
+        digest = hashlib.sha1()
+        for table in (self._consonanceScores, self._commonChordTonesMatrix,
+                      self._getProfileScores()):
+            digest.update(table.tobytes())
+        digest.update(repr((sorted(self._weightMetrics.items()),
+                            sorted(self._minMajRationMaxImpact.items()),
+                            self._profileDistanceMaxImpact)).encode())
+        name = "{}-{}-{}-{}-{}-{}.npz".format(
+            scale, quality, self.featureGridSize, harmonicComplexityBucket,
+            minMajRatioBucket, digest.hexdigest()[:12])
+        return os.path.join(self.tablesDir, name)
+
+
     def _calcMetrics(self, previousCode, indexPreviousCode, metricalAccentLevel,
                      harmonicComplexity, minMajRatio):
         """Returns combined scores for all the candidate triads.
@@ -321,8 +638,7 @@ class HarmonyPitchGenerator(object):
             minMajRatio (float): Value of emotion rule
 
         Returns:
-            scores (list): List with all the scores for the combined scores for
-                           each candidate triad
+            scores (numpy.ndarray): Combined scores for each candidate triad
         """
 
         # calculate triad consonance scores scores
@@ -336,15 +652,15 @@ class HarmonyPitchGenerator(object):
             # calculate common chord tones metric
             cct = self._calcCommonChordTonesMetric(previousCode)
         else:
-            cct = [0] * len(self._candidateTriads)
+            cct = 0
 
         # retrieve score weights
         a = self._weightMetrics["consonance"]
         b = self._weightMetrics["profileProminence"]
         c = self._weightMetrics["commonChordTones"]
 
-        # create new list with linear combination of scores
-        scores = [a * x + b * y + c * z  for x, y, z in zip(tc, pp, cct)]
+        # linear combination of scores
+        scores = a * tc + b * pp + c * cct
 
         # reduce to 0 score of previous code
         if indexPreviousCode is not None:
@@ -361,22 +677,12 @@ class HarmonyPitchGenerator(object):
             metricalAccentLevel (int):
 
         Returns:
-            consonanceScores (list): List of consonance scores for candidate
-                                     triads
+            consonanceScores (numpy.ndarray): Consonance scores for candidate
+                                              triads. It's a view of the
+                                              cached rows, so it mustn't be
+                                              modified
         """
-        consonanceScores = []
-
-        # step through candidate triads and calculate consonance score
-        for triad in self._candidateTriads:
-            triadType = triad.getTriadType()
-            score = float(self._triadConsonanceScores[triadType])
-
-            # modify score based on minMaj ratio
-            minMajImpact = self._calcMinMajRatioImpact(minMajRatio,
-                                        metricalAccentLevel, triadType)
-            score += minMajImpact
-            consonanceScores.append(score)
-        return consonanceScores
+        return self._getConsonanceRows(minMajRatio)[metricalAccentLevel]
 
 
     def _calcProminenceMetric(self, harmonicComplexity, metricalAccentLevel):
@@ -387,27 +693,75 @@ class HarmonyPitchGenerator(object):
             metricalAccentLevel (int):
 
         Returns:
-            prominenceScores (list): List of prominance scores for candidate
-                                     triads
+            prominenceScores (numpy.ndarray): Prominence scores for candidate
+                                              triads. It's a view of the
+                                              cached rows, so it mustn't be
+                                              modified
         """
-        prominenceScores = []
-        profileScores = self.chordProfile.getScores()
-        MAXSCORE = float(max(profileScores.values()))
-        MIDVALUE = MAXSCORE / 2
+        return self._getProminenceRows(harmonicComplexity)[
+            metricalAccentLevel]
+
+
+    def _getConsonanceRows(self, minMajRatio):
+        """Returns the consonance scores of the candidate triads at every
+        metrical accent level. The rows of the last min/maj ratio are cached,
+        as it doesn't change within a MU.
 
-        # step through candidate triads and calculate prominence score
-        for triad in self._candidateTriads:
-            code = triad.getCode()
-            score = float(profileScores[code])
-            prominenceScores.append(score)
+        Args:
+            minMajRatio (float):
 
-        # modify scores based on harmonicComplexity
-        attractionRate = self._calcHarmonicComplexityImpactOnProfile(
-            harmonicComplexity, metricalAccentLevel)
-        prominenceScores = RhythmGenerator.compressValues(MIDVALUE, prominenceScores,
-                                                attractionRate)
+        Returns:
+            consonanceRows (numpy.ndarray): Its shape is (metrical accent
+                                            levels, triads)
+        """
+        if self._consonanceRowsCache is not None and \
+                self._consonanceRowsCache[0] == minMajRatio:
+            return self._consonanceRowsCache[1]
+
+        # modify scores based on minMaj ratio, which has the same impact on
+        # all the triads of a type
+        minMajImpacts = np.array([
+            [self._calcMinMajRatioImpact(minMajRatio, level, triadType)
+             for triadType in self._triadTypes]
+            for level in range(len(self._profileDistanceMaxImpact))])
+        consonanceRows = self._consonanceScores + \
+            minMajImpacts[:, self._triadTypeIndexes]
+        self._consonanceRowsCache = (minMajRatio, consonanceRows)
+        return consonanceRows
+
+
+    def _getProminenceRows(self, harmonicComplexity):
+        """Returns the chord profile prominence scores of the candidate
+        triads at every metrical accent level. The rows of the last chord
+        profile and harmonic complexity are cached.
 
-        return prominenceScores
+        Args:
+            harmonicComplexity (float):
+
+        Returns:
+            prominenceRows (numpy.ndarray): Its shape is (metrical accent
+                                            levels, triads)
+        """
+        key = (self.chordProfile.getScale().getName(),
+               self.chordProfile.quality, harmonicComplexity)
+        if self._prominenceRowsCache is not None and \
+                self._prominenceRowsCache[0] == key:
+            return self._prominenceRowsCache[1]
+
+        prominenceScores = self._getProfileScores()
+        MAXSCORE = prominenceScores.max()
+        MIDVALUE = MAXSCORE / 2
+
+        # modify scores based on harmonicComplexity, compressing them around
+        # the mid value like RhythmGenerator.compressValues
+        attractionRates = np.array([
+            self._calcHarmonicComplexityImpactOnProfile(harmonicComplexity,
+                                                        level)
+            for level in range(len(self._profileDistanceMaxImpact))])
+        prominenceRows = prominenceScores - \
+            (prominenceScores - MIDVALUE) * attractionRates[:, np.newaxis]
+        self._prominenceRowsCache = (key, prominenceRows)
+        return prominenceRows
 
 
     def _calcCommonChordTonesMetric(self, previousCode):
@@ -418,20 +772,12 @@ class HarmonyPitchGenerator(object):
             previousCode (str): Chord code for previous chord
 
         Returns:
-            commonTonesScores (list): List of common chord tones scores for
-                                      all candidate triads
+            commonTonesScores (numpy.ndarray): Common chord tones scores for
+                                               all candidate triads. It's a
+                                               view of the score matrix, so
+                                               it mustn't be modified
         """
-        commonTonesScores = []
-
-        # step through candidate triads and calculate common chord tones score
-        for triad in self._candidateTriads:
-            code = triad.getCode()
-            if len(previousCode) >3:
-                a=1
-            numCommonChordTones = self._commonChordTonesTriads[previousCode][code]
-            score = float(self._commonChordTonesScores[numCommonChordTones])
-            commonTonesScores.append(score)
-        return commonTonesScores
+        return self._commonChordTonesMatrix[self._triadIndexes[previousCode]]
 
 
     def _initCandidateTriads(self):
@@ -445,6 +791,63 @@ class HarmonyPitchGenerator(object):
         return candidateTriads
 
 
+    def _compileScoreTables(self):
+        """Precomputes the consonance of the candidate triads, the index of
+        their triad types and the matrix of the common chord tones scores
+        between any two candidate triads. Common chord tones are counted on
+        the pitch class masks of the triads."""
+        codes = [triad.getCode() for triad in self._candidateTriads]
+        self._triadIndexes = {code: index for index, code in enumerate(codes)}
+
+        self._triadTypes = list(self._triadConsonanceScores)
+        self._triadTypeIndexes = np.array(
+            [self._triadTypes.index(triad.getTriadType())
+             for triad in self._candidateTriads], dtype=np.intp)
+        self._consonanceScores = np.array(
+            [float(self._triadConsonanceScores[triad.getTriadType()])
+             for triad in self._candidateTriads])
+
+        # rows are indexed by the previous triad
+        self._commonChordTonesTriads = Chord.createNumCommonChordTonesMatrix(
+            codes)
+        self._commonChordTonesMatrix = np.array(
+            [[float(self._commonChordTonesScores[
+                self._commonChordTonesTriads[previousCode][code]])
+              for code in codes] for previousCode in codes])
+
+        # prominence scores of the candidate triads, keyed by the scale and
+        # quality of the chord profile
+        self._profileScoresCache = {}
+
+        # consonance and prominence scores of the candidate triads at every
+        # metrical accent level, as (key, rows) pairs of the last feature
+        # values. Features don't change within a MU
+        self._consonanceRowsCache = None
+        self._prominenceRowsCache = None
+
+        # decision tables keyed by (scale, quality, harmonic complexity
+        # bucket, min/maj ratio bucket), least recently used first
+        self._decisionTables = OrderedDict()
+
+
+    def _getProfileScores(self):
+        """Returns the scores of the candidate triads in the current chord
+        profile
+
+        Returns:
+            profileScores (numpy.ndarray):
+        """
+        key = (self.chordProfile.getScale().getName(),
+               self.chordProfile.quality)
+        profileScores = self._profileScoresCache.get(key)
+        if profileScores is None:
+            scores = self.chordProfile.getScores()
+            profileScores = np.array([float(scores[triad.getCode()])
+                                      for triad in self._candidateTriads])
+            self._profileScoresCache[key] = profileScores
+        return profileScores
+
+
     def _calcHarmonicComplexityImpactOnProfile(self, harmonicComplexity,
                                                metricalAccentLevel):
         harmonicComplexityMaxImpact = self._profileDistanceMaxImpact[
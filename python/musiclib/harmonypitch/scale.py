@@ -29,6 +29,9 @@ pentatonicScalesDegreeInModes = {
     "minor": [0, 2, 3, 4, 6],
 }
 
+# scales shared by all the chords, keyed by name
+internedScales = {}
+
 
 class Scale(object):
 
@@ -45,6 +48,11 @@ class Scale(object):
 
         self.pitchClassSequence = scales[self.name]
 
+        # realisations of the scale, keyed by octave
+        self._expandedScaleSeqs = {}
+        # whether the scale is shared through Scale.get
+        self._isInterned = False
+
         if name in modes:
             self.pentatonicReduction = {
                 "quality": self.getPentatonicFromMode(),
@@ -54,6 +62,26 @@ class Scale(object):
                                                 self.pentatonicReduction["quality"])
 
 
+    @classmethod
+    def get(cls, name="ionian"):
+        """Returns the interned scale with a name, creating it the first time
+        it's requested. Interned scales are shared, so they can't be
+        renamed: owners should get the scale with the new name instead.
+
+        Args:
+            name (str):
+
+        Returns:
+            scale (Scale):
+        """
+        scale = internedScales.get(name)
+        if scale is None:
+            scale = cls(name)
+            scale._isInterned = True
+            internedScales[name] = scale
+        return scale
+
+
     def getPitchClassSequence(self):
         return self.pitchClassSequence
 
@@ -63,9 +91,21 @@ class Scale(object):
 
 
     def setName(self, name):
+        """Renames the scale, changing its pitches
+
+        Args:
+            name (str):
+
+        Raises:
+            ValueError: If the scale is interned
+        """
+        if self._isInterned:
+            raise ValueError("Interned scales can't be renamed. Use "
+                             "Scale.get('%s') instead" % name)
         if name in scales.keys():
             self.name = name
             self.pitchClassSequence = scales[self.name]
+            self._expandedScaleSeqs.clear()
         else:
             print("Error: '" + name + "' scale does not exist. Keeping '" +
                   self.name + "' scale")
@@ -77,11 +117,21 @@ class Scale(object):
         Args:
             octave (int): Indicates midi octave up to which we want to
                           realise scale
+
+        Returns:
+            expandedScaleSeq (list): Pitches of the scale. The list is
+                                     computed once for each octave and
+                                     shared, so it must not be modified
         """
+        expandedScaleSeq = self._expandedScaleSeqs.get(octave)
+        if expandedScaleSeq is not None:
+            return expandedScaleSeq
+
         expandedScaleSeq = []
         for i in range(octave+1):
             offset = 12 * i
             expandedScaleSeq += [(x+offset) for x in self.pitchClassSequence]
+        self._expandedScaleSeqs[octave] = expandedScaleSeq
         return expandedScaleSeq
 
 
@@ -1,7 +1,8 @@
 from musiclib.rhythmtreefactory import RhythmTreeFactory
 from musiclib.rhythmgenerator import RhythmGenerator
+from musiclib.rhythmchain import RhythmChain
+from musiclib.rhythmsequence import RhythmSequence
 from musiclib.probability import *
-from melodrive.stats.randommanager import RandomManager
 
 
 class HarmonyRhythmGenerator(RhythmGenerator):
@@ -15,8 +16,8 @@ class HarmonyRhythmGenerator(RhythmGenerator):
                  metricalProminenceScores, musicFeaturesMaxImpact,
                  densityImpactDurationLevels, weightMetrics,
                  probabilityDot, probabilitySingleDot, probabilityTie,
-                 probabilityRepeatBar):
-        super(HarmonyRhythmGenerator, self).__init__(metre)
+                 probabilityRepeatBar, random=None):
+        super(HarmonyRhythmGenerator, self).__init__(metre, random=random)
 
         timeSignature = metre.getTimeSignature()
         self._lowestDurationLevel = lowestDurationLevelOptions[timeSignature]
@@ -33,13 +34,14 @@ class HarmonyRhythmGenerator(RhythmGenerator):
             timeSignature]
 
         self._weightMetrics = weightMetrics[timeSignature]
+        self._compileScoreTables()
         self._probabilityDot = probabilityDot[timeSignature]
         self._probabilitySingleDot = probabilitySingleDot[timeSignature]
         self._probabilityTie = probabilityTie[timeSignature]
         self._probabilityRepeatBar = probabilityRepeatBar[timeSignature]
 
     @classmethod
-    def fromModelData(cls, metre, md):
+    def fromModelData(cls, metre, md, random=None):
         # I know this is a little redundant to unpack the dict, but the comments
         #for each variable were useful, so I wanted to keep them here.
         #TODO: figure out a way to (properly) document the features of each model's data
@@ -48,7 +50,7 @@ class HarmonyRhythmGenerator(RhythmGenerator):
 
         # scores associated to the distance from the duration level of the tactus
         # The indexes of the list represent the distance in duration levels.
-        tactusScoreByDistance = md["tactusScoreByDistance"]
+        tactusScoreByDistance = md["tactusDistScores"]
 
         # scores associated to the metrical prominence. Higher duration levels are
         # favoured. The raw indexes of the list represent the duration level,
@@ -77,7 +79,7 @@ class HarmonyRhythmGenerator(RhythmGenerator):
                  metricalProminenceScores, musicFeaturesMaxImpact,
                  densityImpactDurationLevels, weightMetrics,
                  probabilityDot, probabilitySingleDot, probabilityTie,
-                 probabilityRepeatBar)
+                 probabilityRepeatBar, random)
 
     # TODO: controller on top of generator to decide repetitions/variations
     # TODO: have hypermetre influence the generation
@@ -90,32 +92,82 @@ class HarmonyRhythmGenerator(RhythmGenerator):
             harmonicDensityImpact (float): Arousal feature that influences
                                            the density of the harmony
             numBarsMU (int): Number of bars in a MU
+
+        Returns:
+            rhythmSequence (RhythmSequence):
         """
         # if we need to change the densityImpact, do so on the parent class which is how it's used
         if densityImpact is not None:
             super(HarmonyRhythmGenerator, self).setDensityImpact(densityImpact)
 
-        rhythmicSeq = []
+        bars = list(self.generateHarmonicRhythmMUBars(metre, numBarsMU))
+        if not bars:
+            return RhythmSequence.empty(metre.getTicksPerQuarter())
+        return RhythmSequence.concatenate(bars)
+
 
+    def generateHarmonicRhythmMUBars(self, metre, numBarsMU):
+        """Yields the bars of a MU one at a time, as soon as each of them
+        is generated
+
+        Args:
+            metre (Metre):
+            numBarsMU (int): Number of bars in a MU
+
+        Yields:
+            bar (RhythmSequence):
+        """
         # decide whether to use bar as a repeated pattern
-        random = RandomManager.getActive()
+        random = getRandom(self.random)
         r = random.random()
         if r < self._probabilityRepeatBar:
-            rhythmicSeqBar = self._generateHarmonicRhythmBar(metre)
-            rhythmicSeq = []
+            bar = self._generateHarmonicRhythmBarSequence(metre)
             for i in range(numBarsMU):
-                rhythmicSeq += rhythmicSeqBar
+                yield bar
 
         else:
 
             # create harmonic rhythm for each bar
             for i in range(numBarsMU):
-                rhythmicSeqBar = self._generateHarmonicRhythmBar(metre)
-                rhythmicSeq += rhythmicSeqBar
+                yield self._generateHarmonicRhythmBarSequence(metre)
 
-        #print()
-        #print(rhythmicSeq)
-        return rhythmicSeq
+
+    def generateHarmonicRhythmBars(self, metre, numBars=None):
+        """Yields bars one at a time. Changes of the features take effect
+        from the next bar.
+
+        Args:
+            metre (Metre):
+            numBars (int): Number of bars. If None, bars are yielded forever
+
+        Yields:
+            bar (RhythmSequence):
+        """
+        return self._generateRhythmBars(metre, numBars)
+
+
+    def generateHarmonicRhythmEvents(self, metre, state=None):
+        """Yields the durations of the harmonic rhythm one at a time.
+        Changes of the features take effect from the next event.
+
+        Args:
+            metre (Metre):
+            state (RhythmStreamState): State the stream resumes from. If
+                                       None, the stream starts a new bar
+
+        Yields:
+            event (RhythmSequenceElement):
+        """
+        return self._generateRhythmEvents(metre, state)
+
+
+    def _createStreamBar(self, metre):
+        return self.rhythmTree, "bar"
+
+
+    def _generateHarmonicRhythmBarSequence(self, metre):
+        rhythmChain = self._getRhythmChain(metre, self.rhythmTree, "bar")
+        return rhythmChain.sampleBarSequence(self.random)
 
 
     def _generateHarmonicRhythmBar(self, metre):
@@ -125,57 +177,46 @@ class HarmonyRhythmGenerator(RhythmGenerator):
             rhythmicSequence (list):
         """
 
-        rhythmicSeq = []
+        # traverse the rhythm tree until the bar is filled exactly
+        rhythmChain = self._getRhythmChain(metre, self.rhythmTree, "bar")
+        return rhythmChain.sampleBar(self.random)
 
-        totDuration = 0
-        currentRS = self.rhythmTree
 
-        # num of dots currentRS
-        numDots = 0
+    def compileRhythmChain(self, metre):
+        """Returns the Markov chain of the bars generated by the generator
 
-        # traverse the rhythm space until bar is filled
-        #TODO: shouldn't this while be totDuration<=barDuration?
-        while totDuration != self._barDuration:
-
-            # get all candidate durations
-            candidates = currentRS.getDurationCandidates(numDots)
-
-            # calculate scores
-            scores = self._calcScores(candidates, metre)
-
-            # choose new duration
-            currentRS = self._decideNextDuration(scores, candidates)
+        Args:
+            metre (Metre):
 
-            duration = currentRS.getDuration()
+        Returns:
+            rhythmChain (RhythmChain):
+        """
+        return RhythmChain.fromRhythmGenerator(self, metre, self.rhythmTree)
 
-            # index 1 indicates no tie
-            #TODO: we should make our own classes for this
-            #it's always better to make an object and give it named member variables
-            #rather than adhering to a convention (although we all do this sometimes)
-            rhythmicSeqElement = [duration, None]
 
-            durationLevelRT = currentRS.getDurationLevel()
+    def _calcOrnamentProbabilities(self, currentRS):
+        """Returns the probabilities of the ties and dots applied to a chosen
+        node. A tie can only be applied to last children, and dots to the
+        other nodes.
 
-            # reset number of dots
-            numDots = 0
+        Args:
+            currentRS (RhythmTree): Chosen rhythm tree node
 
-            # if current rs is last child we can apply a tie, otherwise a dot
-            if currentRS.isLastChild():
-                rhythmicSeqElement = self._decideToApplyTie(
-                    rhythmicSeqElement, durationLevelRT)
-            else:
-                #Check whether we _can_ apply a dot
-                # Note: we want to base the ability to apply a dot on the settings
-                # of the generator (_lowestDurationLevel), and not on the tree itself
-                # because we can have multiple generators using the same tree
-                maxDepth = self._lowestDurationLevel - currentRS.getDurationLevel()
-                rhythmicSeqElement, numDots = self._decideToApplyDot(
-                                                    currentRS, maxDepth)
+        Returns:
+            ornaments (list): (numDots, tie, probability) tuples
+        """
+        durationLevelRT = currentRS.getDurationLevel()
 
-            rhythmicSeq.append(rhythmicSeqElement)
-            totDuration += rhythmicSeqElement[0]
+        if currentRS.isLastChild():
+            probTie = self._calcTieProbability(durationLevelRT)
+            return [(0, 't', probTie), (0, None, 1 - probTie)]
 
-        return rhythmicSeq
+        # we want to base the ability to apply a dot on the settings of the
+        # generator (_lowestDurationLevel), and not on the tree itself because
+        # we can have multiple generators using the same tree
+        maxDepth = self._lowestDurationLevel - durationLevelRT
+        probDots = self._calcDotProbabilities(durationLevelRT, maxDepth)
+        return [(numDots, None, prob) for numDots, prob in enumerate(probDots)]
 
 
     def _calcScores(self, candidates, metre):
@@ -190,26 +231,9 @@ class HarmonyRhythmGenerator(RhythmGenerator):
                            each candidate duration
         """
 
-        # calculate metrical prominence scores
-        mp = self._calcMetricalProminenceMetric(candidates)
-
-        # calculate distance harmonic tactus scores
-        harmonicTactusLevel = metre.getHarmonicTactusLevel()
-        dt = self._calcDistFromTactusMetric(candidates, harmonicTactusLevel)
-
-        # retrieve score weights
-        a = self._weightMetrics["metricalProminence"]
-        b = self._weightMetrics["distTactus"]
-
-        # create new list with linear combination of scores
-        scores = [a*x + b*y for x, y in zip(mp, dt)]
-
-        MAXSCORE = a + b
-
-        # modify scores based on rhythmic density
-        scores = self._modifyScoresForDensity(candidates, scores, MAXSCORE)
+        harmonicTactusLevel = self._getTactusLevel(metre)
+        return self._calcCombinedScores(candidates, harmonicTactusLevel)
 
-        # modify scores based on rhythmic entropy
-        scores = self._modifyScoresForEntropy(scores, MAXSCORE)
 
-        return scores
\ No newline at end of file
+    def _getTactusLevel(self, metre):
+        return metre.getHarmonicTactusLevel()
\ No newline at end of file
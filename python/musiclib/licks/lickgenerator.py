@@ -98,6 +98,19 @@ class LickGenerator(object):
         self.MMOrder = val
 
 
+    def generateLick(self, scale):
+        """Generates a lick in a given scale
+
+        :param scale (Scale): Scale we're currently in
+        :return: lick (list): (duration, midi note) pairs of the lick, with
+            durations expressed in quarter notes
+        """
+        rhythmSeq = self._generateRhythmLick()
+        scaleDegreeSeq = self._generateScaleDegreeLick(rhythmSeq, scale)
+        midiSeq = self._convertScaleDegreesToMidiNotes(scaleDegreeSeq, scale)
+        return list(zip(rhythmSeq, midiSeq))
+
+
     def _generateRhythmLick(self):
         """Generate the rhythmic content for a lick
 
@@ -0,0 +1,430 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from musiclib.melodypitch.note import Note
+from musiclib.rhythmsequence import RhythmSequence
+
+# number of bars generated ahead of the playhead
+LOOKAHEAD = 4
+
+# number of bars of the MUs generated by BarPipeline
+NUMBARSMU = 2
+
+
+# marks the bar whose generation raised an exception in the buffer
+_FAILEDBAR = object()
+
+
+class LookaheadEngine(object):
+    """LookaheadEngine generates bars ahead of playback on an asyncio event
+    loop, so that generation latency never stalls playback. Bars are
+    generated one at a time in a worker thread and buffered until the
+    playhead reaches them. At most 'lookahead' bars are generated ahead of
+    the playhead: a bar is only started once there's room for it in the
+    buffer.
+
+    When the features change, the buffered bars are dropped and generation
+    restarts from the playhead with the new features. The bar being
+    generated can't be interrupted, so it's finished and dropped, and the
+    first bar with the new features waits for it. Bars which aren't ready
+    when the playhead reaches them are reported as deadline misses and
+    skipped. If generating a bar raises an exception, generation stops and
+    the exception is raised by nextBar once the playhead reaches that bar.
+
+    Attributes:
+        features (dict): Features the bars are generated with
+        lookahead (int): Max number of buffered bars
+        barDuration (float): Duration of a bar in seconds
+        latency (float): Time between the start of the engine and the
+                         deadline of the first bar, in seconds
+        playhead (int): Index of the next bar to be played
+        deadlineMisses (list): Indexes of the bars which weren't ready in
+                               time
+        discardedBars (list): Indexes of the bars which were being
+                              generated when the features changed
+    """
+
+    def __init__(self, generateBar, barDuration, features=None,
+                 lookahead=LOOKAHEAD, latency=None, onDeadlineMiss=None,
+                 executor=None):
+        """
+        Args:
+            generateBar (function): Blocking function which takes the index
+                                    of a bar and the features, and returns
+                                    the bar
+            barDuration (float): Duration of a bar in seconds
+            features (dict): Initial features
+            lookahead (int): Max number of buffered bars
+            latency (float): Time between the start of the engine and the
+                             deadline of the first bar. If None, the
+                             duration of a bar
+            onDeadlineMiss (function): Called with the index of every bar
+                                       which misses its deadline
+            executor (Executor): Executor bars are generated in. Generators
+                                 keep state between bars, so it must run
+                                 one bar at a time. If None, a single
+                                 thread executor is created
+        """
+        super(LookaheadEngine, self).__init__()
+        if lookahead < 1:
+            raise ValueError("Lookahead must be at least one bar")
+        self.features = dict(features or {})
+        self.lookahead = lookahead
+        self.barDuration = barDuration
+        self.latency = barDuration if latency is None else latency
+        self.playhead = 0
+        self.deadlineMisses = []
+        self.discardedBars = []
+
+        self._generateBar = generateBar
+        self._onDeadlineMiss = onDeadlineMiss
+        self._ownsExecutor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1)
+        self._queue = None
+        self._producer = None
+        self._startTime = None
+        # set when a bar is taken from the buffer
+        self._spaceFreed = None
+        # index and future of the bar being generated, and the future of a
+        # discarded bar which is still being generated
+        self._inFlight = None
+        self._staleFuture = None
+        # exception raised by generateBar, which stops generation
+        self._error = None
+
+
+    def start(self):
+        """Starts generating bars. Must be called from a running event
+        loop."""
+        if self._producer is not None:
+            raise RuntimeError("The engine has already been started")
+        self._queue = asyncio.Queue(maxsize=self.lookahead)
+        self._spaceFreed = asyncio.Event()
+        self._startTime = asyncio.get_running_loop().time()
+        self._startProducer()
+
+
+    async def stop(self):
+        """Stops generating bars and drops the buffered ones"""
+        await self._stopProducer()
+        self._flush()
+        if self._ownsExecutor:
+            self._executor.shutdown(wait=False)
+
+
+    def setFeatures(self, **features):
+        """Updates the features. Buffered bars are generated again from the
+        playhead with the new features.
+
+        Args:
+            features: Values of the features to be changed
+        """
+        self.features.update(features)
+        if self._producer is None or self._error is not None:
+            return
+        self._discardInFlight()
+        self._producer.cancel()
+        self._flush()
+        self._startProducer()
+
+
+    def getDeadline(self, barIndex):
+        """Returns the event loop time by which a bar has to be ready"""
+        return self._startTime + self.latency + barIndex * self.barDuration
+
+
+    def getNumBufferedBars(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+
+    async def nextBar(self):
+        """Returns the bar at the playhead, waiting at most until its
+        deadline, and moves the playhead to the next bar
+
+        Returns:
+            bar: The generated bar, or None if it missed its deadline
+
+        Raises:
+            Exception: The exception raised by generateBar, if generation
+                       failed before the bar at the playhead
+        """
+        barIndex = self.playhead
+        loop = asyncio.get_running_loop()
+        if self._error is not None and self._queue.empty():
+            raise self._error
+        try:
+            while True:
+                if self._queue.empty():
+                    timeout = self.getDeadline(barIndex) - loop.time()
+                    if timeout <= 0:
+                        raise asyncio.TimeoutError()
+                    bufferedIndex, bar = await asyncio.wait_for(
+                        self._queue.get(), timeout)
+                else:
+                    bufferedIndex, bar = self._queue.get_nowait()
+                self._spaceFreed.set()
+
+                if bar is _FAILEDBAR:
+                    raise self._error
+                # bars which missed their deadline arrive late
+                if bufferedIndex == barIndex:
+                    self.playhead = barIndex + 1
+                    return bar
+        except asyncio.TimeoutError:
+            self.playhead = barIndex + 1
+            self.deadlineMisses.append(barIndex)
+            if self._onDeadlineMiss is not None:
+                self._onDeadlineMiss(barIndex)
+            return None
+
+
+    async def play(self, numBars=None):
+        """Yields bars at their deadlines, like a playback clock would
+
+        Args:
+            numBars (int): Number of bars. If None, bars are yielded forever
+
+        Yields:
+            bar: The generated bar, or None if it missed its deadline
+        """
+        loop = asyncio.get_running_loop()
+        numPlayedBars = 0
+        while numBars is None or numPlayedBars < numBars:
+            barIndex = self.playhead
+            bar = await self.nextBar()
+            await asyncio.sleep(max(0, self.getDeadline(barIndex) -
+                                    loop.time()))
+            yield bar
+            numPlayedBars += 1
+
+
+    def _startProducer(self):
+        self._producer = asyncio.ensure_future(
+            self._produce(self.playhead, dict(self.features)))
+
+
+    async def _stopProducer(self):
+        if self._producer is None:
+            return
+        self._discardInFlight()
+        self._producer.cancel()
+        try:
+            await self._producer
+        except asyncio.CancelledError:
+            pass
+        self._producer = None
+
+
+    async def _produce(self, barIndex, features):
+        if self._staleFuture is not None:
+            # generators keep state between bars, so the discarded bar has
+            # to be finished before the next one is started. Its result is
+            # dropped, errors included
+            staleBar = asyncio.wrap_future(self._staleFuture)
+            await asyncio.wait([staleBar])
+            staleBar.exception()
+            self._staleFuture = None
+
+        while True:
+            # the buffer must have room for the bar before it's started
+            while self._queue.full():
+                self._spaceFreed.clear()
+                await self._spaceFreed.wait()
+
+            # don't generate bars the playhead has already passed
+            barIndex = max(barIndex, self.playhead)
+            future = self._executor.submit(self._generateBar, barIndex,
+                                           features)
+            self._inFlight = (barIndex, future)
+            try:
+                bar = await asyncio.wrap_future(future)
+            except Exception as error:
+                # the failure is queued after the bars generated before it,
+                # and wakes up nextBar if it's waiting
+                self._inFlight = None
+                self._error = error
+                self._queue.put_nowait((barIndex, _FAILEDBAR))
+                return
+            self._inFlight = None
+            self._queue.put_nowait((barIndex, bar))
+            barIndex += 1
+
+
+    def _discardInFlight(self):
+        """Drops the bar being generated. Bars which haven't been started
+        are cancelled, the others are finished by the executor and recorded
+        in discardedBars"""
+        if self._inFlight is None:
+            return
+        barIndex, future = self._inFlight
+        self._inFlight = None
+        if not future.cancel() and not future.done():
+            self.discardedBars.append(barIndex)
+            self._staleFuture = future
+
+
+    def _flush(self):
+        if self._queue is None:
+            return
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._spaceFreed.set()
+
+
+class GeneratedBar(object):
+    """GeneratedBar contains the output of all the generators for a bar
+
+    Attributes:
+        barIndex (int):
+        barIndexMU (int): Index of the bar within its MU
+        melodicRhythm (RhythmSequence):
+        harmonicRhythm (RhythmSequence):
+        chords (list): List of Chord objects, one for each element of the
+                       harmonic rhythm
+        backbone (list): List of backbone Note objects, one for each chord
+    """
+
+    def __init__(self, barIndex, melodicRhythm=None, harmonicRhythm=None,
+                 chords=None, backbone=None, barIndexMU=0):
+        super(GeneratedBar, self).__init__()
+        self.barIndex = barIndex
+        self.barIndexMU = barIndexMU
+        self.melodicRhythm = melodicRhythm
+        self.harmonicRhythm = harmonicRhythm
+        self.chords = chords
+        self.backbone = backbone
+
+
+class BarPipeline(object):
+    """BarPipeline generates bars with the rhythm, harmony and backbone
+    generators, and can be used as the 'generateBar' function of a
+    LookaheadEngine. Generators which are None are skipped.
+
+    The harmony and the backbone are generated for a whole MU at a time, so
+    that chords and the backbone contour carry on from bar to bar and the
+    cadence falls at the end of the MU. The MU is generated when its first
+    bar is requested, and its bars are returned one at a time. A change of
+    the features, or a request for a bar other than the next one, starts a
+    new MU from the requested bar.
+
+    Features are read from a dict with the keys "density", "entropy",
+    "harmonicDensity", "harmonicEntropy", "harmonicComplexity",
+    "minMajRatio", "structureLevel", "pitchHeight", "pitchRange" and
+    "melodicComplexity". Missing rhythm features leave the generators as
+    they are.
+
+    Attributes:
+        numBarsMU (int): Number of bars of a MU
+    """
+
+    def __init__(self, metre, melodyRhythmGenerator=None,
+                 harmonyRhythmGenerator=None, harmonyPitchGenerator=None,
+                 backboneGenerator=None, numBarsMU=NUMBARSMU):
+        super(BarPipeline, self).__init__()
+        if numBarsMU < 1:
+            raise ValueError("A MU must have at least one bar")
+        self.metre = metre
+        self.melodyRhythmGenerator = melodyRhythmGenerator
+        self.harmonyRhythmGenerator = harmonyRhythmGenerator
+        self.harmonyPitchGenerator = harmonyPitchGenerator
+        self.backboneGenerator = backboneGenerator
+        self.numBarsMU = numBarsMU
+
+        # bars of the current MU which haven't been returned yet, and the
+        # features they were generated with
+        self._pendingBars = []
+        self._featuresMU = None
+
+
+    def __call__(self, barIndex, features):
+        if (not self._pendingBars or
+                self._pendingBars[0].barIndex != barIndex or
+                features != self._featuresMU):
+            self._pendingBars = self._generateMU(barIndex, features)
+            self._featuresMU = dict(features)
+        return self._pendingBars.pop(0)
+
+
+    def _generateMU(self, barIndex, features):
+        """Generates the bars of a MU
+
+        Args:
+            barIndex (int): Index of the first bar of the MU
+            features (dict):
+
+        Returns:
+            bars (list): GeneratedBar objects
+        """
+        bars = [GeneratedBar(barIndex + i, barIndexMU=i)
+                for i in range(self.numBarsMU)]
+
+        if self.melodyRhythmGenerator is not None:
+            self._setRhythmFeatures(self.melodyRhythmGenerator,
+                                    features.get("density"),
+                                    features.get("entropy"))
+            for bar, melodicRhythm in zip(
+                    bars, self.melodyRhythmGenerator.generateMelodicRhythmBars(
+                        self.metre, self.numBarsMU)):
+                bar.melodicRhythm = melodicRhythm
+
+        if self.harmonyRhythmGenerator is None:
+            return bars
+        self._setRhythmFeatures(self.harmonyRhythmGenerator,
+                                features.get("harmonicDensity"),
+                                features.get("harmonicEntropy"))
+        for bar, harmonicRhythm in zip(
+                bars, self.harmonyRhythmGenerator.generateHarmonicRhythmMUBars(
+                    self.metre, self.numBarsMU)):
+            bar.harmonicRhythm = harmonicRhythm
+
+        if self.harmonyPitchGenerator is None:
+            return bars
+        harmonicRhythmMU = RhythmSequence.concatenate(
+            [bar.harmonicRhythm for bar in bars])
+        chords = self.harmonyPitchGenerator.generateHarmonyPitchMU(
+            harmonicRhythmMU, features.get("harmonicComplexity", 0),
+            features.get("minMajRatio", 0),
+            features.get("structureLevel", "musicunit"), show=False)
+        for bar, barChords in zip(bars, self._splitIntoBars(bars, chords)):
+            bar.chords = barChords
+
+        if self.backboneGenerator is None:
+            return bars
+        backboneNotes = [Note(rhythm, chord, isBackboneNote=True)
+                         for rhythm, chord in zip(harmonicRhythmMU, chords)]
+        backbone = self.backboneGenerator.generateBackbonePitches(
+            backboneNotes, features.get("pitchHeight", 0),
+            features.get("pitchRange", 0),
+            features.get("melodicComplexity", 0), show=False)
+        for bar, barBackbone in zip(bars,
+                                    self._splitIntoBars(bars, backbone)):
+            bar.backbone = barBackbone
+        return bars
+
+
+    @staticmethod
+    def _splitIntoBars(bars, items):
+        """Splits the items of a MU, one for each element of its harmonic
+        rhythm, into the items of each bar
+
+        Args:
+            bars (list): GeneratedBar objects with their harmonic rhythm
+            items (list):
+
+        Returns:
+            barItems (list): List with the items of each bar
+        """
+        barItems = []
+        start = 0
+        for bar in bars:
+            stop = start + len(bar.harmonicRhythm)
+            barItems.append(items[start:stop])
+            start = stop
+        return barItems
+
+
+    @staticmethod
+    def _setRhythmFeatures(rhythmGenerator, density, entropy):
+        if density is not None:
+            rhythmGenerator.setDensityImpact(density)
+        if entropy is not None:
+            rhythmGenerator.setEntropyImpact(entropy)
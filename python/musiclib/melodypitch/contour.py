@@ -1,4 +1,3 @@
-from melodrive.stats.randommanager import RandomManager
 from musiclib.probability import *
 
 UP = "up"
@@ -33,15 +32,25 @@ class Contour(object):
     Attributes:
         type (str): Melodic contour type
         shape (list): Sequence of UP and DOWN motions which describe a contour
+        random (random.Random): Random context contours are decided with. If
+                                None, the active random manager
     """
 
-    def __init__(self):
+    def __init__(self, random=None):
         super(Contour, self).__init__()
         self.type = None
         self.shape = None
+        self.random = random
         self._availableTypes = availableTypes
         self._typesProbDistr = typesProbDistr
 
+        # distributions of types for backbones of any length, and for
+        # backbones with <3 notes, which only allow single motion types
+        self._typesDistr = Distribution(self._typesProbDistr, random)
+        self._singleMotionTypesDistr = Distribution(
+            {type: prob for type, prob in self._typesProbDistr.items()
+             if len(self._availableTypes[type]) == 1}, random)
+
 
     def decideContour(self, numBackboneNotes):
         """Decides contour type and shape
@@ -69,17 +78,14 @@ class Contour(object):
             type (str): Which countour type to use
         """
 
-        probDistr = dict(self._typesProbDistr)
-
         # case in which we can only have ascending and descending types
         if numBackboneNotes <= 2:
-            for type, shape in self._availableTypes.items():
-                if len(shape) != 1:
-                    del probDistr[type]
+            distr = self._singleMotionTypesDistr
+        else:
+            distr = self._typesDistr
 
         # decide type by using cumulative distr
-        normDistr = toNormalisedCumulativeDistrDict(probDistr)
-        type = decideCumulativeDistrOutcomeDict(normDistr)
+        type = distr.sampleCumulative()
         return type
 
 
@@ -95,7 +101,7 @@ class Contour(object):
         """
         type = self.type
         typeTemplate = self._availableTypes[type]
-        random = RandomManager.getActive()
+        random = getRandom(self.random)
 
         # manage "ascending" and "descending" contour types
         if type == "ascending" or type == "descending":
@@ -1,4 +1,6 @@
+import numpy as np
 from musiclib.melodypitch.contour import Contour
+from musiclib.harmonypitch.chord import noteTypes
 from musiclib.probability import *
 from melodrive.maths.scaling import linlin
 from music21.stream import Stream
@@ -15,6 +17,13 @@ HIGH = "high"
 MAX = 0.71
 MIN = -0.71
 
+# decoders of the backbone pitches. GREEDY decides a pitch at a time, VITERBI
+# finds the best scoring backbone and SAMPLE draws a backbone with
+# probability proportional to its score
+GREEDY = "greedy"
+VITERBI = "viterbi"
+SAMPLE = "sample"
+
 # different tessituras used in conjunction with different arousal levels. The
 # higher the arousal the higher the tessitura used. The lists represnt the
 # interval of MIDI notes for a given tessitura.
@@ -100,16 +109,45 @@ numBestOptions = 5
 # TODO: Decide which notes of a rhythmic sequence are part of backbone
 class MelodyBackboneGenerator(object):
     """MelodyBackboneGenerator is responsible for generating the backbone of a
-    melody"""
+    melody
+
+    Attributes:
+        random (random.Random): Random context contours and pitches are
+                                decided with. If None, the active random
+                                manager
+    """
 
-    def __init__(self):
+    def __init__(self, random=None):
         super(MelodyBackboneGenerator, self).__init__()
+        self.random = random
         self._tessituraData = tessituraData
         self._melGravityScores = melGravityScores
         self._chordNoteScores = chordNoteScores
         self._scoreWeights = scoreWeights
         self._numBestOptions = numBestOptions
         self._modifiers = modifiers
+        self._compileScoreTables()
+
+
+    def _compileScoreTables(self):
+        """Turns the score tables into arrays, so that the pitch options of
+        a note are scored with array operations. Needs to be called whenever
+        the score tables of the generator change."""
+
+        # melodic gravity score of each distance in semitones
+        self._melGravityScoresArray = np.array(
+            [self._melGravityScores[d]
+             for d in range(len(self._melGravityScores))], dtype=float)
+
+        # chord note scores, the rows are indexed by the note type codes of
+        # the chords and the columns by metrical accent
+        self._chordNoteScoresArray = np.array(
+            [self._chordNoteScores[type] for type in noteTypes], dtype=float)
+
+        # compressed score tables of the last music feature values, as
+        # (key, scores) pairs. Features don't change within a backbone
+        self._melGravityScoresCache = None
+        self._chordNoteScoresCache = None
 
 
     def _realizeM21Sequence(self, notes):
@@ -129,7 +167,8 @@ class MelodyBackboneGenerator(object):
 
 
     def generateBackbonePitches(self, backboneNotes, pitchHeight,
-                                pitchRange, melodicComplexity):
+                                pitchRange, melodicComplexity, show=True,
+                                decoder=GREEDY):
         """Generate pitches for a backbone sequence
 
         Args:
@@ -137,10 +176,14 @@ class MelodyBackboneGenerator(object):
             pitchHeight (float): Pitch height feature
             pitchRange (float): Music feature connected with arousal
             melodicComplexity (float): Music feature connected with valence
+            show (bool): If True, the backbone is played as MIDI
+            decoder (str): GREEDY, VITERBI or SAMPLE
 
         Returns:
             backboneoNotes (list of Notes): list of notes with pitches
         """
+        if decoder not in (GREEDY, VITERBI, SAMPLE):
+            raise ValueError("Unknown backbone decoder: {}".format(decoder))
 
         # decide tessitura
         tessitura = self._decideTessitura(pitchHeight)
@@ -148,9 +191,36 @@ class MelodyBackboneGenerator(object):
         numBackboneNotes = len(backboneNotes)
 
         # decide contour
-        c = Contour()
+        c = Contour(self.random)
         contour = c.decideContour(numBackboneNotes)
 
+        if decoder == GREEDY:
+            self._decideGreedyPitches(backboneNotes, contour, tessitura,
+                                      pitchRange, melodicComplexity)
+        elif numBackboneNotes:
+            self._decideLatticePitches(backboneNotes, contour, tessitura,
+                                       pitchRange, melodicComplexity,
+                                       decoder)
+
+        if show:
+            s = self._realizeM21Sequence(backboneNotes)
+            s.show("midi")
+
+        return backboneNotes
+
+
+    def _decideGreedyPitches(self, backboneNotes, contour, tessitura,
+                             pitchRange, melodicComplexity):
+        """Decides the pitches of the backbone notes one at a time, given the
+        pitch of the previous note
+
+        Args:
+            backboneNotes (list of Notes): list of backbone notes
+            contour (list): UP and DOWN motions between the backbone notes
+            tessitura (str): Label of tessitura to use
+            pitchRange (float): Music feature
+            melodicComplexity (float): Music feature
+        """
         previousPitch = None
         contourMotion = None
 
@@ -167,15 +237,16 @@ class MelodyBackboneGenerator(object):
                 contourMotion = contour[i-1]
 
             # select available pitches for backbone note
-            pitchOptions = self._selectPitchOptions(chord, previousPitch,
-                                                contourMotion, tessitura)
+            pitches, noteTypeCodes = self._selectPitchOptions(
+                chord, previousPitch, contourMotion, tessitura)
 
             # calculate scores for each pitch option
-            pitchOptionsScores = self._calculateScores(pitchOptions,
-                        previousPitch, metricalAccent, pitchRange, melodicComplexity)
+            scores = self._calculateScores(pitches, noteTypeCodes,
+                                           previousPitch, metricalAccent,
+                                           pitchRange, melodicComplexity)
 
             # decide note of the backbone
-            pitch = self._decidePitch(pitchOptionsScores)
+            pitch = self._decidePitch(pitches, scores)
 
             # assign pitch to previous pitch for next iteration
             previousPitch = pitch
@@ -183,10 +254,118 @@ class MelodyBackboneGenerator(object):
             # store pitch on to backbone note
             backboneNote.setPitch(pitch)
 
-        s = self._realizeM21Sequence(backboneNotes)
-        s.show("midi")
 
-        return backboneNotes
+    def _decideLatticePitches(self, backboneNotes, contour, tessitura,
+                              pitchRange, melodicComplexity, decoder):
+        """Decides the pitches of all the backbone notes at once, as a path
+        of the pitch lattice
+
+        Args:
+            backboneNotes (list of Notes): list of backbone notes
+            contour (list): UP and DOWN motions between the backbone notes
+            tessitura (str): Label of tessitura to use
+            pitchRange (float): Music feature
+            melodicComplexity (float): Music feature
+            decoder (str): VITERBI or SAMPLE
+        """
+        pitchOptions, initialWeights, transitionWeights = \
+            self._buildPitchLattice(backboneNotes, contour, tessitura,
+                                    pitchRange, melodicComplexity)
+
+        if decoder == VITERBI:
+            path = decodeViterbi(initialWeights, transitionWeights)
+        else:
+            path = sampleForwardBackward(initialWeights, transitionWeights,
+                                         self.random)
+
+        for backboneNote, pitches, index in zip(backboneNotes, pitchOptions,
+                                                path):
+            backboneNote.setPitch(int(pitches[index]))
+
+
+    def _buildPitchLattice(self, backboneNotes, contour, tessitura,
+                           pitchRange, melodicComplexity):
+        """Builds the lattice of the pitch options of the backbone notes.
+        The weight of a pitch is scored like by the greedy decoder given the
+        pitch of the previous note, and is 0 if the motion doesn't follow the
+        contour. The number of best options isn't taken into account, all the
+        chord notes in the tessitura are options.
+
+        Args:
+            backboneNotes (list of Notes): list of backbone notes
+            contour (list): UP and DOWN motions between the backbone notes
+            tessitura (str): Label of tessitura to use
+            pitchRange (float): Music feature
+            melodicComplexity (float): Music feature
+
+        Returns:
+            pitchOptions (list): Pitch options of each backbone note
+            initialWeights (numpy.ndarray): Weight of each pitch of the first
+                note
+            transitionWeights (list): One matrix for each following note,
+                from the pitches of the previous note (rows) to its pitches
+                (columns)
+        """
+        low, high = self._tessituraData["ranges"][tessitura]
+        melGravityScores = self._getMelGravityScores(pitchRange)
+        chordNoteScores = self._getChordNoteScores(melodicComplexity)
+        a = self._scoreWeights["melGravityScore"]
+        b = self._scoreWeights["chordNoteScore"]
+
+        pitchOptions = []
+        initialWeights = None
+        transitionWeights = []
+        for i, backboneNote in enumerate(backboneNotes):
+            chord = backboneNote.getUnderlyingChord()
+            metricalAccent = backboneNote.rhythm.getMetricalAccent()
+            pitches, noteTypeCodes = chord.shape.getPitchRange(low, high)
+            noteScores = chordNoteScores[noteTypeCodes, metricalAccent]
+
+            if i == 0:
+                initialWeights = noteScores
+            else:
+                previousPitches = pitchOptions[-1]
+                pitchDistances = np.abs(pitches[np.newaxis, :] -
+                                        previousPitches[:, np.newaxis])
+                weights = a * melGravityScores[pitchDistances] + \
+                    b * noteScores[np.newaxis, :]
+                allowed = self._getContourMask(previousPitches, pitches,
+                                               contour[i-1], low, high)
+                transitionWeights.append(np.where(allowed, weights, 0.0))
+            pitchOptions.append(pitches)
+
+        return pitchOptions, initialWeights, transitionWeights
+
+
+    @staticmethod
+    def _getContourMask(previousPitches, pitches, contourMotion, low, high):
+        """Returns which transitions between the pitches of two notes follow
+        the contour, with the same fallbacks as _selectPitchOptions: motion
+        isn't constrained from the extremes of the tessitura, nor when no
+        pitch follows it
+
+        Args:
+            previousPitches (numpy.ndarray): Pitch options of previous note
+            pitches (numpy.ndarray): Pitch options of the note
+            contourMotion (str): UP or DOWN
+            low (int): Lowest pitch of the tessitura
+            high (int): Highest pitch of the tessitura
+
+        Returns:
+            allowed (numpy.ndarray): Boolean matrix, the rows are the
+                                     previous pitches
+        """
+        previousPitches = previousPitches[:, np.newaxis]
+        if contourMotion == UP:
+            allowed = (pitches >= previousPitches) | \
+                (previousPitches >= high)
+        else:
+            allowed = (pitches <= previousPitches) | \
+                (previousPitches <= low)
+
+        # allow all the pitches from previous pitches without options
+        allowed |= ~allowed.any(axis=1, keepdims=True)
+        return allowed
     
     
     def _decideTessitura(self, pitchHeight):
@@ -222,9 +401,10 @@ class MelodyBackboneGenerator(object):
             tessitura (str): Label of tessitura to use
 
         Returns:
-            pitchOptions (dict): Available pitch options for a given
-                backbone note, with info to note type. The dict is of the
-                type {33: "fundamental", 44: "3rd",...}
+            pitches (numpy.ndarray): Available pitch options for a given
+                backbone note, sorted. Read-only
+            noteTypeCodes (numpy.ndarray): Index in noteTypes of the note
+                type of each pitch option. Read-only
         """
         tessituraRange = self._tessituraData["ranges"][tessitura]
         range = tessituraRange
@@ -249,178 +429,208 @@ class MelodyBackboneGenerator(object):
 
         # get all of the pitches corresponding to the chord notes of the
         # chord accross the tessitura range
-        pitchOptions = chord.calcPitchesTypes(range)
+        shape = chord.shape
+        pitches, noteTypeCodes = shape.getPitchRange(range[0], range[1])
 
         # recalculate pitch options with the complete tessitura range if
         # there's no available pitch with the range constrained with contour
-        if len(pitchOptions) == 0:
-            pitchOptions = chord.calcPitchesTypes(tessituraRange)
+        if len(pitches) == 0:
+            pitches, noteTypeCodes = shape.getPitchRange(tessituraRange[0],
+                                                         tessituraRange[1])
 
-        return pitchOptions
+        return pitches, noteTypeCodes
 
 
-    def _calculateScores(self, pitchOptions, previousPitch, metricalAccent,
-                         pitchRange, melodicComplexity):
+    def _calculateScores(self, pitches, noteTypeCodes, previousPitch,
+                         metricalAccent, pitchRange, melodicComplexity):
         """Calculates the combined scores for the different pitch options
 
         Args:
-            pitchOptions (dict): Available pitch options for a given
-                backbone note, with info to note type. The dict is of the
-                type {33: "fundamental", 44: "3rd",...}
+            pitches (numpy.ndarray): Available pitch options for a given
+                backbone note
+            noteTypeCodes (numpy.ndarray): Index in noteTypes of the note
+                type of each pitch option
             previousPitch (int): Pitch of previous backbone note
             metricalAccent (int): Metrical accent of the backbone note
             pitchRange (float): Music feature
             melodicComplexity (float): Music feature
 
         Returns:
-            pitchScores (dict): Dict of the type {pitch: score, ...}
+            scores (numpy.ndarray): Score of each pitch option
         """
 
-        # calculate melodic gravity score in case we're at least at the
-        # second backbone note
-        if previousPitch:
-            melodicGravityScores = self._calcMelodicGravityScores(
-                        list(pitchOptions.keys()), previousPitch, pitchRange)
-
         # calculate chord note score
-        chordNoteScores = self._calcChordNoteScores(pitchOptions,
+        chordNoteScores = self._calcChordNoteScores(noteTypeCodes,
                                     metricalAccent, melodicComplexity)
 
-        # get weights for linear combination
-        a = self._scoreWeights["melGravityScore"]
-        b = self._scoreWeights["chordNoteScore"]
-
-        scores = {}
-
-        # do linear combination of scores if we're at least at the second note
+        # do linear combination of scores if we're at least at the second
+        # note, calculating melodic gravity score
         if previousPitch:
-            for (p, s), (_, s2) in zip(melodicGravityScores.items(),
-                                       chordNoteScores.items()):
-                scores[p] = a * s + b * s2
-        else:
-            scores = chordNoteScores
+            melodicGravityScores = self._calcMelodicGravityScores(
+                pitches, previousPitch, pitchRange)
 
-        return scores
+            # get weights for linear combination
+            a = self._scoreWeights["melGravityScore"]
+            b = self._scoreWeights["chordNoteScore"]
+            return a * melodicGravityScores + b * chordNoteScores
 
+        return chordNoteScores
 
-    def _calcMelodicGravityScores(self, pitchOptions, previousPitch,
-                                  pitchRange):
+
+    def _calcMelodicGravityScores(self, pitches, previousPitch, pitchRange):
         """Calculate the score for melodic gravity, which favours the
         closeness between subsequent notes of the backbone
 
         Args:
-            pitchOptions (list): Available pitch options for a given
+            pitches (numpy.ndarray): Available pitch options for a given
                 backbone note
             previousPitch (int): Pitch of previous backbone note
             pitchRange (float): Music feature that acts as a modifier
 
         Returns:
-            scores (dict): Dict of the type {pitch: score, ...}
+            scores (numpy.ndarray): Score of each pitch option
         """
-        # calculate distance between previous pitch and pitch options
-        pitchDistances = [abs(p - previousPitch) for p in pitchOptions]
+        # calculate distance between previous pitch and pitch options, and
+        # select the relevant scores
+        pitchDistances = np.abs(np.asarray(pitches) - previousPitch)
+        return self._getMelGravityScores(pitchRange)[pitchDistances]
+
 
-        scores = {}
+    def _getMelGravityScores(self, pitchRange):
+        """Returns the melodic gravity score of each distance, compressed
+        based on pitch range
 
-        # iterate through all distances, select relevant score and update
-        # scores dict
-        for i, d in enumerate(pitchDistances):
-            score = self._melGravityScores[d]
-            pitch = pitchOptions[i]
-            scores[pitch] = score
+        Args:
+            pitchRange (float): Music feature that acts as a modifier
 
+        Returns:
+            scores (numpy.ndarray):
+        """
+        maxImpact = self._modifiers["maxPitchRangeImpact"]
+        key = (pitchRange, maxImpact)
+        if self._melGravityScoresCache is not None and \
+                self._melGravityScoresCache[0] == key:
+            return self._melGravityScoresCache[1]
 
-        maxVal = max(list(self._melGravityScores.values()))
+        scores = self._melGravityScoresArray
+        maxVal = scores.max()
 
         # calculate middle point in scores
         attractionValue = maxVal / 2.0
 
         # calculate attraction rate for compression
-        pitchRangeImpact = linlin(pitchRange, MIN, MAX, 0,
-                            self._modifiers["maxPitchRangeImpact"])
+        pitchRangeImpact = linlin(pitchRange, MIN, MAX, 0, maxImpact)
 
         # compress the scores based on pitch range
         scores = self._compressValues(attractionValue, scores,
                                       pitchRangeImpact)
-
+        self._melGravityScoresCache = (key, scores)
         return scores
 
 
-    def _calcChordNoteScores(self, pitchOptions, metricalAccent,
+    def _calcChordNoteScores(self, noteTypeCodes, metricalAccent,
                              melodicComplexity):
         """Calculate the score for chord notes, which favours the
         fundamental over the 3rd and other components of the chord
 
         Args:
-            pitchOptions (dict): Available pitch options for a given
-                backbone note, with info to note type. The dict is of the
-                type {33: "fundamental", 44: "3rd",...}
+            noteTypeCodes (numpy.ndarray): Index in noteTypes of the note
+                type of each pitch option
             metricalAccent (int): Metrical accent of the backbone note
             melodicComplexity (float): Music feature
 
         Returns:
-            scores (dict): Dict of the type {pitch: score, ...}
+            scores (numpy.ndarray): Score of each pitch option
         """
 
-        scores = {}
+        scores = self._getChordNoteScores(melodicComplexity)
+        return scores[noteTypeCodes, metricalAccent]
+
+
+    def _getChordNoteScores(self, melodicComplexity):
+        """Returns the score of each note type at each metrical accent,
+        compressed based on melodic complexity
 
-        # iterate through all options and get score for given pitch/metrical
-        # accent
-        for pitch, type in pitchOptions.items():
-            score = self._chordNoteScores[type][metricalAccent]
-            scores[pitch] = score
+        Args:
+            melodicComplexity (float): Music feature
 
+        Returns:
+            scores (numpy.ndarray): Rows are indexed by note type code and
+                                    columns by metrical accent
+        """
+        maxImpact = self._modifiers["maxMelodicComplexityImpact"]
+        key = (melodicComplexity, maxImpact)
+        if self._chordNoteScoresCache is not None and \
+                self._chordNoteScoresCache[0] == key:
+            return self._chordNoteScoresCache[1]
 
-        maxVal = 0
+        scores = self._chordNoteScoresArray
 
-        # get biggest score in chord note scores
-        for type, values in self._chordNoteScores.items():
-            v = self._chordNoteScores[type][metricalAccent]
-            if v > maxVal:
-                maxVal = v
+        # get biggest score in chord note scores for each metrical accent
+        maxVals = np.maximum(scores.max(axis=0), 0)
 
         # calculate middle point in scores
-        attractionValue = maxVal / 2.0
+        attractionValues = maxVals / 2.0
 
         # calculate attraction rate for compression
         melodicComplexityImpact = linlin(melodicComplexity, MIN, MAX, 0,
-                            self._modifiers["maxMelodicComplexityImpact"])
-
+                                         maxImpact)
 
         # compress the scores based on melodic complexity
-        scores = self._compressValues(attractionValue, scores,
+        scores = self._compressValues(attractionValues, scores,
                                       melodicComplexityImpact)
-
+        self._chordNoteScoresCache = (key, scores)
         return scores
 
 
-    def _decidePitch(self, pitchOptionsScores):
+    def _decidePitch(self, pitches, scores):
         """Decide which pitch to pick for a backbone note. We limit the
         number of options among which we pick up the pitch to the best scoring
         pitches
 
         Args:
-            pitchOptionsScores (dict): Dict of the type {pitch: score}
+            pitches (numpy.ndarray): Pitch options
+            scores (numpy.ndarray): Score of each pitch option
 
         Returns:
             pitch (int): MIDI note
         """
 
-        numBestOptions = self._numBestOptions
-
         # in case we have more options than the number of best ones we want
         # to consider, filter the pitch options
-        if len(pitchOptionsScores) >= numBestOptions:
-            pitches = sorted(pitchOptionsScores, key=pitchOptionsScores.get,
-                                reverse=True)[:numBestOptions]
-            pitchOptionsScores = {pitch: score for pitch, score in
-                                  pitchOptionsScores.items() if pitch in
-                                  pitches}
+        bestIndexes = self._selectBestOptions(scores, self._numBestOptions)
 
-        # decide pitch by using cumulative distr
-        normDistr = toNormalisedCumulativeDistrDict(pitchOptionsScores)
-        pitch = decideCumulativeDistrOutcomeDict(normDistr)
-        return pitch
+        # decide pitch by using cumulative distr. There are only a few best
+        # options, so the distribution is faster to build as a list
+        normDistr = toNormalisedCumulativeDistr(scores[bestIndexes].tolist())
+        index = decideCumulativeDistrOutcome(normDistr, self.random)
+        return int(pitches[bestIndexes[index]])
+
+
+    @staticmethod
+    def _selectBestOptions(scores, numBestOptions):
+        """Returns the indexes of the best scoring options, in their original
+        order. Ties with the lowest of the best scores are broken in favour
+        of the first options.
+
+        Args:
+            scores (numpy.ndarray):
+            numBestOptions (int):
+
+        Returns:
+            indexes (numpy.ndarray):
+        """
+        numOptions = len(scores)
+        if numOptions <= numBestOptions:
+            return np.arange(numOptions)
+
+        # lowest score among the best ones
+        threshold = np.partition(scores, numOptions - numBestOptions)[
+            numOptions - numBestOptions]
+        isBest = scores > threshold
+        numTies = numBestOptions - np.count_nonzero(isBest)
+        isBest[np.flatnonzero(scores == threshold)[:numTies]] = True
+        return np.flatnonzero(isBest)
 
 
     # TODO: Put this in a class by itself, with all of this auxilary functions
@@ -428,24 +638,15 @@ class MelodyBackboneGenerator(object):
         """Compresses a list of values around a given value.
 
         Args:
-            attractionValue (float): Value among which values will be attracted
-            values (dict): Dict of values to transform
+            attractionValue (float): Value among which values will be
+                                     attracted. Can also be an array which
+                                     is broadcast against 'values'
+            values (numpy.ndarray): Values to transform
             attractionRate (float): Number between 0 and 1 that determines
                                     how much the values will be clustered
                                     around 'attractionValue'
 
         Returns:
-            commpressedValues (list):
+            commpressedValues (numpy.ndarray):
         """
-
-        compressedValues = {}
-
-        for key, value in values.items():
-            dist = value - attractionValue
-            if dist >= 0:
-                compressedValue = value - (dist * attractionRate)
-            else:
-                compressedValue = value + (abs(dist) * attractionRate)
-            compressedValues[key] = compressedValue
-
-        return compressedValues
\ No newline at end of file
+        return values - (values - attractionValue) * attractionRate
\ No newline at end of file
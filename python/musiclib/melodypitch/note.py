@@ -1,3 +1,6 @@
+from musiclib.ticks import convertTicks
+
+
 class Note():
     """The Note class represents a note with information about, duration,
     metre, pitch and underlying chord"""
@@ -19,6 +22,23 @@ class Note():
         return self.rhythm
 
 
+    def getDuration(self):
+        return self.rhythm.getDuration()
+
+
+    def getDurationTicks(self, ticksPerQuarter=None):
+        """Returns the duration of the note in the ticks of its rhythm, or
+        in 'ticksPerQuarter' ticks when given"""
+        if ticksPerQuarter is None:
+            return self.rhythm.getDurationTicks()
+        return convertTicks(self.rhythm.getDurationTicks(),
+                            self.rhythm.getTicksPerQuarter(), ticksPerQuarter)
+
+
+    def getTicksPerQuarter(self):
+        return self.rhythm.getTicksPerQuarter()
+
+
     def getUnderlyingChord(self):
         return self.underlyingChord
 
@@ -1,7 +1,10 @@
+from collections import OrderedDict
 from musiclib.rhythmgenerator import RhythmGenerator
+from musiclib.persistentrhythmtree import PersistentRhythmTree
+from musiclib.rhythmchain import RhythmChain, RhythmChainMixture
+from musiclib.rhythmsequence import RhythmSequence
 from musiclib.probability import *
 from musiclib.rhythmdata import rhythmData as rd
-from melodrive.stats.randommanager import RandomManager
 
 #TODO: Internal repetition, prefer duration levels of tuplets, elaborate
 # duration fingerprint, add rests, fix bug
@@ -20,7 +23,7 @@ tactusDistScores = rd["melody"]["tactusDistScores"]
 # the column indexes represent the metrical accent.
 metricalProminenceScores = rd["melody"]["metricalProminenceScores"]
 
-musicFeaturesMaxImpact = rd["melody"]["metricalProminenceScores"]
+musicFeaturesMaxImpact = rd["melody"]["musicFeaturesMaxImpact"]
 
 weightMetrics = rd["melody"]["weightMetrics"]
 
@@ -58,28 +61,53 @@ class MelodyRhythmGenerator(RhythmGenerator):
     """MelodyRhythmGenerator is responsible for generating melodic rhythm
     using the rhythm space tree
 
+    Attributes:
+        flatRhythmSpace (bool): If True, bars are generated from
+                                FlatRhythmTree versions of the rhythm space,
+                                which are built and get their tuplets without
+                                creating node objects. Bars are the same as
+                                with the default persistent versions
+        rhythmSpace (RhythmTree): Rhythm space tree. With a flat rhythm
+                                  space, the root FlatRhythmTreeNode
     """
 
-    def __init__(self, metre):
-        super(MelodyRhythmGenerator, self).__init__(metre)
+    def __init__(self, metre, random=None, flatRhythmSpace=False):
+        super(MelodyRhythmGenerator, self).__init__(metre, random=random)
 
         timeSignature = metre.getTimeSignature()
         #TODO: I don't think this value (lowestDurationLevel) should come from the time signature-
         # How do we support generating trees of differing depths in the same metre?
-        lowestDurationLevel = lowestDurationLevelOptions[timeSignature]
-        self.rhythmSpace = self.rsf.createRhythmTree(lowestDurationLevel,
-                                                     metre)
+        self._lowestDurationLevel = lowestDurationLevelOptions[timeSignature]
+        self.flatRhythmSpace = flatRhythmSpace
+
+        # rhythm space that all the bars are generated from. Tuplets are
+        # added to new versions of it: persistent versions share all the
+        # nodes without tuplets with it, flat versions are copies of its
+        # arrays. Its depth is the lowest duration level of the time
+        # signature, as the score tables only cover the duration levels down
+        # to it. Bars used to be generated from trees of depth 4 whatever the
+        # time signature, whose lowest level had no scores in 3/4
+        if flatRhythmSpace:
+            self._baseRhythmSpace = self.rsf.createFlatRhythmTree(
+                self._lowestDurationLevel, metre)
+            self.rhythmSpace = self._baseRhythmSpace.getRoot()
+        else:
+            self.rhythmSpace = self.rsf.createRhythmTree(
+                self._lowestDurationLevel, metre)
+            self._baseRhythmSpace = PersistentRhythmTree.fromRhythmTree(
+                                                        self.rhythmSpace)
 
         self._tactusScoreByDistance = tactusDistScores[timeSignature]
         self._metricalProminenceScores = metricalProminenceScores[
             timeSignature]
 
-        self._VAfeaturesMaxImpact = musicFeaturesMaxImpact
+        self._musicFeaturesMaxImpact = musicFeaturesMaxImpact
 
         self._densityImpactDurationLevels = densityImpactDurationLevels[
             timeSignature]
 
         self._weightMetrics = weightMetrics[timeSignature]
+        self._compileScoreTables()
         self._probabilityDot = probabilityDot[timeSignature]
         self._probabilitySingleDot = probabilitySingleDot[timeSignature]
         self._probabilityTie = probabilityTie[timeSignature]
@@ -88,30 +116,86 @@ class MelodyRhythmGenerator(RhythmGenerator):
         self._probTupletType = probTupletType[timeSignature]
         self._additionalMUmaterial = additionalMUmaterial[timeSignature]
 
+        # distributions of the duration level of pickup/prolongation
+        self._additionalBarDurationLevelDistr = {
+            type: Distribution(material["distrDurationLevel"], random)
+            for type, material in self._additionalMUmaterial.items()}
+
 
     def generateMelodicRhythmMU(self, metre, numBarsMU):
-        random = RandomManager.getActive()
-        rhythmicSeq = []
+        """Generates a melodic rhythm sequence for a MU
+
+        Args:
+            metre (Metre):
+            numBarsMU (int): Number of core bars in a MU
+
+        Returns:
+            rhythmSequence (RhythmSequence): Sequence with a bar for the
+                                             pickup, each core bar and the
+                                             prolongation
+        """
+        bars = list(self.generateMelodicRhythmMUBars(metre, numBarsMU))
+        if not bars:
+            return RhythmSequence.empty(metre.getTicksPerQuarter())
+        return RhythmSequence.concatenate(bars)
+
+
+    def generateMelodicRhythmMUBars(self, metre, numBarsMU):
+        """Yields the bars of a MU one at a time, as soon as each of them
+        is generated
+
+        Args:
+            metre (Metre):
+            numBarsMU (int): Number of core bars in a MU
+
+        Yields:
+            bar (RhythmSequence): Pickup, core bar or prolongation
+        """
+        random = getRandom(self.random)
 
         # decide whether to generate pickup
         if random.random() < self._additionalMUmaterial["pickup"]["prob"]:
-            pickupSeq = self._generateAdditionalBar(metre, "pickup")
-            rhythmicSeq.append(pickupSeq)
+            rhythmChain = self._getAdditionalBarChain(metre, "pickup")
+            yield rhythmChain.sampleBarSequence(random)
 
         # generate core bars
         for _ in range(numBarsMU):
-            barSeq = self._generateMelodicRhythmBar(metre)
-            rhythmicSeq.append(barSeq)
+            rhythmChain = self._getMelodicRhythmBarChain(metre)
+            yield rhythmChain.sampleBarSequence(random)
 
         # decide whether to generate prolongation
         if random.random() < self._additionalMUmaterial["prolongation"]["prob"]:
-            prolongationSeq = self._generateAdditionalBar(metre,
-                                                          "prolongation")
-            rhythmicSeq.append(prolongationSeq)
+            rhythmChain = self._getAdditionalBarChain(metre, "prolongation")
+            yield rhythmChain.sampleBarSequence(random)
 
-        print()
-        print(rhythmicSeq)
-        return rhythmicSeq
+
+    def generateMelodicRhythmBars(self, metre, numBars=None):
+        """Yields core bars one at a time. Changes of the features take
+        effect from the next bar.
+
+        Args:
+            metre (Metre):
+            numBars (int): Number of bars. If None, bars are yielded forever
+
+        Yields:
+            bar (RhythmSequence):
+        """
+        return self._generateRhythmBars(metre, numBars)
+
+
+    def generateMelodicRhythmEvents(self, metre, state=None):
+        """Yields the durations of core bars one at a time. Changes of the
+        features take effect from the next event.
+
+        Args:
+            metre (Metre):
+            state (RhythmStreamState): State the stream resumes from. If
+                                       None, the stream starts a new bar
+
+        Yields:
+            event (RhythmSequenceElement):
+        """
+        return self._generateRhythmEvents(metre, state)
 
 
     def elaborateDurationFingerprint(self, fingerprint):
@@ -120,12 +204,26 @@ class MelodyRhythmGenerator(RhythmGenerator):
 
 
     def _generateAdditionalBar(self, metre, type):
+        return self._getAdditionalBarChain(metre, type).sampleBar(
+            self.random)
+
+
+    def _getAdditionalBarChain(self, metre, type):
+        """Returns the chain of a pickup or prolongation, whose duration
+        level is sampled
+
+        Args:
+            metre (Metre):
+            type (str): "pickup" or "prolongation"
+
+        Returns:
+            rhythmChain (RhythmChain):
+        """
 
         # decide duration level pickup/prolongation
-        distr = self._additionalMUmaterial[type]["distrDurationLevel"]
-        distr = toNormalisedCumulativeDistr(distr)
-        durationLevel = decideCumulativeDistrOutcome(distr) + 1
-        currentRS = self.rsf.createRhythmTree(4, metre)
+        distr = self._additionalBarDurationLevelDistr[type]
+        durationLevel = distr.sampleCumulative() + 1
+        currentRS = self._getRoot(self._baseRhythmSpace)
 
         if type == "pickup":
             indexChild = 1
@@ -139,87 +237,121 @@ class MelodyRhythmGenerator(RhythmGenerator):
 
         duration = currentRS.getDuration()
 
-        totDuration = 0
-        numDots = 0
-        rhythmicSeq = []
+        # only the rhythms which fill the duration exactly are sampled
+        return self._getRhythmChain(metre, currentRS, (type, durationLevel),
+                                    duration)
 
-        while round(totDuration, 4) != duration:
-            currentRS, rhythmicSeqElement, numDots = self._generateRhythmicUnit(
-                currentRS, numDots, metre)
-            rhythmicSeq.append(rhythmicSeqElement)
-            totDuration += rhythmicSeqElement[0]
 
-        return rhythmicSeq
+    def compileRhythmChain(self, metre):
+        """Returns the Markov chain of the core bars, with the current
+        features. Bars are generated from versions of the rhythm space with
+        random tuplets, so the chain first chooses a version, with the
+        probability of its tuplets, then walks the chain of that version.
+        There are thousands of versions in 4/4, so compiling takes seconds.
+
+        Args:
+            metre (Metre):
 
+        Returns:
+            rhythmChain (RhythmChainMixture):
+        """
+        if self.flatRhythmSpace:
+            enumerateTupletConfigurations = \
+                self.rsf.enumerateFlatTupletConfigurations
+        else:
+            enumerateTupletConfigurations = \
+                self.rsf.enumerateTupletConfigurations
+
+        versions = OrderedDict()
+        for prob, rhythmSpace in enumerateTupletConfigurations(
+                self._baseRhythmSpace, self._probTuplets,
+                self._probTupletType):
+            signature = rhythmSpace.getSignature()
+            if signature in versions:
+                versions[signature][0] += prob
+            else:
+                versions[signature] = [prob, rhythmSpace]
 
-    def _generateRhythmicUnit(self, currentRS, numDots, metre):
+        # the chains aren't cached, as there are more versions than the
+        # cache holds
+        return RhythmChainMixture(
+            [(prob, RhythmChain.fromRhythmGenerator(
+                self, metre, self._getRoot(rhythmSpace)))
+             for prob, rhythmSpace in versions.values()])
 
-        # get all candidate durations
-        candidates = currentRS.getDurationCandidates(numDots)
 
-        # calculate scores associated to the metrics
-        scores = self._calcScores(candidates, metre)
+    def _getRoot(self, rhythmSpace):
+        """Returns the node of the root of a version of the rhythm space"""
+        if self.flatRhythmSpace:
+            return rhythmSpace.getRoot()
+        return rhythmSpace.getCursor()
 
-        # choose new duration
-        currentRS = self._decideNextDuration(scores, candidates)
 
-        duration = currentRS.getDuration()
+    def _calcOrnamentProbabilities(self, currentRS):
+        """Returns the probabilities of the ties and dots applied to a chosen
+        node. A tie can only be applied to last children, and dots to first
+        children not followed by tuplets.
 
-        # index 1 indicates no tie
-        rhythmicSeqElement = [duration, None]
+        Args:
+            currentRS (RhythmTree): Chosen rhythm space node
 
+        Returns:
+            ornaments (list): (numDots, tie, probability) tuples
+        """
         durationLevelRD = currentRS.getDurationLevel()
 
-        # reset number of dots
-        numDots = 0
-
-        # if current rs is last child we can apply a tie, otherwise a dot
         if currentRS.isLastChild():
-            rhythmicSeqElement = self._decideToApplyTie(
-                rhythmicSeqElement, durationLevelRD)
+            probTie = self._calcTieProbability(durationLevelRD)
+            return [(0, 't', probTie), (0, None, 1 - probTie)]
         elif currentRS.isFirstChild():
             rightSibling = currentRS.getRightSibling()
 
             if not rightSibling.hasTupletAncestors():
-                rhythmicSeqElement, numDots = self._decideToApplyDot(currentRS)
+                maxDepth = self._lowestDurationLevel - durationLevelRD
+                probDots = self._calcDotProbabilities(durationLevelRD,
+                                                      maxDepth)
+                return [(numDots, None, prob)
+                        for numDots, prob in enumerate(probDots)]
 
-        return currentRS, rhythmicSeqElement, numDots
+        return [(0, None, 1)]
 
-    #TODO: we're going to need to be able to generate an arbitrary amount of
-    # duration for the generator model, where we'll have to pass in the necessary
-    # information (currentTimeInBar, prevNote, etc.)
-    # Also, we're going to want to generalize this
+    #TODO: we're going to want to generalize this
     #   For example, we may want to generate a tree with lowestMetricalLevel of 1,
     #   so that we can generate just the background rhythm.
     def _generateMelodicRhythmBar(self, metre):
-        rhythmicSeq = []
+        return self._getMelodicRhythmBarChain(metre).sampleBar(self.random)
 
-        totDuration = 0
 
-        # num of dots currentRS
-        numDots = 0
+    def _getMelodicRhythmBarChain(self, metre):
+        """Returns the chain of a bar generated from a new version of the
+        rhythm space with tuplets
 
-        # TODO: Solve bug. If we instantiate rhythmSpace only once,
-        # sometimes when we restore the tree, a currentRS emerges which
-        # has the wrong parent
-        # TODO: this may relate to the doubly-linked comment(s) i made in tree.py -
-        # perhaps the parent isn't being set properly and happens to point to a valid (and arbitrary) node object?
-        # We need to fix this to test the testTreeDepthOfOne and testTreeDepthOfTwo tests
-        #currentRS = self.rhythmSpace
-        currentRS = self.rsf.createRhythmTree(4, metre)
-        currentRS =self.rsf.addTupletsToRhythmTree(currentRS,
-                                                   self._probTuplets, self._probTupletType)
+        Args:
+            metre (Metre):
 
-        # traverse the rhythm space until bar is filled
-        while round(totDuration, 4) != self._barDuration:
-            currentRS, rhythmicSeqElement, numDots = self._generateRhythmicUnit(
-                currentRS, numDots, metre)
-            rhythmicSeq.append(rhythmicSeqElement)
-            totDuration += rhythmicSeqElement[0]
+        Returns:
+            rhythmChain (RhythmChain):
+        """
+        rhythmTree, treeKey = self._createStreamBar(metre)
+        return self._getRhythmChain(metre, rhythmTree, treeKey)
 
-        # self.rsf.restoreRhythmTree(self.rhythmSpace)
 
-        return rhythmicSeq
+    def _createStreamBar(self, metre):
+        # add tuplets to a new version of the rhythm space, so that the base
+        # rhythm space never needs to be restored
+        if self.flatRhythmSpace:
+            rhythmSpace = self.rsf.addTupletsToFlatRhythmTree(
+                self._baseRhythmSpace.copy(), self._probTuplets,
+                self._probTupletType)
+        else:
+            rhythmSpace = self.rsf.addTupletsToPersistentRhythmTree(
+                self._baseRhythmSpace, self._probTuplets,
+                self._probTupletType)
+
+        # the bar is generated traversing the rhythm space until it's filled
+        # exactly. Versions of the rhythm space with the same tuplets share
+        # the chain
+        return self._getRoot(rhythmSpace), ("bar", rhythmSpace.getSignature())
 
 
     def _generateHarmonicRhythmBar(self, metre, harmonicDensityImpact):
@@ -286,30 +418,8 @@ class MelodyRhythmGenerator(RhythmGenerator):
                            each candidate duration
         """
 
-        tactusLevel = metre.getTactusLevel()
-
-        # calculate metrical position scores
-        mp = self._calcMetricalProminenceMetric(candidates)
-
-        # calculate distance harmonic tactus scores
-        dt = self._calcDistFromTactusMetric(candidates, tactusLevel)
-
-        # retrieve score weights
-        a = self._weightMetrics["metricalProminence"]
-        b = self._weightMetrics["distTactus"]
-
-        # create new list with linear combination of scores
-        scores = [a*x + b*y for x, y in zip(mp, dt)]
-
-        MAXSCORE = a + b
-
-        # modify scores based on rhythmic density
-        scores = self._modifyScoresForDensity(candidates, scores, MAXSCORE)
-
-        # modify scores based on rhythmic entropy
-        scores = self._modifyScoresForEntropy(scores, MAXSCORE)
-
-        return scores
+        tactusLevel = self._getTactusLevel(metre)
+        return self._calcCombinedScores(candidates, tactusLevel)
 
 
 
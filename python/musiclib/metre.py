@@ -1,4 +1,6 @@
 from .tactus import Tactus
+from .rhythmtree import MAXNUMDOTS
+from .ticks import TUPLETTYPES, calculateTicksPerQuarter, durationToTicks
 FOURFOUR = "4/4"
 THREEFOUR = "3/4"
 
@@ -154,7 +156,7 @@ class Metre(object):
         return self.tactus
 
     def getTactusLevel(self):
-        return self.tactus["durationLevel"]
+        return self.tactus.durationLevel
 
     def getDurationLevels(self):
         return self.durationLevelLabels
@@ -193,3 +195,31 @@ class Metre(object):
 
     def getBarDuration(self):
         return self.barDuration
+
+    def getLevelDurations(self):
+        """Returns the durations of all the duration levels, from the bar
+        down to the lowest duration level"""
+        totalDur = self.barDuration
+        durations = [totalDur]
+        for k in sorted(self.subdivisions.keys()):
+            totalDur /= self.subdivisions[k]
+            durations.append(totalDur)
+        return durations
+
+    def getTicksPerQuarter(self, tupletTypes=TUPLETTYPES):
+        """Returns the number of ticks per quarter note that represents
+        exactly all the durations of the metre, including dotted durations and
+        the items of tuplets of 'tupletTypes'
+
+        Args:
+            tupletTypes (tuple): Types of tuplets that can be inserted
+
+        Returns:
+            ticksPerQuarter (int):
+        """
+        return calculateTicksPerQuarter(self.getLevelDurations(), tupletTypes,
+                                        MAXNUMDOTS)
+
+    def getBarTicks(self, tupletTypes=TUPLETTYPES):
+        return durationToTicks(self.barDuration,
+                               self.getTicksPerQuarter(tupletTypes))
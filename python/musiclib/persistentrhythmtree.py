@@ -0,0 +1,527 @@
+from collections import OrderedDict
+from musiclib.rhythmtree import RhythmTree, MAXNUMDOTS
+from musiclib.ticks import convertTicks, ticksToDuration
+
+# max number of tree structures whose successor index is kept
+CANDIDATEPATHSCACHESIZE = 4096
+
+
+class PersistentRhythmTree(object):
+    """PersistentRhythmTree is an immutable node of a rhythm space tree.
+    Nodes don't refer to their parent, so the same node can be shared by many
+    versions of a tree. Replacing a node returns a new root which copies the
+    nodes on the path to the replaced node and shares all the others.
+    Navigation is done through RhythmTreeCursor objects, which know the path
+    from the root.
+
+    Attributes:
+        durationTicks (int): Duration of node of the rhythm space in ticks
+        ticksPerQuarter (int): Resolution of the ticks
+        duration (float): Duration of node in quarter notes
+        durationLevel (int):  Metrical level of node of the rhythm space
+        metricalAccent (int): Metrical accent level in the metrical grid
+        lowestDurationLevel (int): Lowest duration level of the tree
+        hasTupletChildren (bool): Flag to know whether node has children
+                                  that are a tuplet
+        children (tuple): Children of the node
+    """
+
+    __slots__ = ("durationTicks", "ticksPerQuarter", "durationLevel",
+                 "metricalAccent", "lowestDurationLevel", "hasTupletChildren",
+                 "children", "_signature", "_durationCandidates")
+
+    # successor index of every tree structure as paths, keyed by the
+    # signature of the root, least recently used first. Versions of a tree
+    # with the same structure share it
+    _candidatePathsCache = OrderedDict()
+
+    def __init__(self, durationTicks, durationLevel, metricalAccent,
+                 lowestDurationLevel, ticksPerQuarter, hasTupletChildren=False,
+                 children=()):
+        super(PersistentRhythmTree, self).__init__()
+        self.durationTicks = durationTicks
+        self.ticksPerQuarter = ticksPerQuarter
+        self.durationLevel = durationLevel
+        self.metricalAccent = metricalAccent
+        self.lowestDurationLevel = lowestDurationLevel
+        self.hasTupletChildren = hasTupletChildren
+        self.children = tuple(children)
+        self._signature = None
+
+        # cursors of the duration candidates of the nodes of the tree rooted
+        # in this node, keyed by path. Filled in by getDurationCandidates
+        self._durationCandidates = None
+
+
+    def __str__(self, level=0):
+        representation = "  " * level + str(self.duration) + "\n"
+        for child in self.children:
+            representation += child.__str__(level+1)
+        return representation
+
+
+    @classmethod
+    def fromRhythmTree(cls, rhythmTree):
+        """Creates a persistent copy of a RhythmTree and its descendants
+
+        Args:
+            rhythmTree (RhythmTree): Node to be copied
+
+        Returns:
+            node (PersistentRhythmTree):
+        """
+        lowestDurationLevel = rhythmTree.getLowestDurationLevel()
+        return cls._fromRhythmTreeNode(rhythmTree, lowestDurationLevel)
+
+
+    @classmethod
+    def _fromRhythmTreeNode(cls, rhythmTree, lowestDurationLevel):
+        children = [cls._fromRhythmTreeNode(child, lowestDurationLevel)
+                    for child in rhythmTree.children]
+        return cls(rhythmTree.durationTicks, rhythmTree.durationLevel,
+                   rhythmTree.metricalAccent, lowestDurationLevel,
+                   rhythmTree.ticksPerQuarter, rhythmTree.hasTupletChildren,
+                   children)
+
+
+    def toRhythmTree(self):
+        """Returns a mutable RhythmTree copy of the node and its descendants.
+        The copy is a root, so it holds the lowest duration level.
+        """
+        rhythmTree = self._toRhythmTreeNode()
+        rhythmTree.setLowestDurationLevel(self.lowestDurationLevel)
+        return rhythmTree
+
+
+    def _toRhythmTreeNode(self):
+        rhythmTree = RhythmTree.fromTicks(self.durationTicks,
+                                          self.durationLevel,
+                                          self.ticksPerQuarter,
+                                          [child._toRhythmTreeNode()
+                                           for child in self.children])
+        rhythmTree.setMetricalAccent(self.metricalAccent)
+        rhythmTree.setHasTupletChildren(self.hasTupletChildren)
+        return rhythmTree
+
+
+    def getNode(self, path):
+        """Returns the node found by expanding the child indexes in 'path'
+
+        Args:
+            path (tuple): Child indexes from this node
+        """
+        node = self
+        for index in path:
+            node = node.children[index]
+        return node
+
+
+    def replaceNode(self, path, newNode):
+        """Returns a new version of the tree in which the node at 'path' is
+        replaced by 'newNode'. Only the nodes on the path get copied.
+
+        Args:
+            path (tuple): Child indexes from this node
+            newNode (PersistentRhythmTree): Replacement node
+
+        Returns:
+            root (PersistentRhythmTree): Root of the new version
+        """
+        if len(path) == 0:
+            return newNode
+
+        index = path[0]
+        child = self.children[index].replaceNode(path[1:], newNode)
+        children = self.children[:index] + (child,) + self.children[index+1:]
+        return PersistentRhythmTree(self.durationTicks, self.durationLevel,
+                                    self.metricalAccent,
+                                    self.lowestDurationLevel,
+                                    self.ticksPerQuarter,
+                                    self.hasTupletChildren, children)
+
+
+    def getCursor(self, path=()):
+        """Returns a cursor pointing to the node at 'path', considering this
+        node as the root of the tree
+
+        Args:
+            path (tuple): Child indexes from this node
+        """
+        nodes = [self]
+        for index in path:
+            nodes.append(nodes[-1].children[index])
+        return RhythmTreeCursor(tuple(nodes), tuple(path))
+
+
+    def getSignature(self):
+        """Returns a hashable description of the node and its descendants.
+        Trees with the same structure have the same signature. Signatures are
+        stored, so nodes shared by many versions of a tree only compute it
+        once.
+        """
+        if self._signature is None:
+            self._signature = (self.durationTicks, self.durationLevel,
+                               self.metricalAccent, self.hasTupletChildren,
+                               tuple(child.getSignature()
+                                     for child in self.children))
+        return self._signature
+
+
+    def getDurationCandidates(self, path):
+        """Returns the duration candidates of the node at 'path' for every
+        number of dots, considering this node as the root of the tree. They
+        are read from the successor index of the tree structure, and the
+        cursors are kept in this node for the next lookups.
+
+        Args:
+            path (tuple): Child indexes from this node
+
+        Returns:
+            candidates (tuple): For every number of dots, tuple of
+                                RhythmTreeCursor objects or None
+        """
+        if self._durationCandidates is None:
+            self._durationCandidates = {}
+        candidates = self._durationCandidates.get(path)
+        if candidates is None:
+            candidatePaths = self._getCandidatePaths()[path]
+            candidates = tuple(
+                tuple(self.getCursor(p) for p in paths)
+                if paths is not None else None
+                for paths in candidatePaths)
+            self._durationCandidates[path] = candidates
+        return candidates
+
+
+    def _getCandidatePaths(self):
+        """Returns the successor index of the tree rooted in this node, as
+        the paths of the candidates of every node and number of dots. The
+        index is compiled traversing the tree once for every structure.
+
+        Returns:
+            candidatePaths (dict): Tuple of candidate paths (or None) for
+                                   every number of dots, keyed by path
+        """
+        cache = PersistentRhythmTree._candidatePathsCache
+        key = self.getSignature()
+        candidatePaths = cache.get(key)
+        if candidatePaths is not None:
+            cache.move_to_end(key)
+            return candidatePaths
+
+        candidatePaths = {}
+        cursors = [self.getCursor()]
+        while cursors:
+            cursor = cursors.pop()
+            candidatePaths[cursor.path] = tuple(
+                tuple(c.path for c in candidates)
+                if candidates is not None else None
+                for candidates in (cursor._findDurationCandidates(numDots)
+                                   for numDots in range(MAXNUMDOTS + 1)))
+            cursors.extend(cursor.getChildren())
+
+        cache[key] = candidatePaths
+        if len(cache) > CANDIDATEPATHSCACHESIZE:
+            cache.popitem(last=False)
+        return candidatePaths
+
+
+    @property
+    def duration(self):
+        return ticksToDuration(self.durationTicks, self.ticksPerQuarter)
+
+
+    def getDuration(self):
+        return self.duration
+
+
+    def getDurationTicks(self, ticksPerQuarter=None):
+        if ticksPerQuarter is None:
+            return self.durationTicks
+        return convertTicks(self.durationTicks, self.ticksPerQuarter,
+                            ticksPerQuarter)
+
+
+    def getTicksPerQuarter(self):
+        return self.ticksPerQuarter
+
+
+    def getDurationLevel(self):
+        return self.durationLevel
+
+
+    def getMetricalAccent(self):
+        return self.metricalAccent
+
+
+    def getLowestDurationLevel(self):
+        return self.lowestDurationLevel
+
+
+    def getHasTupletChildren(self):
+        return self.hasTupletChildren
+
+
+    def getChildren(self):
+        return self.children
+
+
+    def hasChildren(self):
+        return len(self.children) > 0
+
+
+    def hasTupletAncestors(self, value=False):
+        """Same as RhythmTree.hasTupletAncestors"""
+
+        # return up the stack if we're at the leaves
+        if not self.hasChildren():
+            return value
+        elif value == True:
+            return value
+
+        if self.hasTupletChildren:
+            return True
+
+        # expand node
+        for child in self.children:
+            value = child.hasTupletAncestors()
+
+        return value
+
+
+class RhythmTreeCursor(object):
+    """RhythmTreeCursor points to a node of a version of a persistent rhythm
+    tree. It provides the navigation methods of RhythmTree, which persistent
+    nodes can't provide by themselves as they don't know their parent.
+
+    Attributes:
+        nodes (tuple): PersistentRhythmTree nodes from the root to the node
+                       the cursor points to
+        path (tuple): Child indexes from the root to the node
+    """
+
+    __slots__ = ("nodes", "path")
+
+    def __init__(self, nodes, path):
+        super(RhythmTreeCursor, self).__init__()
+        self.nodes = nodes
+        self.path = path
+
+
+    def __eq__(self, other):
+        if not isinstance(other, RhythmTreeCursor):
+            return NotImplemented
+        return self.nodes[0] is other.nodes[0] and self.path == other.path
+
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+
+    def __hash__(self):
+        return hash((id(self.nodes[0]), self.path))
+
+
+    def __str__(self):
+        return self.nodes[-1].__str__()
+
+
+    def getNode(self):
+        return self.nodes[-1]
+
+
+    def getDuration(self):
+        return self.nodes[-1].duration
+
+
+    def getDurationTicks(self, ticksPerQuarter=None):
+        return self.nodes[-1].getDurationTicks(ticksPerQuarter)
+
+
+    def getTicksPerQuarter(self):
+        return self.nodes[-1].ticksPerQuarter
+
+
+    def getDurationLevel(self):
+        return self.nodes[-1].durationLevel
+
+
+    def getMetricalAccent(self):
+        return self.nodes[-1].metricalAccent
+
+
+    def getLowestDurationLevel(self):
+        return self.nodes[-1].lowestDurationLevel
+
+
+    def getHasTupletChildren(self):
+        return self.nodes[-1].hasTupletChildren
+
+
+    def hasTupletAncestors(self):
+        return self.nodes[-1].hasTupletAncestors()
+
+
+    def hasChildren(self):
+        return len(self.nodes[-1].children) > 0
+
+
+    def hasParent(self):
+        return len(self.path) > 0
+
+
+    def getChild(self, childIndex):
+        child = self.nodes[-1].children[childIndex]
+        return RhythmTreeCursor(self.nodes + (child,),
+                                self.path + (childIndex,))
+
+
+    def getChildren(self):
+        return [self.getChild(i) for i in range(len(self.nodes[-1].children))]
+
+
+    def getParent(self):
+        if not self.hasParent():
+            return None
+        return RhythmTreeCursor(self.nodes[:-1], self.path[:-1])
+
+
+    def getRoot(self):
+        return RhythmTreeCursor(self.nodes[:1], ())
+
+
+    def isFirstChild(self):
+        """Boolean method that checks if node is the first child. Returns
+        'None' if node is root.
+        """
+        if not self.hasParent():
+            return None
+        return self.path[-1] == 0
+
+
+    def isLastChild(self):
+        """Boolean method that checks whether node is last child.
+        Returns True if node is root
+        """
+        if not self.hasParent():
+            return True
+        return self.path[-1] == len(self.nodes[-2].children) - 1
+
+
+    def getRightSibling(self):
+        """Returns right sibling with same parent if possible. If there's no
+        right sibling, returns None"""
+        if self.isLastChild():
+            return None
+        return self._getSibling(self.path[-1] + 1)
+
+
+    def getLeftSibling(self):
+        """Returns left sibling with same parent if possible. If there's no
+        left sibling, returns None"""
+        if not self.hasParent() or self.path[-1] == 0:
+            return None
+        return self._getSibling(self.path[-1] - 1)
+
+
+    def getFirstAncestorNotLastChild(self):
+        """Returns the first node, starting from the current one and moving
+        up the tree, which is not a last child. Returns None if such a node
+        doesn't exist.
+        """
+        cursor = self
+        while cursor.isLastChild():
+            if not cursor.hasParent():
+                return None
+            cursor = cursor.getParent()
+        return cursor
+
+
+    def getDescendantAtIndex(self, depth, indexChild):
+        """Returns node at 'depth' levels below, expanding the
+        indexChild at each level. Returns None if it doesn't exist.
+
+        Args:
+             depth (int): No. of levels below the node
+             indexChild (int): Index of children to be expanded at each level
+        """
+        cursor = self
+        for _ in range(depth):
+            if indexChild >= len(cursor.nodes[-1].children):
+                return None
+            cursor = cursor.getChild(indexChild)
+        return cursor
+
+
+    def getDurationCandidates(self, numDots):
+        """Returns all the durations in the rhythmic space available after the
+        current one, following the same rules as
+        RhythmTree.getDurationCandidates. Like RhythmTree, candidates are read
+        from a successor index instead of traversing the tree (see
+        PersistentRhythmTree.getDurationCandidates).
+
+        Args:
+            numDots (int): Number of dots current rhythmic space
+
+        Returns:
+            candidateDurations (tuple): Tuple of RhythmTreeCursor objects, or
+                                        None if there are no candidates
+        """
+
+        if numDots > MAXNUMDOTS:
+            raise ValueError("%s dots are not supported" % numDots)
+        return self.nodes[0].getDurationCandidates(self.path)[numDots]
+
+
+    def _findDurationCandidates(self, numDots):
+        """Finds the duration candidates traversing the tree. Used to compile
+        the successor index.
+
+        Args:
+            numDots (int): Number of dots current rhythmic space
+
+        Returns:
+            candidateDurations (tuple): Tuple of RhythmTreeCursor objects, or
+                                        None if there are no candidates
+        """
+
+        # handle case we're at the root of the tree
+        if numDots == 0 and not self.hasParent():
+            return self._getLeftView()
+
+        if numDots == 0:
+            ancestor = self.getFirstAncestorNotLastChild()
+            if ancestor is None:
+                return None
+            return ancestor.getRightSibling()._getLeftView()
+
+        LASTCHILDINDEX = 1
+        rightSibling = self.getRightSibling()
+        if rightSibling is None:
+            return None
+        targetDuration = rightSibling.getDescendantAtIndex(numDots,
+                                                           LASTCHILDINDEX)
+        if targetDuration is None:
+            return None
+        return targetDuration._getLeftView()
+
+
+    def _getSibling(self, index):
+        sibling = self.nodes[-2].children[index]
+        return RhythmTreeCursor(self.nodes[:-1] + (sibling,),
+                                self.path[:-1] + (index,))
+
+
+    def _getLeftView(self):
+        """Returns the cursors found traversing down the tree and picking the
+        0-index children, included the current node
+        """
+        candidateDurations = [self]
+        cursor = self
+        while cursor.hasChildren():
+            cursor = cursor.getChild(0)
+            candidateDurations.append(cursor)
+        return tuple(candidateDurations)
@@ -1,5 +1,10 @@
 from melodrive.stats.randommanager import RandomManager
 from collections import OrderedDict
+from bisect import bisect_right
+import numpy as np
+
+# seeds of the NumPy generators are drawn as integers in [0, 2**53)
+MAXBATCHSEED = 2 ** 53
 
 
 
@@ -19,13 +24,36 @@ def toNormalisedCumulativeDistr(distr):
     return cd
 
 
-def decideCumulativeDistrOutcome(distr):
-    random = RandomManager.getActive()
+def getRandom(random=None):
+    """Returns the random context to draw numbers from. Generators and
+    distributions take an optional random context, so that they can run
+    concurrently without interleaving their streams. The active random
+    manager is only the default.
+
+    Args:
+        random (random.Random): Injected random context, or None
+
+    Returns:
+        random (random.Random): 'random', or the active random manager if
+                                it's None
+    """
+    if random is None:
+        return RandomManager.getActive()
+    return random
+
+
+def decideCumulativeDistrOutcome(distr, random=None):
+    random = getRandom(random)
     r = random.random()
     return getCumulativeDistrOutcome(r, distr)
 
 
 def getCumulativeDistrOutcome(r, distr):
+    if len(distr) == 0:
+        raise ValueError("Can't decide the outcome of an empty distribution")
+
+    # values below the first bound fall in the first outcome
+    lastIndex = 0
     for index, value in enumerate(distr):
         if r < value:
             return lastIndex
@@ -64,20 +92,24 @@ def toNormalisedCumulativeDistrDict(distr):
     return r
 
 def getCumulativeDistrOutcomeDict(r, distr):
-    #TODO: Backlog ID: Bug 1
+    if len(distr) == 0:
+        raise ValueError("Can't decide the outcome of an empty distribution")
+
+    # values below the first bound fall in the first outcome
+    lastKey = next(iter(distr))
     for key in distr:
         if r < distr[key]:
             return lastKey
         lastKey = key
     return lastKey
 
-def decideCumulativeDistrOutcomeDict(distr):
-    random = RandomManager.getActive()
+def decideCumulativeDistrOutcomeDict(distr, random=None):
+    random = getRandom(random)
     r = random.random()
     return getCumulativeDistrOutcomeDict(r, distr)
 
-def gaussSampling(minVal, maxVal, mean, sigma):
-    random = RandomManager.getActive()
+def gaussSampling(minVal, maxVal, mean, sigma, random=None):
+    random = getRandom(random)
     s = random.gauss(mean, sigma)
     if s < minVal:
         return minVal
@@ -86,3 +118,387 @@ def gaussSampling(minVal, maxVal, mean, sigma):
     else:
         return s
 
+
+def createBatchGenerator(random=None):
+    """Returns a NumPy random generator seeded from a random context, so that
+    batch sampling is reproducible from the same seed as the scalar
+    functions. Creating a generator uses one random number.
+
+    Args:
+        random (random.Random): If None, the active random manager
+
+    Returns:
+        generator (numpy.random.Generator):
+    """
+    random = getRandom(random)
+    seed = int(random.random() * MAXBATCHSEED)
+    return np.random.default_rng(seed)
+
+
+def uniformSamplingBatch(size, generator=None):
+    """Draws 'size' random numbers in [0, 1)
+
+    Args:
+        size (int): Number of samples
+        generator (numpy.random.Generator): If None, a generator is created
+                                            from the active random manager
+
+    Returns:
+        samples (numpy.ndarray):
+    """
+    if generator is None:
+        generator = createBatchGenerator()
+    return generator.random(size)
+
+
+def decideCumulativeDistrOutcomeBatch(distr, size, generator=None):
+    """Draws 'size' outcomes from a normalised cumulative distribution. Each
+    outcome is the one getCumulativeDistrOutcome would return for the same
+    random number.
+
+    Args:
+        distr (list): Normalised cumulative distribution
+        size (int): Number of samples
+        generator (numpy.random.Generator): If None, a generator is created
+                                            from the active random manager
+
+    Returns:
+        outcomes (numpy.ndarray): Indexes of the outcomes
+    """
+    r = uniformSamplingBatch(size, generator)
+    return getCumulativeDistrOutcomeBatch(r, distr)
+
+
+def toNormalisedCumulativeDistrArray(distr):
+    """Vectorized counterpart of toNormalisedCumulativeDistr, which gives
+    exactly the same values
+
+    Args:
+        distr (numpy.ndarray): Weights
+
+    Returns:
+        cumulativeDistr (numpy.ndarray):
+    """
+    normDistr = distr / sum(distr.tolist())
+    cumulativeDistr = np.zeros(len(normDistr))
+    np.cumsum(normDistr[:-1], out=cumulativeDistr[1:])
+    return cumulativeDistr
+
+
+def getCumulativeDistrOutcomeBatch(r, distr):
+    """Vectorized counterpart of getCumulativeDistrOutcome
+
+    Args:
+        r (numpy.ndarray): Random numbers in [0, 1)
+        distr (list): Normalised cumulative distribution
+
+    Returns:
+        outcomes (numpy.ndarray): Indexes of the outcomes
+    """
+    if len(distr) == 0:
+        raise ValueError("Can't decide the outcome of an empty distribution")
+    outcomes = np.searchsorted(np.asarray(distr), r, side="right") - 1
+    return np.maximum(outcomes, 0)
+
+
+def gaussSamplingBatch(minVal, maxVal, mean, sigma, size, generator=None):
+    """Vectorized counterpart of gaussSampling, samples are clipped to
+    [minVal, maxVal] in the same way
+
+    Args:
+        minVal (float):
+        maxVal (float):
+        mean (float):
+        sigma (float):
+        size (int): Number of samples
+        generator (numpy.random.Generator): If None, a generator is created
+                                            from the active random manager
+
+    Returns:
+        samples (numpy.ndarray):
+    """
+    if generator is None:
+        generator = createBatchGenerator()
+    s = generator.normal(mean, sigma, size)
+    return np.clip(s, minVal, maxVal)
+
+
+def decodeViterbi(initialWeights, transitionWeights):
+    """Finds the path of a lattice with the biggest weight, with the Viterbi
+    algorithm. The weight of a path is the product of the initial weight of
+    its first state and the transition weights between its states. States
+    can be different at every step of the lattice.
+
+    Args:
+        initialWeights (numpy.ndarray): Weight of each state of the first
+                                        step
+        transitionWeights (list): One matrix for each following step, whose
+                                  rows are the states of the previous step
+                                  and columns the states of the step. A 0
+                                  weight forbids a transition
+
+    Returns:
+        path (list): Index of the state of each step
+    """
+    # work with the log of the weights, so that long paths don't underflow
+    with np.errstate(divide="ignore"):
+        pathScores = np.log(np.asarray(initialWeights, dtype=float))
+        backPointers = []
+        for weights in transitionWeights:
+            scores = pathScores[:, np.newaxis] + np.log(weights)
+            bestPrevious = np.argmax(scores, axis=0)
+            pathScores = scores[bestPrevious, np.arange(scores.shape[1])]
+            backPointers.append(bestPrevious)
+
+    if len(pathScores) == 0 or np.isneginf(pathScores.max()):
+        raise ValueError("All the paths of the lattice have a 0 weight")
+
+    # trace the best path back from its last state
+    state = int(np.argmax(pathScores))
+    path = [state]
+    for bestPrevious in reversed(backPointers):
+        state = int(bestPrevious[state])
+        path.append(state)
+    path.reverse()
+    return path
+
+
+def sampleForwardBackward(initialWeights, transitionWeights, random=None):
+    """Samples a path of a lattice with probability proportional to its
+    weight, by forward filtering and backward sampling. Paths are weighted
+    like in decodeViterbi.
+
+    Args:
+        initialWeights (numpy.ndarray): Weight of each state of the first
+                                        step
+        transitionWeights (list): One matrix for each following step, whose
+                                  rows are the states of the previous step
+                                  and columns the states of the step
+        random (random.Random): If None, the active random manager
+
+    Returns:
+        path (list): Index of the state of each step
+    """
+    random = getRandom(random)
+
+    # forward pass, the weights of each step are normalised so that long
+    # paths don't underflow
+    forwardWeights = [np.asarray(initialWeights, dtype=float)]
+    for weights in transitionWeights:
+        forwardWeights.append(forwardWeights[-1] @ weights)
+        total = forwardWeights[-1].sum()
+        if not total > 0:
+            raise ValueError("All the paths of the lattice have a 0 weight")
+        forwardWeights[-1] /= total
+
+    # backward pass, each state is drawn given the state of the next step
+    state = _decideWeightedOutcome(forwardWeights[-1], random)
+    path = [state]
+    for forward, weights in zip(reversed(forwardWeights[:-1]),
+                                reversed(transitionWeights)):
+        state = _decideWeightedOutcome(forward * weights[:, state], random)
+        path.append(state)
+    path.reverse()
+    return path
+
+
+def _decideWeightedOutcome(weights, random):
+    if len(weights) == 0 or not weights.sum() > 0:
+        raise ValueError("All the paths of the lattice have a 0 weight")
+    distr = toNormalisedCumulativeDistrArray(weights)
+    return int(getCumulativeDistrOutcomeBatch(random.random(), distr))
+
+
+class Distribution(object):
+    """Distribution is a categorical distribution which is built once from a
+    list or a dict of weights and can then be sampled many times.
+
+    Outcomes can be drawn either with the alias method (constant time) or
+    by bisecting the cumulative distribution (logarithmic time). The latter
+    gives exactly the same outcomes as decideCumulativeDistrOutcome and
+    decideCumulativeDistrOutcomeDict for the same random number.
+
+    Attributes:
+        outcomes (list): Outcomes of the distribution. These are the keys for
+                         a dict of weights, and the indexes for a list
+        probabilities (list): Normalised probability of each outcome
+        cumulative (list): Normalised cumulative distribution, in the same
+                           format as toNormalisedCumulativeDistr
+        random (random.Random): Random context outcomes are drawn from. If
+                                None, the active random manager
+    """
+
+    def __init__(self, weights, random=None):
+        super(Distribution, self).__init__()
+        self.random = random
+        if isinstance(weights, dict):
+            self.outcomes = list(weights.keys())
+            weights = list(weights.values())
+        else:
+            weights = list(weights)
+            self.outcomes = list(range(len(weights)))
+
+        if len(weights) == 0:
+            raise ValueError("Can't create a distribution without outcomes")
+        if any(w < 0 for w in weights):
+            raise ValueError("Weights of a distribution can't be negative")
+        if sum(weights) <= 0:
+            raise ValueError("Weights of a distribution can't all be 0")
+
+        self.probabilities = normaliseDistr(weights)
+        self.cumulative = toNormalisedCumulativeDistr(weights)
+        self._aliasProbs, self._aliases = self._createAliasTable(
+                                                        self.probabilities)
+        self._outcomesArray = None
+
+
+    def __len__(self):
+        return len(self.outcomes)
+
+
+    def sample(self):
+        """Draws an outcome with the alias method, using one random number
+        from the random context of the distribution"""
+        random = getRandom(self.random)
+        return self.getAliasOutcome(random.random())
+
+
+    def sampleCumulative(self):
+        """Draws an outcome by bisecting the cumulative distribution, using
+        one random number from the random context of the distribution"""
+        random = getRandom(self.random)
+        return self.getCumulativeOutcome(random.random())
+
+
+    def sampleBatch(self, size, generator=None):
+        """Draws 'size' outcomes with the alias method
+
+        Args:
+            size (int): Number of samples
+            generator (numpy.random.Generator): If None, a generator is
+                                                created from the random
+                                                context of the distribution
+
+        Returns:
+            outcomes (numpy.ndarray):
+        """
+        if generator is None:
+            generator = createBatchGenerator(self.random)
+        r = uniformSamplingBatch(size, generator)
+        return self.getAliasOutcomeBatch(r)
+
+
+    def sampleCumulativeBatch(self, size, generator=None):
+        """Draws 'size' outcomes by bisecting the cumulative distribution
+
+        Args:
+            size (int): Number of samples
+            generator (numpy.random.Generator): If None, a generator is
+                                                created from the random
+                                                context of the distribution
+
+        Returns:
+            outcomes (numpy.ndarray):
+        """
+        if generator is None:
+            generator = createBatchGenerator(self.random)
+        r = uniformSamplingBatch(size, generator)
+        return self.getCumulativeOutcomeBatch(r)
+
+
+    def getCumulativeOutcomeBatch(self, r):
+        """Vectorized counterpart of getCumulativeOutcome
+
+        Args:
+            r (numpy.ndarray): Random numbers in [0, 1)
+
+        Returns:
+            outcomes (numpy.ndarray):
+        """
+        indexes = getCumulativeDistrOutcomeBatch(r, self.cumulative)
+        return self._getOutcomesArray()[indexes]
+
+
+    def getAliasOutcomeBatch(self, r):
+        """Vectorized counterpart of getAliasOutcome
+
+        Args:
+            r (numpy.ndarray): Random numbers in [0, 1)
+
+        Returns:
+            outcomes (numpy.ndarray):
+        """
+        numOutcomes = len(self.outcomes)
+        scaled = np.asarray(r) * numOutcomes
+        indexes = np.minimum(scaled.astype(np.intp), numOutcomes - 1)
+        aliasProbs = np.asarray(self._aliasProbs)
+        aliases = np.asarray(self._aliases)
+        useAlias = (scaled - indexes) >= aliasProbs[indexes]
+        indexes = np.where(useAlias, aliases[indexes], indexes)
+        return self._getOutcomesArray()[indexes]
+
+
+    def _getOutcomesArray(self):
+        if self._outcomesArray is None:
+            self._outcomesArray = np.asarray(self.outcomes)
+        return self._outcomesArray
+
+
+    def getAliasOutcome(self, r):
+        """Returns the outcome of the alias table for a number in [0, 1)"""
+        numOutcomes = len(self.outcomes)
+        scaled = r * numOutcomes
+        index = int(scaled)
+
+        # guard against r rounding up to the number of outcomes
+        if index >= numOutcomes:
+            index = numOutcomes - 1
+        if scaled - index >= self._aliasProbs[index]:
+            index = self._aliases[index]
+        return self.outcomes[index]
+
+
+    def getCumulativeOutcome(self, r):
+        """Returns the outcome of the cumulative distribution for a number in
+        [0, 1), the same as getCumulativeDistrOutcome does"""
+        index = bisect_right(self.cumulative, r) - 1
+        if index < 0:
+            index = 0
+        return self.outcomes[index]
+
+
+    @staticmethod
+    def _createAliasTable(probabilities):
+        """Creates the tables for the alias method with Vose's algorithm
+
+        Args:
+            probabilities (list): Normalised probabilities
+
+        Returns:
+            aliasProbs (list): Probability of keeping each column
+            aliases (list): Outcome used when a column isn't kept
+        """
+        numOutcomes = len(probabilities)
+        aliasProbs = [0.0] * numOutcomes
+        aliases = list(range(numOutcomes))
+
+        scaled = [p * numOutcomes for p in probabilities]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            aliasProbs[s] = scaled[s]
+            aliases[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1
+            if scaled[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # what is left over is 1 up to rounding errors
+        for i in large + small:
+            aliasProbs[i] = 1.0
+
+        return aliasProbs, aliases
@@ -0,0 +1,826 @@
+import numpy as np
+from musiclib.probability import Distribution, createBatchGenerator, \
+    getRandom
+from musiclib.rhythmsequence import RhythmSequence, RHYTHMSEQUENCEFIELDS
+from musiclib.ticks import durationToTicks
+
+
+class RhythmChain(object):
+    """RhythmChain is the finite Markov chain of the bars generated by a
+    rhythm generator over a fixed rhythm tree. Generating a bar moves from
+    node to node of the tree, and the choice of the next node only depends on
+    the current node and the number of dots applied to it, so these pairs are
+    the states of the chain. Each transition chooses the next node and the
+    tie or dots applied to it, and emits a rhythmic sequence element.
+
+    The chain is compiled once for a metre and the current feature impacts,
+    then bars are sampled as walks over integer state ids with alias tables.
+    Transitions are conditioned on filling the duration exactly: states from
+    which the duration can't be filled (because there are no candidates left
+    or the duration is overshot) are never entered, and the other transitions
+    keep the relative probabilities they have in the generator.
+
+    Attributes:
+        states (list): (node, numDots) pair of each state id
+        initialState (int): Id of the state at the start of a bar
+        isTerminal (list): True for the states that fill the bar
+        times (list): Time within the bar reached at each state, in ticks
+        ticksPerQuarter (int): Resolution of the times
+        transitions (list): For each state id, list of
+                            (nextState, rhythmicSeqElement, probability)
+                            tuples. Terminal states don't have transitions
+        fillProbability (float): Probability of the generator filling the
+                                 duration exactly
+        nodeIds (list): Breadth-first index in the rhythm tree of the node of
+                        each state
+    """
+
+    def __init__(self, states, initialState, isTerminal, times,
+                 transitions, fillProbability=1, ticksPerQuarter=None,
+                 nodeIds=None):
+        super(RhythmChain, self).__init__()
+        self.states = states
+        self.initialState = initialState
+        self.isTerminal = isTerminal
+        self.times = times
+        self.transitions = transitions
+        self.fillProbability = fillProbability
+        self.ticksPerQuarter = ticksPerQuarter
+        self.nodeIds = nodeIds
+
+        self._distrs = [Distribution([prob for _, _, prob in transitions[i]])
+                        if transitions[i] else None
+                        for i in range(len(states))]
+        self._batchTables = None
+        self._sequenceTables = None
+        self._stateIds = None
+
+
+    def __len__(self):
+        return len(self.states)
+
+
+    @classmethod
+    def fromRhythmGenerator(cls, generator, metre, rhythmTree, duration=None):
+        """Compiles the chain of the rhythms a generator creates from a rhythm
+        tree, with its current density and entropy impacts
+
+        Args:
+            generator (RhythmGenerator): Generator which implements
+                                         _calcOrnamentProbabilities
+            metre (Metre):
+            rhythmTree (RhythmTree): Node the generation starts from. For the
+                                     root, the first duration can be any node
+                                     of its left view, otherwise it follows
+                                     the node
+            duration (float): Duration to be filled. If None, the duration of
+                              the bar
+
+        Returns:
+            rhythmChain (RhythmChain):
+        """
+        if duration is None:
+            duration = metre.getBarDuration()
+
+        # times are tracked in integer ticks, so that states which fill the
+        # duration are found exactly
+        ticksPerQuarter = metre.getTicksPerQuarter()
+        targetTicks = durationToTicks(duration, ticksPerQuarter)
+
+        # the initial state isn't indexed, as the root chosen as the first
+        # duration is a different state which fills the bar
+        states = [(rhythmTree, 0)]
+        stateIds = {}
+        times = [0]
+        isTerminal = []
+        transitions = []
+
+        # states are expanded in the order in which they are found, so
+        # 'states' grows while it's traversed
+        stateId = 0
+        while stateId < len(states):
+            node, numDots = states[stateId]
+            time = times[stateId]
+
+            if time == targetTicks:
+                isTerminal.append(True)
+                transitions.append(None)
+                stateId += 1
+                continue
+
+            # the duration can't be filled from states that overshoot it or
+            # don't have candidates
+            candidates = None
+            if time < targetTicks:
+                candidates = node.getDurationCandidates(numDots)
+            if candidates is None:
+                isTerminal.append(False)
+                transitions.append([])
+                stateId += 1
+                continue
+
+            probCandidates = generator._getScoresDistr(candidates, metre)
+
+            stateTransitions = []
+            for candidate, probCandidate in zip(candidates, probCandidates):
+                candidateDuration = candidate.getDuration()
+                ornaments = generator._calcOrnamentProbabilities(candidate)
+                for nextNumDots, tie, probOrnament in ornaments:
+                    prob = probCandidate * probOrnament
+                    if prob <= 0:
+                        continue
+
+                    if nextNumDots > 0:
+                        elementDuration = generator._calcDotDuration(
+                            candidateDuration, nextNumDots)
+                    else:
+                        elementDuration = candidateDuration
+
+                    nextState = (candidate, nextNumDots)
+                    nextTime = time + durationToTicks(elementDuration,
+                                                      ticksPerQuarter)
+                    if nextState not in stateIds:
+                        stateIds[nextState] = len(states)
+                        states.append(nextState)
+                        times.append(nextTime)
+                    elif times[stateIds[nextState]] != nextTime:
+                        raise ValueError("State %s is reached at different "
+                                         "times" % stateIds[nextState])
+
+                    stateTransitions.append((stateIds[nextState],
+                                             (elementDuration, tie), prob))
+
+            isTerminal.append(False)
+            transitions.append(stateTransitions)
+            stateId += 1
+
+        fillProbabilities = cls._calcFillProbabilities(isTerminal, times,
+                                                       transitions)
+        if fillProbabilities[0] == 0:
+            raise ValueError("Rhythm tree can't fill a duration of %s" %
+                             duration)
+
+        # condition the transitions on filling the duration
+        conditionedTransitions = []
+        for state, stateTransitions in enumerate(transitions):
+            if stateTransitions is None or fillProbabilities[state] == 0:
+                conditionedTransitions.append(stateTransitions)
+                continue
+            conditionedTransitions.append(
+                [(nextState, element,
+                  prob * fillProbabilities[nextState] /
+                  fillProbabilities[state])
+                 for nextState, element, prob in stateTransitions
+                 if fillProbabilities[nextState] > 0])
+
+        nodeIds = cls._calcNodeIds(rhythmTree)
+        return cls(states, 0, isTerminal, times, conditionedTransitions,
+                   fillProbabilities[0], ticksPerQuarter,
+                   [nodeIds[node] for node, _ in states])
+
+
+    @staticmethod
+    def _calcNodeIds(rhythmTree):
+        """Returns the breadth-first index of every node of the tree a node
+        belongs to, which is also its index in a FlatRhythmTree"""
+        queue = [rhythmTree.getRoot()]
+        for node in queue:
+            queue.extend(node.getChildren())
+        return {node: index for index, node in enumerate(queue)}
+
+
+    @classmethod
+    def _calcFillProbabilities(cls, isTerminal, times, transitions):
+        """Returns the probability of filling the duration from each state,
+        propagated backwards in time order
+
+        Args:
+            isTerminal (list): True for the states that fill the duration
+            times (list): Time reached at each state, in ticks
+            transitions (list): Transitions of each state
+
+        Returns:
+            fillProbabilities (list):
+        """
+        fillProbabilities = [0.0] * len(isTerminal)
+        for state in reversed(cls._sortStatesByTime(times)):
+            if isTerminal[state]:
+                fillProbabilities[state] = 1.0
+                continue
+            fillProbabilities[state] = sum(
+                prob * fillProbabilities[nextState]
+                for nextState, _, prob in transitions[state])
+        return fillProbabilities
+
+
+    def sampleBar(self, random=None):
+        """Samples the rhythm of a bar. The number of steps is bounded by the
+        number of states.
+
+        Args:
+            random (random.Random): If None, the active random manager
+
+        Returns:
+            rhythmicSeq (list): List of [duration, tie] elements
+        """
+        return [list(self.transitions[state][outcome][1])
+                for state, outcome in self._sampleTransitions(random)]
+
+
+    def sampleBarSequence(self, random=None):
+        """Samples the rhythm of a bar as a RhythmSequence
+
+        Args:
+            random (random.Random): If None, the active random manager
+
+        Returns:
+            rhythmSequence (RhythmSequence):
+        """
+        transitions = self._sampleTransitions(random)
+        states = np.array([state for state, _ in transitions], dtype=np.intp)
+        outcomes = np.array([outcome for _, outcome in transitions],
+                            dtype=np.intp)
+        return self._createSequence(np.zeros(len(transitions), dtype=np.intp),
+                                    states, outcomes, 1)
+
+
+    def sampleTransition(self, state, random=None):
+        """Samples the transition from a state
+
+        Args:
+            state (int): Non terminal state id
+            random (random.Random): If None, the active random manager
+
+        Returns:
+            nextState (int):
+            outcome (int): Index of the transition in the transitions of
+                           'state'
+        """
+        random = getRandom(random)
+        outcome = self._distrs[state].getAliasOutcome(random.random())
+        return self.transitions[state][outcome][0], outcome
+
+
+    def createEvent(self, state, outcome):
+        """Returns the element emitted by a transition, with its onset
+        within the bar
+
+        Args:
+            state (int): State id the transition starts from
+            outcome (int): Index of the transition
+
+        Returns:
+            event (RhythmSequenceElement):
+        """
+        sequence = self._createSequence(np.zeros(1, dtype=np.intp),
+                                        np.array([state], dtype=np.intp),
+                                        np.array([outcome], dtype=np.intp), 1)
+        return sequence[0]
+
+
+    def getStateId(self, nodeId, numDots, timeTicks):
+        """Returns the id of the state of a node reached at a time. Nodes
+        are identified by their breadth-first index, so that the state can be
+        found from any version of the tree with the same structure. The time
+        tells apart the initial state from the root chosen as a duration.
+
+        Args:
+            nodeId (int): Breadth-first index of the node
+            numDots (int):
+            timeTicks (int):
+
+        Returns:
+            stateId (int):
+        """
+        if self._stateIds is None:
+            self._stateIds = {
+                (self.nodeIds[state], dots, self.times[state]): state
+                for state, (_, dots) in enumerate(self.states)}
+        key = (nodeId, numDots, timeTicks)
+        if key not in self._stateIds:
+            raise ValueError("The chain doesn't reach node %s with %s dots "
+                             "at %s ticks" % key)
+        return self._stateIds[key]
+
+
+    def _sampleTransitions(self, random=None):
+        """Walks the chain until the bar is filled
+
+        Returns:
+            transitions (list): (state, outcome) pair of each step
+        """
+        random = getRandom(random)
+        transitions = []
+        state = self.initialState
+        while not self.isTerminal[state]:
+            nextState, outcome = self.sampleTransition(state, random)
+            transitions.append((state, outcome))
+            state = nextState
+        return transitions
+
+
+    def sampleBars(self, numBars, generator=None):
+        """Samples the rhythm of many bars at once, walking the chain for all
+        the bars in parallel
+
+        Args:
+            numBars (int): Number of bars
+            generator (numpy.random.Generator): If None, a generator is
+                                                created from the active random
+                                                manager
+
+        Returns:
+            rhythmicSeqs (list): List with the rhythmic sequence of each bar
+        """
+        elementIds, elements = self._getBatchTables()[4:6]
+
+        rhythmicSeqs = [[] for _ in range(numBars)]
+        for barIndexes, states, outcomes in self._walkBars(numBars,
+                                                           generator):
+            for barIndex, elementId in zip(
+                    barIndexes.tolist(), elementIds[states, outcomes].tolist()):
+                rhythmicSeqs[barIndex].append(list(elements[elementId]))
+        return rhythmicSeqs
+
+
+    def sampleBarSequences(self, numBars, generator=None):
+        """Samples the rhythm of many bars at once, like sampleBars, and
+        returns them one after the other in a single RhythmSequence
+
+        Args:
+            numBars (int): Number of bars
+            generator (numpy.random.Generator): If None, a generator is
+                                                created from the active random
+                                                manager
+
+        Returns:
+            rhythmSequence (RhythmSequence):
+        """
+        steps = self._walkBars(numBars, generator)
+        if not steps:
+            return RhythmSequence.empty(self.ticksPerQuarter)
+        barIndexes = np.concatenate([step[0] for step in steps])
+        states = np.concatenate([step[1] for step in steps])
+        outcomes = np.concatenate([step[2] for step in steps])
+
+        # steps are in time order, so a stable sort keeps the order of the
+        # elements within each bar
+        order = np.argsort(barIndexes, kind="stable")
+        return self._createSequence(barIndexes[order], states[order],
+                                    outcomes[order], numBars)
+
+
+    def _walkBars(self, numBars, generator=None):
+        """Walks the chain for many bars in parallel
+
+        Returns:
+            steps (list): (barIndexes, states, outcomes) arrays of each step,
+                          for the bars which weren't filled yet
+        """
+        if generator is None:
+            generator = createBatchGenerator()
+        (aliasProbs, aliases, numOutcomes, nextStates, _, _,
+         isTerminal) = self._getBatchTables()
+
+        states = np.full(numBars, self.initialState, dtype=np.intp)
+        barIndexes = np.nonzero(~isTerminal[states])[0]
+        steps = []
+        while len(barIndexes) > 0:
+            currentStates = states[barIndexes]
+            n = numOutcomes[currentStates]
+            scaled = generator.random(len(barIndexes)) * n
+            outcomes = np.minimum(scaled.astype(np.intp), n - 1)
+            useAlias = (scaled - outcomes) >= aliasProbs[currentStates,
+                                                         outcomes]
+            outcomes = np.where(useAlias, aliases[currentStates, outcomes],
+                                outcomes)
+
+            steps.append((barIndexes, currentStates, outcomes))
+            states[barIndexes] = nextStates[currentStates, outcomes]
+            barIndexes = barIndexes[~isTerminal[states[barIndexes]]]
+        return steps
+
+
+    def _createSequence(self, barIndexes, states, outcomes, numBars):
+        """Creates the RhythmSequence of sampled transitions
+
+        Args:
+            barIndexes (numpy.ndarray): Bar of each transition, in order
+            states (numpy.ndarray): State each transition starts from
+            outcomes (numpy.ndarray): Outcome of each transition
+            numBars (int):
+
+        Returns:
+            rhythmSequence (RhythmSequence):
+        """
+        (times, durationTicks, numDots, durationLevels, metricalAccents,
+         nodeIds, ties) = self._getSequenceTables()
+        nextStates = self._getBatchTables()[3][states, outcomes]
+
+        columns = {"onsetTicks": times[states] + barIndexes * durationTicks,
+                   "durationTicks": times[nextStates] - times[states],
+                   "tie": ties[states, outcomes],
+                   "numDots": numDots[nextStates],
+                   "durationLevel": durationLevels[nextStates],
+                   "metricalAccent": metricalAccents[nextStates],
+                   "nodeId": nodeIds[nextStates]}
+
+        barStarts = np.searchsorted(barIndexes, np.arange(numBars))
+        return RhythmSequence(columns, barStarts.astype(np.intp),
+                              self.ticksPerQuarter)
+
+
+    def calcStateProbabilities(self):
+        """Returns the probability of each state being visited while
+        generating a bar. Time moves forward with every transition, so the
+        chain is acyclic and probabilities can be propagated in time order.
+
+        Returns:
+            probabilities (list): Probability of each state id
+        """
+        probabilities = [0.0] * len(self.states)
+        probabilities[self.initialState] = 1.0
+        for state in self._getTimeOrder():
+            if self.isTerminal[state] or probabilities[state] == 0:
+                continue
+            for nextState, _, prob in self.transitions[state]:
+                probabilities[nextState] += probabilities[state] * prob
+        return probabilities
+
+
+    def calcBarProbabilities(self):
+        """Returns the exact probability of every rhythm of a bar
+
+        Returns:
+            probabilities (dict): Probability of each rhythmic sequence,
+                                  represented as a tuple of
+                                  (duration, tie) tuples
+        """
+        suffixes = [None] * len(self.states)
+        for state in reversed(self._getTimeOrder()):
+            if self.isTerminal[state]:
+                suffixes[state] = {(): 1.0}
+                continue
+
+            stateSuffixes = {}
+            for nextState, element, prob in self.transitions[state]:
+                for suffix, suffixProb in suffixes[nextState].items():
+                    rhythm = (element,) + suffix
+                    stateSuffixes[rhythm] = stateSuffixes.get(rhythm, 0) + \
+                        prob * suffixProb
+            suffixes[state] = stateSuffixes
+
+        return suffixes[self.initialState]
+
+
+    def calcElementHistogram(self):
+        """Returns the expected number of times each (duration, tie) element
+        appears in a bar"""
+        return self._calcHistogram(lambda nextState, element: element)
+
+
+    def calcDurationHistogram(self):
+        """Returns the expected number of times each duration appears in a
+        bar. Dotted durations are counted as they are."""
+        return self._calcHistogram(lambda nextState, element: element[0])
+
+
+    def calcTieHistogram(self):
+        """Returns the expected number of elements of a bar with and without
+        tie, keyed by the tie symbol"""
+        return self._calcHistogram(lambda nextState, element: element[1])
+
+
+    def calcDotHistogram(self):
+        """Returns the expected number of elements of a bar with each number
+        of dots"""
+        return self._calcHistogram(
+            lambda nextState, element: self.states[nextState][1])
+
+
+    def calcExpectedNumNotes(self):
+        """Returns the expected number of elements of a bar"""
+        return sum(self.calcElementHistogram().values())
+
+
+    def _calcHistogram(self, getKey):
+        """Returns the expected number of transitions of a bar for each key
+
+        Args:
+            getKey (function): Returns the key of a transition given the next
+                               state and the emitted element
+
+        Returns:
+            histogram (dict):
+        """
+        stateProbabilities = self.calcStateProbabilities()
+        histogram = {}
+        for state, transitions in enumerate(self.transitions):
+            if transitions is None or stateProbabilities[state] == 0:
+                continue
+            for nextState, element, prob in transitions:
+                key = getKey(nextState, element)
+                histogram[key] = histogram.get(key, 0) + \
+                    stateProbabilities[state] * prob
+        return histogram
+
+
+    def _getTimeOrder(self):
+        """Returns the state ids sorted by the time they are reached at"""
+        return self._sortStatesByTime(self.times)
+
+
+    @staticmethod
+    def _sortStatesByTime(times):
+        return sorted(range(len(times)), key=times.__getitem__)
+
+
+    def _getBatchTables(self):
+        if self._batchTables is None:
+            self._batchTables = self._createBatchTables()
+        return self._batchTables
+
+
+    def _getSequenceTables(self):
+        if self._sequenceTables is None:
+            self._sequenceTables = self._createSequenceTables()
+        return self._sequenceTables
+
+
+    def _createSequenceTables(self):
+        """Returns the arrays of the fields of the RhythmSequence elements
+        emitted when entering each state, and the tie of each transition"""
+        times = np.array(self.times, dtype=np.int64)
+        durationTicks = max(self.times[state]
+                            for state in range(len(self.states))
+                            if self.isTerminal[state])
+        numDots = np.array([dots for _, dots in self.states], dtype=np.int8)
+        durationLevels = np.array([node.getDurationLevel()
+                                   for node, _ in self.states], dtype=np.int8)
+        metricalAccents = np.array(
+            [-1 if node.getMetricalAccent() is None
+             else node.getMetricalAccent() for node, _ in self.states],
+            dtype=np.int8)
+        nodeIds = np.array(self.nodeIds, dtype=np.int32)
+
+        maxOutcomes = self._getBatchTables()[0].shape[1]
+        ties = np.zeros((len(self.states), maxOutcomes), dtype=bool)
+        for state, stateTransitions in enumerate(self.transitions):
+            for outcome, (_, element, _) in enumerate(stateTransitions or []):
+                ties[state, outcome] = element[1] is not None
+
+        return (times, durationTicks, numDots, durationLevels,
+                metricalAccents, nodeIds, ties)
+
+
+    def _createBatchTables(self):
+        """Stacks the alias tables and transitions of all the states into
+        arrays with a row per state"""
+        numStates = len(self.states)
+        maxOutcomes = max([len(t) for t in self.transitions if t] or [1])
+
+        aliasProbs = np.ones((numStates, maxOutcomes))
+        aliases = np.zeros((numStates, maxOutcomes), dtype=np.intp)
+        numOutcomes = np.ones(numStates, dtype=np.intp)
+        nextStates = np.zeros((numStates, maxOutcomes), dtype=np.intp)
+        elementIds = np.zeros((numStates, maxOutcomes), dtype=np.intp)
+        elements = []
+        elementIndexes = {}
+
+        for state, stateTransitions in enumerate(self.transitions):
+            if not stateTransitions:
+                continue
+            distr = self._distrs[state]
+            n = len(stateTransitions)
+            numOutcomes[state] = n
+            aliasProbs[state, :n] = distr._aliasProbs
+            aliases[state, :n] = distr._aliases
+            for outcome, (nextState, element, _) in enumerate(
+                    stateTransitions):
+                nextStates[state, outcome] = nextState
+                if element not in elementIndexes:
+                    elementIndexes[element] = len(elements)
+                    elements.append(element)
+                elementIds[state, outcome] = elementIndexes[element]
+
+        isTerminal = np.array(self.isTerminal, dtype=bool)
+        return (aliasProbs, aliases, numOutcomes, nextStates, elementIds,
+                elements, isTerminal)
+
+
+class RhythmChainMixture(object):
+    """RhythmChainMixture is the Markov chain of bars generated from rhythm
+    trees which are themselves chosen at random, as melodic bars are from
+    versions of the rhythm space with random tuplets. Its initial transition
+    chooses the tree, then the bar is a walk over the RhythmChain of that
+    tree.
+
+    Attributes:
+        probabilities (list): Probability of choosing each chain
+        chains (list): RhythmChain of each tree
+        ticksPerQuarter (int): Resolution of the times
+    """
+
+    def __init__(self, components):
+        """
+        Args:
+            components (list): (probability, rhythmChain) tuples. Chains
+                               must have the same duration and resolution
+        """
+        super(RhythmChainMixture, self).__init__()
+        self.probabilities = [prob for prob, _ in components]
+        self.chains = [chain for _, chain in components]
+        self.ticksPerQuarter = self.chains[0].ticksPerQuarter
+        self._distr = Distribution(self.probabilities)
+
+
+    def __len__(self):
+        return len(self.chains)
+
+
+    def sampleChain(self, random=None):
+        """Samples the initial transition
+
+        Args:
+            random (random.Random): If None, the active random manager
+
+        Returns:
+            rhythmChain (RhythmChain):
+        """
+        random = getRandom(random)
+        return self.chains[self._distr.getAliasOutcome(random.random())]
+
+
+    def sampleBar(self, random=None):
+        """Samples the rhythm of a bar
+
+        Args:
+            random (random.Random): If None, the active random manager
+
+        Returns:
+            rhythmicSeq (list): List of [duration, tie] elements
+        """
+        random = getRandom(random)
+        return self.sampleChain(random).sampleBar(random)
+
+
+    def sampleBarSequence(self, random=None):
+        """Samples the rhythm of a bar as a RhythmSequence
+
+        Args:
+            random (random.Random): If None, the active random manager
+
+        Returns:
+            rhythmSequence (RhythmSequence):
+        """
+        random = getRandom(random)
+        return self.sampleChain(random).sampleBarSequence(random)
+
+
+    def sampleBars(self, numBars, generator=None):
+        """Samples the rhythm of many bars at once. The bars of each chain
+        are walked in parallel.
+
+        Args:
+            numBars (int): Number of bars
+            generator (numpy.random.Generator): If None, a generator is
+                                                created from the active random
+                                                manager
+
+        Returns:
+            rhythmicSeqs (list): List with the rhythmic sequence of each bar
+        """
+        if generator is None:
+            generator = createBatchGenerator()
+        rhythmicSeqs = [None] * numBars
+        for chain, barIndexes in self._sampleChainBars(numBars, generator):
+            for barIndex, rhythmicSeq in zip(
+                    barIndexes.tolist(),
+                    chain.sampleBars(len(barIndexes), generator)):
+                rhythmicSeqs[barIndex] = rhythmicSeq
+        return rhythmicSeqs
+
+
+    def sampleBarSequences(self, numBars, generator=None):
+        """Samples the rhythm of many bars at once, like sampleBars, and
+        returns them one after the other in a single RhythmSequence
+
+        Args:
+            numBars (int): Number of bars
+            generator (numpy.random.Generator): If None, a generator is
+                                                created from the active random
+                                                manager
+
+        Returns:
+            rhythmSequence (RhythmSequence):
+        """
+        if generator is None:
+            generator = createBatchGenerator()
+        chainColumns = []
+        elementBars = []
+        for chain, barIndexes in self._sampleChainBars(numBars, generator):
+            sequence = chain.sampleBarSequences(len(barIndexes), generator)
+            columns = sequence.getColumns()
+
+            # move the bars of the chain to their place among all the bars
+            localBars = np.searchsorted(sequence._barStarts,
+                                        np.arange(len(sequence)),
+                                        side="right") - 1
+            durationTicks = chain._getSequenceTables()[1]
+            columns["onsetTicks"] = columns["onsetTicks"] + \
+                (barIndexes[localBars] - localBars) * durationTicks
+            chainColumns.append(columns)
+            elementBars.append(barIndexes[localBars])
+
+        if not chainColumns:
+            return RhythmSequence.empty(self.ticksPerQuarter)
+        elementBars = np.concatenate(elementBars)
+        order = np.argsort(elementBars, kind="stable")
+        columns = {name: np.concatenate([c[name] for c in chainColumns])[order]
+                   for name, _ in RHYTHMSEQUENCEFIELDS}
+        barStarts = np.searchsorted(elementBars[order], np.arange(numBars))
+        return RhythmSequence(columns, barStarts.astype(np.intp),
+                              self.ticksPerQuarter)
+
+
+    def _sampleChainBars(self, numBars, generator):
+        """Samples the initial transition of many bars
+
+        Returns:
+            chainBars (list): (rhythmChain, barIndexes) tuples of the chains
+                              chosen at least once
+        """
+        chainIndexes = self._distr.sampleBatch(numBars, generator)
+        order = np.argsort(chainIndexes, kind="stable")
+        sortedIndexes = chainIndexes[order]
+        starts = np.flatnonzero(np.diff(sortedIndexes, prepend=-1))
+        stops = np.append(starts[1:], numBars)
+        return [(self.chains[sortedIndexes[start]], order[start:stop])
+                for start, stop in zip(starts.tolist(), stops.tolist())]
+
+
+    def calcBarProbabilities(self):
+        """Returns the exact probability of every rhythm of a bar. The
+        rhythms of every chain are listed, so this is only practical for
+        mixtures of a few hundred chains with small trees, like the melodic
+        bars in 3/4. Histograms are much cheaper.
+
+        Returns:
+            probabilities (dict): Probability of each rhythmic sequence,
+                                  represented as a tuple of
+                                  (duration, tie) tuples
+        """
+        probabilities = {}
+        for chainProb, chain in zip(self.probabilities, self.chains):
+            for rhythm, prob in chain.calcBarProbabilities().items():
+                probabilities[rhythm] = probabilities.get(rhythm, 0) + \
+                    chainProb * prob
+        return probabilities
+
+
+    def calcElementHistogram(self):
+        """Returns the expected number of times each (duration, tie) element
+        appears in a bar"""
+        return self._calcHistogram(RhythmChain.calcElementHistogram)
+
+
+    def calcDurationHistogram(self):
+        """Returns the expected number of times each duration appears in a
+        bar. Dotted durations are counted as they are."""
+        return self._calcHistogram(RhythmChain.calcDurationHistogram)
+
+
+    def calcTieHistogram(self):
+        """Returns the expected number of elements of a bar with and without
+        tie, keyed by the tie symbol"""
+        return self._calcHistogram(RhythmChain.calcTieHistogram)
+
+
+    def calcDotHistogram(self):
+        """Returns the expected number of elements of a bar with each number
+        of dots"""
+        return self._calcHistogram(RhythmChain.calcDotHistogram)
+
+
+    def calcExpectedNumNotes(self):
+        """Returns the expected number of elements of a bar"""
+        return sum(chainProb * chain.calcExpectedNumNotes()
+                   for chainProb, chain in zip(self.probabilities,
+                                               self.chains))
+
+
+    def _calcHistogram(self, calcChainHistogram):
+        """Returns the histograms of the chains weighted by their
+        probabilities
+
+        Args:
+            calcChainHistogram (function): Returns the histogram of a chain
+
+        Returns:
+            histogram (dict):
+        """
+        histogram = {}
+        for chainProb, chain in zip(self.probabilities, self.chains):
+            for key, count in calcChainHistogram(chain).items():
+                histogram[key] = histogram.get(key, 0) + chainProb * count
+        return histogram
@@ -1,6 +1,9 @@
+import numpy as np
+from collections import OrderedDict
 from musiclib.probability import *
 from musiclib.rhythmtreefactory import RhythmTreeFactory
-from melodrive.stats.randommanager import RandomManager
+from musiclib.rhythmchain import RhythmChain
+from musiclib.rhythmstreamstate import RhythmStreamState
 
 FOURFOUR = "4/4"
 THREEFOUR = "3/4"
@@ -49,32 +52,74 @@ metricalProminenceScores = {FOURFOUR: [[1, 0, 0, 0, 0],
                             }
 
 
+# max number of entries of each of the score caches of a generator
+SCORECACHESIZE = 256
+
+# max number of rhythm chains cached by a generator
+RHYTHMCHAINCACHESIZE = 1024
+
+# indexes of the feature impacts in the keys of the distribution and rhythm
+# chain caches
+DENSITYKEYINDEX = 2
+ENTROPYKEYINDEX = 3
+
+
 weightMetrics = {FOURFOUR: {"distTactus": 1,
                            "metricalProminence": 1},
                 THREEFOUR: {"distTactus": 1,
                             "metricalProminence": 1}}
 
 class RhythmGenerator(object):
-    """Base class for melody and harmony rhythm generator classes"""
+    """Base class for melody and harmony rhythm generator classes
+
+    Attributes:
+        random (random.Random): Random context all the decisions of the
+                                generator are drawn from. If None, the active
+                                random manager. Generators with their own
+                                context can run concurrently in threads
+    """
 
-    def __init__(self, metre):
+    def __init__(self, metre, scoresCacheSize=SCORECACHESIZE, random=None):
         super(RhythmGenerator, self).__init__()
         self.entropyImpact = None
         self.densityImpact = None
+        self.random = random
 
-        self.rsf = RhythmTreeFactory()
+        self.rsf = RhythmTreeFactory(random=random)
         self._barDuration = metre.getBarDuration()
 
+        # scores of candidates before applying density and entropy, keyed by
+        # (candidates signature, tactus level)
+        self._baseScoresCache = OrderedDict()
+
+        # normalised distributions of the scores of candidates, keyed by
+        # (candidates signature, tactus level, density, entropy)
+        self._scoresDistrCache = OrderedDict()
+        self._scoresCacheSize = scoresCacheSize
+
+        # rhythm chains keyed by (tree key, tactus level, density, entropy)
+        self._rhythmChainCache = OrderedDict()
+
 
 
     def setEntropyImpact(self, newEntropy):
         self.entropyImpact = self.mapMusicFeature(newEntropy,
                                     self._musicFeaturesMaxImpact["entropy"])
+        self._invalidateScoresDistrs(ENTROPYKEYINDEX, self.entropyImpact)
 
 
     def setDensityImpact(self, newDensity):
         self.densityImpact = self.mapMusicFeature(newDensity,
                                     self._musicFeaturesMaxImpact["density"])
+        self._invalidateScoresDistrs(DENSITYKEYINDEX, self.densityImpact)
+
+
+    def clearScoresCache(self):
+        """Removes all the cached scores. Needs to be called whenever the
+        score tables of the generator change."""
+        self._baseScoresCache.clear()
+        self._scoresDistrCache.clear()
+        self._rhythmChainCache.clear()
 
 
     @staticmethod
@@ -145,25 +190,157 @@ class RhythmGenerator(object):
         return value
 
 
-    def _decideNextDuration(self, scores, candidates):
-        """Decides which duration to use next
+    def _getRhythmChain(self, metre, rhythmTree, treeKey, duration=None):
+        """Returns the chain of the rhythms generated from a rhythm tree with
+        the current features. Chains are cached, so they are only compiled
+        the first time a tree is used with some feature values.
 
         Args:
-            scores (list): List of scores for each duration candidate
-            candidates (list of lists): List of RhythmTree objects that
-                                        can be chosen as the next duration
+            metre (Metre):
+            rhythmTree (RhythmTree): Node the generation starts from
+            treeKey (hashable): Identifies the structure of the tree, the
+                                node and the duration to be filled
+            duration (float): Duration to be filled. If None, the duration of
+                              the bar
 
         Returns:
-            nextDuration (RhythmTree): Duration (RhythmTree object) to be
-                                        used
+            rhythmChain (RhythmChain):
         """
+        key = (treeKey, self._getTactusLevel(metre), self.densityImpact,
+               self.entropyImpact)
+        rhythmChain = self._rhythmChainCache.get(key)
+        if rhythmChain is not None:
+            self._rhythmChainCache.move_to_end(key)
+            return rhythmChain
+
+        rhythmChain = RhythmChain.fromRhythmGenerator(self, metre, rhythmTree,
+                                                      duration)
+        self._rhythmChainCache[key] = rhythmChain
+        if len(self._rhythmChainCache) > RHYTHMCHAINCACHESIZE:
+            self._rhythmChainCache.popitem(last=False)
+        return rhythmChain
+
+
+    def _generateRhythmBars(self, metre, numBars=None):
+        """Yields bars one at a time. Each bar is generated with the
+        features the generator has when the bar is requested.
+
+        Args:
+            metre (Metre):
+            numBars (int): Number of bars. If None, bars are yielded forever
+
+        Yields:
+            bar (RhythmSequence):
+        """
+        barIndex = 0
+        while numBars is None or barIndex < numBars:
+            rhythmTree, treeKey = self._createStreamBar(metre)
+            rhythmChain = self._getRhythmChain(metre, rhythmTree, treeKey)
+            yield rhythmChain.sampleBarSequence(self.random)
+            barIndex += 1
+
+
+    def _generateRhythmEvents(self, metre, state=None):
+        """Yields rhythm events one at a time, starting a new bar whenever
+        the current one is filled. The chain is looked up for every event, so
+        feature changes take effect from the next event.
+
+        Args:
+            metre (Metre):
+            state (RhythmStreamState): State the stream resumes from. It's
+                                       updated before every event is yielded.
+                                       If None, the stream starts a new bar
+
+        Yields:
+            event (RhythmSequenceElement): Element with its onset within its
+                                           bar
+        """
+        if state is None:
+            state = RhythmStreamState(metre.getBarTicks())
+
+        while True:
+            if state.isBarFilled():
+                rhythmTree, treeKey = self._createStreamBar(metre)
+                state.startBar(rhythmTree, treeKey)
+
+            rhythmChain = self._getRhythmChain(metre, state.rhythmTree,
+                                               state.treeKey)
+            stateId = rhythmChain.getStateId(state.nodeId, state.numDots,
+                                             state.timeTicks)
+            nextStateId, outcome = rhythmChain.sampleTransition(stateId,
+                                                               self.random)
+            state.advance(rhythmChain.nodeIds[nextStateId],
+                          rhythmChain.states[nextStateId][1],
+                          rhythmChain.times[nextStateId])
+            yield rhythmChain.createEvent(stateId, outcome)
+
+
+    def _createStreamBar(self, metre):
+        """Returns the rhythm tree a new bar is generated from, and the key
+        of its rhythm chain"""
+        raise NotImplementedError()
+
+
+    def _getScoresDistr(self, candidates, metre):
+        """Returns the probability of choosing each of the candidate
+        durations, which is what rhythm chains are compiled from.
+        Distributions only depend on the duration levels and metrical accents
+        of the candidates, the tactus level and the density and entropy
+        impacts, so they are cached.
+
+        Args:
+            candidates (list): All the candidates to be evaluated
+            metre (Metre):
+
+        Returns:
+            distr (list): Normalised distribution
+        """
+        tactusLevel = self._getTactusLevel(metre)
+        signature = self._getCandidatesSignature(candidates)
+        key = (signature, tactusLevel, self.densityImpact, self.entropyImpact)
+
+        distr = self._scoresDistrCache.get(key)
+        if distr is not None:
+            self._scoresDistrCache.move_to_end(key)
+            return distr
+
+        scores = self._calcSignatureScores(signature, tactusLevel)
+        distr = normaliseDistr(scores)
+        self._addToScoresCache(self._scoresDistrCache, key, distr)
+        return distr
+
+
+    def _invalidateScoresDistrs(self, keyIndex, value):
+        """Removes the cached distributions and rhythm chains calculated for
+        a value of a feature impact different from 'value'
+
+        Args:
+            keyIndex (int): Index of the feature impact in the cache keys
+            value (float): New value of the feature impact
+        """
+        for cache in (self._scoresDistrCache, self._rhythmChainCache):
+            staleKeys = [key for key in cache if key[keyIndex] != value]
+            for key in staleKeys:
+                del cache[key]
+
+
+    def _addToScoresCache(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self._scoresCacheSize:
+            cache.popitem(last=False)
+
+
+    @staticmethod
+    def _getCandidatesSignature(candidates):
+        """Returns the (durationLevel, metricalAccent) pairs of the
+        candidates, which is all the scores depend on"""
+        return tuple((c.getDurationLevel(), c.getMetricalAccent())
+                     for c in candidates)
 
-        # transform scores in normalised cumulative distr
-        distr = toNormalisedCumulativeDistr(scores)
 
-        durationIndex = decideCumulativeDistrOutcome(distr)
-        nextDuration = candidates[durationIndex]
-        return nextDuration
+    def _getTactusLevel(self, metre):
+        """Returns the tactus level the candidates are scored against"""
+        return metre.getTactusLevel()
 
 
     def _calcDistFromTactusMetric(self, candidates, tactusLevel):
@@ -240,7 +417,7 @@ class RhythmGenerator(object):
         """
 
         duration = rhythmicSeqElement[0]
-        random = RandomManager.getActive()
+        random = getRandom(self.random)
         r = random.random()
         if r <= self._probabilityTie[durationLevel]:
             return [duration, 't']
@@ -280,7 +457,7 @@ class RhythmGenerator(object):
 
         duration = rhythmTree.getDuration()
         durationLevel = rhythmTree.getDurationLevel()
-        random = RandomManager.getActive()
+        random = getRandom(self.random)
         r = random.random()
 
         numDots = 0
@@ -289,8 +466,6 @@ class RhythmGenerator(object):
         if r <= self._probabilityDot[durationLevel] and maxDepth >= 1:
 
             # decide which type of dot to apply
-            #TODO need to verify that we're using melodrive's random manager when we integrate
-            random = RandomManager.getActive()
             r2 = random.random()
 
             # handle single dot
@@ -311,6 +486,35 @@ class RhythmGenerator(object):
             return [duration, None], numDots
 
 
+    def _calcTieProbability(self, durationLevel):
+        """Returns the probability of _decideToApplyTie applying a tie"""
+        return min(max(self._probabilityTie[durationLevel], 0), 1)
+
+
+    def _calcDotProbabilities(self, durationLevel, maxDepth):
+        """Returns the probabilities of _decideToApplyDot applying 0, 1 and 2
+        dots
+
+        Args:
+            durationLevel (int): Duration level of the chosen node
+            maxDepth (int): Number of duration levels below the chosen node
+
+        Returns:
+            probabilities (list): Probability of each number of dots
+        """
+        probDot = 0
+        if maxDepth >= 1:
+            probDot = min(max(self._probabilityDot[durationLevel], 0), 1)
+
+        probSingleDot = 1
+        if maxDepth >= 2:
+            probSingleDot = min(max(self._probabilitySingleDot[durationLevel],
+                                    0), 1)
+
+        return [1 - probDot, probDot * probSingleDot,
+                probDot * (1 - probSingleDot)]
+
+
     def _modifyScoresForDensity(self, candidates, scores, MAXSCORE):
         """Modifies the scores based on rhythm density impact. The higher
         the density impact, the more the shorter durations will be favoured
@@ -355,6 +559,103 @@ class RhythmGenerator(object):
         return newScores
 
 
+    def _compileScoreTables(self):
+        """Stores the score tables of the generator as arrays, so that the
+        scores of all the candidates can be calculated at once by
+        _calcCombinedScores. Needs to be called whenever the tables change.
+        """
+        self._tactusScoreByDistanceArray = np.array(
+            self._tactusScoreByDistance, dtype=float)
+        self._metricalProminenceScoresArray = np.array(
+            self._metricalProminenceScores, dtype=float)
+        self._densityImpactDurationLevelsArray = np.array(
+            self._densityImpactDurationLevels, dtype=float)
+        self.clearScoresCache()
+
+
+    def _calcCombinedScores(self, candidates, tactusLevel):
+        """Returns combined scores for all the candidate durations. Gives the
+        same result as combining _calcMetricalProminenceMetric and
+        _calcDistFromTactusMetric linearly and then applying
+        _modifyScoresForDensity and _modifyScoresForEntropy, but looks up
+        the scores of all the candidates at once.
+
+        Args:
+            candidates (list): All the candidates to be evaluated
+            tactusLevel (int): Numeric index of tactus
+
+        Returns:
+            scores (list): List with the combined score of each candidate
+        """
+        signature = self._getCandidatesSignature(candidates)
+        return self._calcSignatureScores(signature, tactusLevel)
+
+
+    def _calcSignatureScores(self, signature, tactusLevel):
+        """Same as _calcCombinedScores, for the signature of the candidates
+
+        Args:
+            signature (tuple): (durationLevel, metricalAccent) pairs of the
+                               candidates
+            tactusLevel (int): Numeric index of tactus
+
+        Returns:
+            scores (list): List with the combined score of each candidate
+        """
+        durationLevels, scores = self._getBaseScores(signature, tactusLevel)
+        MAXSCORE = (self._weightMetrics["metricalProminence"] +
+                    self._weightMetrics["distTactus"])
+
+        # modify scores based on rhythmic density
+        densityScores = self._densityImpactDurationLevelsArray[durationLevels]
+        scores = (scores + densityScores * self.densityImpact) / MAXSCORE
+
+        # modify scores based on rhythmic entropy, same as compressValues
+        dist = scores - MAXSCORE/2
+        rate = self.entropyImpact
+        scores = np.where(dist >= 0, scores - (dist * rate),
+                          scores + (np.abs(dist) * rate))
+
+        return scores.tolist()
+
+
+    def _getBaseScores(self, signature, tactusLevel):
+        """Returns the linear combination of the metrical prominence and
+        distance from tactus scores of the candidates, which doesn't depend
+        on the feature impacts
+
+        Args:
+            signature (tuple): (durationLevel, metricalAccent) pairs of the
+                               candidates
+            tactusLevel (int): Numeric index of tactus
+
+        Returns:
+            durationLevels (numpy.ndarray): Duration levels of the candidates
+            scores (numpy.ndarray):
+        """
+        key = (signature, tactusLevel)
+        baseScores = self._baseScoresCache.get(key)
+        if baseScores is not None:
+            self._baseScoresCache.move_to_end(key)
+            return baseScores
+
+        indexes = np.array(signature, dtype=np.intp).reshape(-1, 2)
+        durationLevels = indexes[:, 0]
+        metricalAccents = indexes[:, 1]
+
+        # retrieve score weights
+        a = self._weightMetrics["metricalProminence"]
+        b = self._weightMetrics["distTactus"]
+
+        mp = self._metricalProminenceScoresArray[durationLevels,
+                                                 metricalAccents]
+        dt = self._tactusScoreByDistanceArray[np.abs(tactusLevel -
+                                                     durationLevels)]
+        baseScores = (durationLevels, a*mp + b*dt)
+        self._addToScoresCache(self._baseScoresCache, key, baseScores)
+        return baseScores
+
+
     def _calcScores(self):
         pass
 
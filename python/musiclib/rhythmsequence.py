@@ -0,0 +1,341 @@
+import numpy as np
+from musiclib.ticks import ticksToDuration
+
+# typed columns stored for every element of a rhythmic sequence. Onsets
+# are relative to the start of the sequence. The metrical accent is -1 for
+# nodes without accent
+RHYTHMSEQUENCEFIELDS = (("onsetTicks", np.int64),
+                        ("durationTicks", np.int64),
+                        ("tie", np.bool_),
+                        ("numDots", np.int8),
+                        ("durationLevel", np.int8),
+                        ("metricalAccent", np.int8),
+                        ("nodeId", np.int32))
+
+# dtype of the record arrays returned by RhythmSequence.asArray
+RHYTHMSEQUENCEDTYPE = np.dtype(list(RHYTHMSEQUENCEFIELDS))
+
+TIE = "t"
+
+
+class RhythmSequence(object):
+    """RhythmSequence is a compact rhythmic sequence made of one or more
+    bars. The elements are stored as a struct of arrays: one contiguous
+    NumPy array for each of the RHYTHMSEQUENCEFIELDS. A sequence can be
+    sliced into bars without copying, by slicing all the columns, and the
+    downstream stages can read whole columns at once. Columns are read-only.
+    Elements are accessed through RhythmSequenceElement objects.
+
+    Attributes:
+        ticksPerQuarter (int): Resolution of onsets and durations
+    """
+
+    def __init__(self, columns, barStarts, ticksPerQuarter):
+        """
+        Args:
+            columns (dict): Array of each of the RHYTHMSEQUENCEFIELDS, keyed
+                            by name (see createColumns)
+            barStarts (numpy.ndarray): Index of the first element of each bar
+            ticksPerQuarter (int):
+        """
+        super(RhythmSequence, self).__init__()
+        self._columns = {}
+        for name, dtype in RHYTHMSEQUENCEFIELDS:
+            column = np.ascontiguousarray(columns[name], dtype=dtype).view()
+            column.flags.writeable = False
+            self._columns[name] = column
+        self._length = len(self._columns["onsetTicks"])
+        self._barStarts = barStarts
+        self.ticksPerQuarter = ticksPerQuarter
+
+
+    def __len__(self):
+        return self._length
+
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield RhythmSequenceElement(self, index)
+
+
+    def __getitem__(self, index):
+        """Returns the element at 'index', or a view of the sequence if
+        'index' is a slice. Bars cut by the slice are truncated."""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                raise ValueError("Rhythm sequences can't be sliced with steps")
+            stop = max(start, stop)
+            barStarts = self._barStarts - start
+            inSlice = (barStarts > 0) & (barStarts < stop - start)
+            firstBar = [0] if stop > start else []
+            barStarts = np.concatenate((firstBar, barStarts[inSlice]))
+            return RhythmSequence(self._sliceColumns(start, stop),
+                                  barStarts.astype(np.intp),
+                                  self.ticksPerQuarter)
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Rhythm sequence index out of range")
+        return RhythmSequenceElement(self, index)
+
+
+    def __add__(self, other):
+        return self.concatenate([self, other])
+
+
+    def __eq__(self, other):
+        if not isinstance(other, RhythmSequence):
+            return NotImplemented
+        return self.ticksPerQuarter == other.ticksPerQuarter and \
+            np.array_equal(self._barStarts, other._barStarts) and \
+            all(np.array_equal(self._columns[name], other._columns[name])
+                for name, _ in RHYTHMSEQUENCEFIELDS)
+
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+
+    def __str__(self):
+        return str(self.toList())
+
+
+    @staticmethod
+    def createColumns(numElements):
+        """Returns new zeroed columns for 'numElements' elements, to be
+        filled in and passed to the constructor
+
+        Returns:
+            columns (dict): Array of each of the RHYTHMSEQUENCEFIELDS, keyed
+                            by name
+        """
+        return {name: np.zeros(numElements, dtype=dtype)
+                for name, dtype in RHYTHMSEQUENCEFIELDS}
+
+
+    @classmethod
+    def empty(cls, ticksPerQuarter):
+        return cls(cls.createColumns(0), np.zeros(0, dtype=np.intp),
+                   ticksPerQuarter)
+
+
+    @classmethod
+    def concatenate(cls, sequences):
+        """Joins sequences one after the other. Onsets of every sequence are
+        moved to the end of the previous one.
+
+        Args:
+            sequences (list): RhythmSequence objects with the same
+                              resolution
+
+        Returns:
+            rhythmSequence (RhythmSequence):
+        """
+        if not sequences:
+            raise ValueError("At least one sequence is needed")
+        ticksPerQuarter = sequences[0].ticksPerQuarter
+        if any(s.ticksPerQuarter != ticksPerQuarter for s in sequences):
+            raise ValueError("Sequences have different ticks per quarter")
+
+        columns = {name: np.concatenate([s._columns[name]
+                                         for s in sequences])
+                   for name, _ in RHYTHMSEQUENCEFIELDS}
+        onsetTicks = columns["onsetTicks"]
+        durationTicks = columns["durationTicks"]
+        barStarts = []
+        numElements = 0
+        endTicks = 0
+        for sequence in sequences:
+            if len(sequence) == 0:
+                continue
+            onsetTicks[numElements:numElements + len(sequence)] += \
+                endTicks - sequence.getStartTicks()
+            barStarts.append(sequence._barStarts + numElements)
+            numElements += len(sequence)
+            endTicks = onsetTicks[numElements - 1] + \
+                durationTicks[numElements - 1]
+
+        if barStarts:
+            barStarts = np.concatenate(barStarts)
+        else:
+            barStarts = np.zeros(0, dtype=np.intp)
+        return cls(columns, barStarts, ticksPerQuarter)
+
+
+    def asArray(self):
+        """Returns the elements as a NumPy record array of
+        RHYTHMSEQUENCEDTYPE. The columns are copied into it, and it's
+        read-only."""
+        data = np.zeros(self._length, dtype=RHYTHMSEQUENCEDTYPE)
+        for name, _ in RHYTHMSEQUENCEFIELDS:
+            data[name] = self._columns[name]
+        data.flags.writeable = False
+        return data
+
+
+    def getColumns(self):
+        """Returns the read-only columns of the sequence, keyed by name"""
+        return dict(self._columns)
+
+
+    def _sliceColumns(self, start, stop):
+        return {name: column[start:stop]
+                for name, column in self._columns.items()}
+
+
+    def getNumBars(self):
+        return len(self._barStarts)
+
+
+    def getBar(self, index):
+        """Returns a view of a bar of the sequence
+
+        Args:
+            index (int): Index of the bar
+
+        Returns:
+            bar (RhythmSequence):
+        """
+        index = range(len(self._barStarts))[index]
+        start = self._barStarts[index]
+        if index == len(self._barStarts) - 1:
+            stop = self._length
+        else:
+            stop = self._barStarts[index + 1]
+        return RhythmSequence(self._sliceColumns(start, stop),
+                              np.zeros(1, dtype=np.intp),
+                              self.ticksPerQuarter)
+
+
+    def getBars(self):
+        return [self.getBar(i) for i in range(len(self._barStarts))]
+
+
+    def getStartTicks(self):
+        if self._length == 0:
+            return 0
+        return int(self._columns["onsetTicks"][0])
+
+
+    def getTotalTicks(self):
+        """Returns the duration of the whole sequence in ticks"""
+        if self._length == 0:
+            return 0
+        return int(self._columns["onsetTicks"][-1] +
+                   self._columns["durationTicks"][-1]) - self.getStartTicks()
+
+
+    def getOnsetTicks(self):
+        return self._columns["onsetTicks"]
+
+
+    def getDurationTicks(self):
+        return self._columns["durationTicks"]
+
+
+    def getDurations(self):
+        """Returns the durations of the elements in quarter notes"""
+        return self._columns["durationTicks"] / float(self.ticksPerQuarter)
+
+
+    def getTies(self):
+        return self._columns["tie"]
+
+
+    def getNumDots(self):
+        return self._columns["numDots"]
+
+
+    def getDurationLevels(self):
+        return self._columns["durationLevel"]
+
+
+    def getMetricalAccents(self):
+        return self._columns["metricalAccent"]
+
+
+    def getNodeIds(self):
+        return self._columns["nodeId"]
+
+
+    def toList(self):
+        """Returns the sequence in the list format of the rhythm generators
+
+        Returns:
+            rhythmicSeq (list): List with a list of [duration, tie] elements
+                                for each bar
+        """
+        durations = self.getDurations().tolist()
+        ties = self._columns["tie"].tolist()
+        stops = self._barStarts.tolist()[1:] + [self._length]
+        return [[[durations[i], TIE if ties[i] else None]
+                 for i in range(start, stop)]
+                for start, stop in zip(self._barStarts.tolist(), stops)]
+
+
+class RhythmSequenceElement(object):
+    """RhythmSequenceElement is an element of a RhythmSequence. It provides
+    the getters of RhythmTree used by the pitch generators.
+
+    Attributes:
+        sequence (RhythmSequence): Sequence the element belongs to
+        index (int): Index of the element in the sequence
+    """
+
+    __slots__ = ("sequence", "index")
+
+    def __init__(self, sequence, index):
+        super(RhythmSequenceElement, self).__init__()
+        self.sequence = sequence
+        self.index = index
+
+
+    def _getField(self, field):
+        return self.sequence._columns[field][self.index].item()
+
+
+    def getOnset(self):
+        return ticksToDuration(self._getField("onsetTicks"),
+                               self.sequence.ticksPerQuarter)
+
+
+    def getOnsetTicks(self):
+        return self._getField("onsetTicks")
+
+
+    def getDuration(self):
+        return ticksToDuration(self._getField("durationTicks"),
+                               self.sequence.ticksPerQuarter)
+
+
+    def getDurationTicks(self):
+        return self._getField("durationTicks")
+
+
+    def getTicksPerQuarter(self):
+        return self.sequence.ticksPerQuarter
+
+
+    def getTie(self):
+        return TIE if self._getField("tie") else None
+
+
+    def getNumDots(self):
+        return self._getField("numDots")
+
+
+    def getDurationLevel(self):
+        return self._getField("durationLevel")
+
+
+    def getMetricalAccent(self):
+        return self._getField("metricalAccent")
+
+
+    def getNodeId(self):
+        return self._getField("nodeId")
@@ -0,0 +1,54 @@
+class RhythmStreamState(object):
+    """RhythmStreamState is the position of a rhythm generator within a
+    stream of rhythm events. It's all a generator needs to resume generating
+    from where it stopped, so a stream can be suspended and restarted with
+    a different generator object.
+
+    Attributes:
+        barTicks (int): Duration of a bar in ticks
+        rhythmTree (RhythmTree): Rhythm tree of the current bar
+        treeKey (hashable): Key of the rhythm chain of the current bar
+        nodeId (int): Breadth-first index in the rhythm tree of the last
+                      node chosen in the current bar. The root (0) if the bar
+                      has just started or no bar has been started
+        numDots (int): Number of dots applied to the last node
+        timeTicks (int): Time reached within the current bar, in ticks
+        barIndex (int): Index of the current bar in the stream, -1 if no
+                        bar has been started
+    """
+
+    def __init__(self, barTicks):
+        super(RhythmStreamState, self).__init__()
+        self.barTicks = barTicks
+        self.rhythmTree = None
+        self.treeKey = None
+        self.nodeId = 0
+        self.numDots = 0
+        self.timeTicks = 0
+        self.barIndex = -1
+
+
+    def isBarFilled(self):
+        """Returns True if a new bar needs to be started"""
+        return self.rhythmTree is None or self.timeTicks == self.barTicks
+
+
+    def startBar(self, rhythmTree, treeKey):
+        """Moves the state to the start of the next bar
+
+        Args:
+            rhythmTree (RhythmTree): Rhythm tree of the new bar
+            treeKey (hashable): Key of the rhythm chain of the new bar
+        """
+        self.rhythmTree = rhythmTree
+        self.treeKey = treeKey
+        self.nodeId = 0
+        self.numDots = 0
+        self.timeTicks = 0
+        self.barIndex += 1
+
+
+    def advance(self, nodeId, numDots, timeTicks):
+        self.nodeId = nodeId
+        self.numDots = numDots
+        self.timeTicks = timeTicks
@@ -1,12 +1,23 @@
 from musiclib.tree import Tree
+from musiclib.ticks import TICKSPERQUARTER, convertTicks, divideTicks, \
+    durationToTicks, ticksToDuration
+
+# max number of dots a duration can have. Candidates are indexed for every
+# number of dots in [0, MAXNUMDOTS]
+MAXNUMDOTS = 2
 
 
 class RhythmTree(Tree):
     """RhythmTree is a class to represent the rhythm space of a bar of
     a given time signature with a tree structure.
 
+    Durations are stored in integer ticks, so that tuplets divide them
+    exactly. Durations in quarter notes are derived from them.
+
     Attributes:
-        duration (float): Duration of node of the rhythm space
+        durationTicks (int): Duration of node of the rhythm space in ticks
+        ticksPerQuarter (int): Resolution of the ticks
+        duration (float): Duration of node in quarter notes
         durationLevel (int):  Metrical level of node of the rhythm space
         metricalAccent (int): Metrical accent level in the metrical grid
         lowestDurationLevel (int):
@@ -14,14 +25,20 @@ class RhythmTree(Tree):
                                   that are a tuplet
     """
 
-    def __init__(self, duration, durationLevel, children=None):
+    def __init__(self, duration, durationLevel, children=None,
+                 ticksPerQuarter=TICKSPERQUARTER):
         super(RhythmTree, self).__init__(duration, children)
-        self.duration = float(duration)
+        self.ticksPerQuarter = ticksPerQuarter
+        self.durationTicks = durationToTicks(duration, ticksPerQuarter)
         self.durationLevel = durationLevel
         self.metricalAccent = None
         self.lowestDurationLevel = None
         self.hasTupletChildren = False
 
+        # successor index: candidate durations for every number of dots,
+        # filled in by compileDurationCandidates
+        self._durationCandidates = None
+
 
     def __str__(self, level=0):
         representation = "  " * level + str(self.duration) + "\n"
@@ -30,6 +47,33 @@ class RhythmTree(Tree):
         return representation
 
 
+    @classmethod
+    def fromTicks(cls, durationTicks, durationLevel, ticksPerQuarter,
+                  children=None):
+        """Creates a node with a duration in ticks
+
+        Args:
+            durationTicks (int):
+            durationLevel (int):
+            ticksPerQuarter (int): Resolution of the ticks
+            children (list): Children RhythmTree objects
+        """
+        node = cls(ticksToDuration(durationTicks, ticksPerQuarter),
+                   durationLevel, children, ticksPerQuarter)
+        node.durationTicks = durationTicks
+        return node
+
+
+    @property
+    def duration(self):
+        return ticksToDuration(self.durationTicks, self.ticksPerQuarter)
+
+
+    @duration.setter
+    def duration(self, duration):
+        self.durationTicks = durationToTicks(duration, self.ticksPerQuarter)
+
+
     def calculateTupletItemDuration(self, tupletType):
         """Returns the duration of the items of a tuplet at a given
         metrical level
@@ -39,25 +83,119 @@ class RhythmTree(Tree):
                               inserted (e.g., 3 stands for triplet,
                               5 for quintuplet)
         """
-        return self.duration / tupletType
+        return ticksToDuration(self.calculateTupletItemTicks(tupletType),
+                               self.ticksPerQuarter)
+
+
+    def calculateTupletItemTicks(self, tupletType):
+        """Returns the duration in ticks of the items of a tuplet at a given
+        metrical level. Raises a ValueError if the resolution of the tree
+        can't represent them exactly.
+
+        Args:
+            tupletType (int): Number that indicates the type of tuplet to be
+                              inserted (e.g., 3 stands for triplet,
+                              5 for quintuplet)
+        """
+        return divideTicks(self.durationTicks, tupletType)
 
 
 
     def getDurationCandidates(self, numDots):
         """Returns all the durations in the rhythmic space available after the
-        current one
+        current one. Candidates are read from the successor index of the
+        tree, which gets compiled on the first lookup after the tree has
+        been created or changed.
 
         Args:
             numDots (int): Number of dots current rhythmic space
 
         Returns:
-            candidateDurations (list): List of RhythmTree objects
+            candidateDurations (tuple): Tuple of RhythmTree objects, or None
+                                        if there are no candidates
         """
 
-        if numDots == 0:
-            return self._getDurationCandidatesNoDot()
-        else:
-            return self._getDurationCandidatesDot(numDots)
+        if self._durationCandidates is None:
+            self.getRoot().compileDurationCandidates()
+        return self._durationCandidates[numDots]
+
+
+    def compileDurationCandidates(self):
+        """Builds the successor index for this node and all of its
+        descendants. For every node and number of dots it stores the tuple of
+        candidate durations, so that getDurationCandidates doesn't have to
+        traverse the tree.
+        """
+
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            candidates = [node._getDurationCandidatesNoDot()]
+            for numDots in range(1, MAXNUMDOTS + 1):
+                candidates.append(node._getDurationCandidatesDotIfAny(numDots))
+            node._durationCandidates = tuple(
+                tuple(c) if c is not None else None for c in candidates)
+            nodes.extend(node.children)
+
+
+    def clone(self):
+        """Returns a structural copy of this node and all of its descendants.
+        The copy doesn't share any node with the original, so it can be
+        modified (e.g., by inserting tuplets) without affecting it. If the
+        successor index has been compiled, it gets carried over to the copy.
+
+        Returns:
+            rhythmTree (RhythmTree): Copy of the tree
+        """
+
+        cloneRoot = self._cloneNode()
+        clones = {self: cloneRoot}
+        nodes = [(self, cloneRoot)]
+        while nodes:
+            node, nodeClone = nodes.pop()
+            for child in node.children:
+                childClone = child._cloneNode()
+                nodeClone.addChild(childClone)
+                clones[child] = childClone
+                nodes.append((child, childClone))
+
+        # map the successor index onto the cloned nodes. Candidates that
+        # fall outside of the cloned subtree get compiled on lookup
+        for node, nodeClone in clones.items():
+            if node._durationCandidates is None:
+                continue
+            try:
+                nodeClone._durationCandidates = tuple(
+                    tuple(clones[c] for c in candidates)
+                    if candidates is not None else None
+                    for candidates in node._durationCandidates)
+            except KeyError:
+                nodeClone._durationCandidates = None
+
+        return cloneRoot
+
+
+    def _cloneNode(self):
+        """Returns a copy of the node without parent and children"""
+        node = RhythmTree.fromTicks(self.durationTicks, self.durationLevel,
+                                    self.ticksPerQuarter)
+        node.metricalAccent = self.metricalAccent
+        node.lowestDurationLevel = self.lowestDurationLevel
+        node.hasTupletChildren = self.hasTupletChildren
+        return node
+
+
+    def invalidateDurationCandidates(self):
+        """Clears the successor index for this node and all of its
+        descendants. Needs to be called on the root every time the structure
+        of the tree changes (e.g., when a tuplet gets inserted)
+        """
+
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            node._durationCandidates = None
+            nodes.extend(node.children)
 
 
 
@@ -80,6 +218,24 @@ class RhythmTree(Tree):
         return self.duration
 
 
+    def getDurationTicks(self, ticksPerQuarter=None):
+        """Returns the duration of the node in ticks
+
+        Args:
+            ticksPerQuarter (int): Resolution of the ticks (see
+                                   Metre.getTicksPerQuarter). If None, the
+                                   resolution of the tree
+        """
+        if ticksPerQuarter is None:
+            return self.durationTicks
+        return convertTicks(self.durationTicks, self.ticksPerQuarter,
+                            ticksPerQuarter)
+
+
+    def getTicksPerQuarter(self):
+        return self.ticksPerQuarter
+
+
     def getDurationLevel(self):
         return self.durationLevel
 
@@ -88,6 +244,10 @@ class RhythmTree(Tree):
         self.duration = duration
 
 
+    def setDurationTicks(self, durationTicks):
+        self.durationTicks = durationTicks
+
+
     def getDepthOfTree(self, depth=0):
         if not self.hasChildren():
             return depth
@@ -242,6 +402,25 @@ class RhythmTree(Tree):
         return candidateDurations
 
 
+    def _getDurationCandidatesDotIfAny(self, numDots):
+        """Returns next duration candidates if current duration is dotted, or
+        None if the node can't be dotted 'numDots' times (i.e., it has no
+        right sibling or not enough levels below the right sibling)
+
+        Args:
+            numDots (int): Should be either 1 or 2
+        """
+
+        LASTCHILDINDEX = 1
+
+        rightSibling = self.getRightSibling()
+        if rightSibling is None:
+            return None
+        if rightSibling.getDescendantAtIndex(numDots, LASTCHILDINDEX) is None:
+            return None
+        return self._getDurationCandidatesDot(numDots)
+
+
     def _getIndexOfNodeInTree(self):
         if self.parent is not None:
             curIndex = self._getIndexOfNodeInSiblingList()
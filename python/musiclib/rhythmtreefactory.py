@@ -1,36 +1,131 @@
+from collections import OrderedDict
 from musiclib.rhythmtree import RhythmTree
+from musiclib.persistentrhythmtree import PersistentRhythmTree
+from musiclib.flatrhythmtree import FlatRhythmTree
+from musiclib.flattree import NONODE
 from musiclib.probability import *
-from melodrive.stats.randommanager import RandomManager
+from musiclib.ticks import durationToTicks, divideTicks
 
 FOURFOUR = "4/4"
 THREEFOUR = "3/4"
 
+# max number of template rhythm trees kept by a factory
+TEMPLATECACHESIZE = 16
+
 
 class RhythmTreeFactory(object):
     """RhythmTreeFactory is a class used for instantiating and
     manipulating rhythm space objects.
+
+    Attributes:
+        templateCacheSize (int): Max number of template trees kept in cache
+        random (random.Random): Random context tuplets are inserted with. If
+                                None, the active random manager
     """
 
-    def __init__(self):
+    def __init__(self, templateCacheSize=TEMPLATECACHESIZE, random=None):
         super(RhythmTreeFactory, self).__init__()
+        self.templateCacheSize = templateCacheSize
+        self.random = random
+
+        # canonical rhythm trees, least recently used first
+        self._templates = OrderedDict()
+        self._flatTemplates = OrderedDict()
 
 
     def createRhythmTree(self, lowestDurationLevel, metre,
                          highestDurationLevel=0):
+        """Returns a rhythm space tree. The tree is a copy of a template tree
+        which is built only once for each metre and range of duration levels,
+        so it can be freely modified (e.g., by inserting tuplets).
+
+        Args:
+            lowestDurationLevel (int): Lowest duration level of the rhythm
+                                       space to be created
+            metre (Metre): Metre object
+            highestDurationLevel (int): Duration level of the root
+        """
+        key = self._getTemplateKey(lowestDurationLevel, metre,
+                                   highestDurationLevel)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._buildRhythmTree(lowestDurationLevel, metre,
+                                             highestDurationLevel)
+            template.compileDurationCandidates()
+            self._addTemplate(self._templates, key, template)
+        else:
+            self._templates.move_to_end(key)
+
+        return template.clone()
+
+
+    def createFlatRhythmTree(self, lowestDurationLevel, metre,
+                             highestDurationLevel=0):
+        """Returns a rhythm space tree built directly in the arrays of a
+        FlatRhythmTree, with the same nodes as createRhythmTree. The tree is a
+        copy of a cached template, so it can be freely modified (e.g., by
+        addTupletsToFlatRhythmTree).
+
+        Args:
+            lowestDurationLevel (int): Lowest duration level of the rhythm
+                                       space to be created
+            metre (Metre): Metre object
+            highestDurationLevel (int): Duration level of the root
+        """
+        key = self._getTemplateKey(lowestDurationLevel, metre,
+                                   highestDurationLevel)
+        template = self._flatTemplates.get(key)
+        if template is None:
+            template = self._buildFlatRhythmTree(lowestDurationLevel, metre,
+                                                 highestDurationLevel)
+            self._addTemplate(self._flatTemplates, key, template)
+        else:
+            self._flatTemplates.move_to_end(key)
+
+        return template.copy()
+
+
+    def clearTemplateCache(self):
+        """Removes all template trees from the cache"""
+        self._templates.clear()
+        self._flatTemplates.clear()
+
+
+    @staticmethod
+    def _getTemplateKey(lowestDurationLevel, metre, highestDurationLevel):
+        subdivisions = metre.getDurationSubdivisions()
+        return (metre.getTimeSignature(),
+                tuple(sorted(subdivisions.items())), highestDurationLevel,
+                lowestDurationLevel)
+
+
+    def _addTemplate(self, templates, key, template):
+        templates[key] = template
+
+        # evict least recently used template
+        if len(templates) > self.templateCacheSize:
+            templates.popitem(last=False)
+
+
+    def _buildRhythmTree(self, lowestDurationLevel, metre,
+                         highestDurationLevel=0):
         """Instantiate and returns a rhythm space tree
 
         Args:
             lowestDurationLevel (int): Lowest duration level of the rhythm
                                        space to be created
             metre (Metre): Metre object
+            highestDurationLevel (int): Duration level of the root
         """
         startLevel = highestDurationLevel
         timeSignature = metre.getTimeSignature()
         duration = RhythmTreeFactory.getDurationAtDurationLevel(timeSignature,
                                                                 startLevel)
 
-        # instantiate root level of rhythm tree
-        rhythmTree = RhythmTree(duration, startLevel)
+        # instantiate root level of rhythm tree, with the resolution of the
+        # metre, so that all its durations and tuplets are exact ticks
+        rhythmTree = RhythmTree(duration, startLevel,
+                                ticksPerQuarter=metre.getTicksPerQuarter())
         rhythmTree.setMetricalAccent(startLevel)
         rhythmTree.setLowestDurationLevel(lowestDurationLevel)
 
@@ -48,6 +143,43 @@ class RhythmTreeFactory(object):
         return rhythmTree
 
 
+    def _buildFlatRhythmTree(self, lowestDurationLevel, metre,
+                             highestDurationLevel=0):
+        """Builds a rhythm space tree in the arrays of a FlatRhythmTree. Nodes
+        are added breadth-first, so they have the same indexes as in a
+        FlatRhythmTree copied from the tree of _buildRhythmTree.
+
+        Args:
+            lowestDurationLevel (int): Lowest duration level of the rhythm
+                                       space to be created
+            metre (Metre): Metre object
+            highestDurationLevel (int): Duration level of the root
+        """
+        startLevel = highestDurationLevel
+        duration = RhythmTreeFactory.getDurationAtDurationLevel(
+            metre.getTimeSignature(), startLevel)
+        durationSubdivisions = metre.getDurationSubdivisions()
+        ticksPerQuarter = metre.getTicksPerQuarter()
+
+        tree = FlatRhythmTree(ticksPerQuarter)
+        tree.lowestDurationLevel = lowestDurationLevel
+        tree.addRhythmNode(NONODE, durationToTicks(duration, ticksPerQuarter),
+                           startLevel, startLevel)
+
+        # 'len(tree)' grows while the nodes are expanded
+        index = 0
+        while index < len(tree):
+            parentLevel = tree.durationLevel[index]
+            if parentLevel < lowestDurationLevel:
+                subdivisions = durationSubdivisions[parentLevel]
+                self._addFlatChildren(
+                    tree, index, subdivisions,
+                    divideTicks(tree.durationTicks[index], subdivisions),
+                    parentLevel + 1)
+            index += 1
+        return tree
+
+
     def addTupletsToRhythmTree(self, parent, probTuplets, probTupletType):
         """Inserts tuplets in the rhythm space tree
 
@@ -64,7 +196,7 @@ class RhythmTreeFactory(object):
         lowestDurationLevel = parent.getLowestDurationLevel()
         currentLevel = parent.getDurationLevel()
         metricalAccent = parent.getMetricalAccent()
-        random = RandomManager.getActive()
+        random = getRandom(self.random)
 
         # return up the stack if we're at the penultimate lowest duration level
 
@@ -86,6 +218,235 @@ class RhythmTreeFactory(object):
         return parent
 
 
+    def addTupletsToPersistentRhythmTree(self, root, probTuplets,
+                                         probTupletType, path=()):
+        """Inserts tuplets in a persistent rhythm space tree, making the same
+        random decisions as addTupletsToRhythmTree. The tree passed in is left
+        untouched.
+
+        Args:
+            root (PersistentRhythmTree): Root of the rhythm space tree
+            probTuplet (list): Prob of having a tuplet at different duration
+                               levels
+            probTupletType (dict): Prob of having different types of tuplets at
+                                   different duration levels
+            path (tuple): Child indexes of the node to start from
+
+        Returns:
+            newRoot (PersistentRhythmTree): Root of the rhythm space with
+                                            tuplets
+        """
+
+        node = root.getNode(path)
+        lowestDurationLevel = node.getLowestDurationLevel()
+        currentLevel = node.getDurationLevel()
+        metricalAccent = node.getMetricalAccent()
+        random = getRandom(self.random)
+
+        # return up the stack if we're at the penultimate lowest duration level
+        if (lowestDurationLevel - currentLevel) < 1:
+            return root
+
+        # decide whether to insert tuplets
+        r = random.random()
+        if r < probTuplets[currentLevel][metricalAccent]:
+
+            # decide which type of tuplets to insert
+            tupletType = self._decideTupletType(probTupletType, currentLevel)
+            return self.insertPersistentTuplet(root, path, tupletType)
+
+        for childIndex in range(len(node.getChildren())):
+            root = self.addTupletsToPersistentRhythmTree(root, probTuplets,
+                                                         probTupletType,
+                                                         path + (childIndex,))
+        return root
+
+
+    def enumerateTupletConfigurations(self, root, probTuplets,
+                                      probTupletType, path=()):
+        """Lists every version of a persistent rhythm space tree that
+        addTupletsToPersistentRhythmTree can return, with the probability
+        of it being returned. Versions reached through different decisions
+        aren't merged.
+
+        Args:
+            root (PersistentRhythmTree): Root of the rhythm space tree
+            probTuplet (list): Prob of having a tuplet at different duration
+                               levels
+            probTupletType (dict): Prob of having different types of tuplets at
+                                   different duration levels
+            path (tuple): Child indexes of the node to start from
+
+        Returns:
+            configurations (list): (probability, newRoot) tuples
+        """
+
+        node = root.getNode(path)
+        lowestDurationLevel = node.getLowestDurationLevel()
+        currentLevel = node.getDurationLevel()
+        metricalAccent = node.getMetricalAccent()
+
+        if (lowestDurationLevel - currentLevel) < 1:
+            return [(1.0, root)]
+
+        configurations = []
+        probTuplet = probTuplets[currentLevel][metricalAccent]
+        if probTuplet > 0:
+            for tupletType, probType in self._calcTupletTypeProbabilities(
+                    probTupletType, currentLevel):
+                configurations.append(
+                    (probTuplet * probType,
+                     self.insertPersistentTuplet(root, path, tupletType)))
+
+        if probTuplet < 1:
+            # the children are decided independently, one after the other
+            childConfigurations = [(1.0 - probTuplet, root)]
+            for childIndex in range(len(node.getChildren())):
+                childConfigurations = [
+                    (prob * childProb, childRoot)
+                    for prob, newRoot in childConfigurations
+                    for childProb, childRoot in
+                    self.enumerateTupletConfigurations(
+                        newRoot, probTuplets, probTupletType,
+                        path + (childIndex,))]
+            configurations.extend(childConfigurations)
+        return configurations
+
+
+    def addTupletsToFlatRhythmTree(self, tree, probTuplets, probTupletType):
+        """Inserts tuplets in a flat rhythm space tree, making the same random
+        decisions as addTupletsToRhythmTree. Nodes are visited with a stack
+        instead of recursion.
+
+        Args:
+            tree (FlatRhythmTree): Rhythm space tree, which is modified
+            probTuplet (list): Prob of having a tuplet at different duration
+                               levels
+            probTupletType (dict): Prob of having different types of tuplets at
+                                   different duration levels
+
+        Returns:
+            tree (FlatRhythmTree): Rhythm space with tuplets
+        """
+        lowestDurationLevel = tree.lowestDurationLevel
+        random = getRandom(self.random)
+
+        # nodes are visited in the same order as the recursive version
+        stack = [0]
+        while stack:
+            index = stack.pop()
+            currentLevel = tree.durationLevel[index]
+
+            # don't go below the penultimate lowest duration level
+            if (lowestDurationLevel - currentLevel) < 1:
+                continue
+
+            # decide whether to insert tuplets
+            r = random.random()
+            if r < probTuplets[currentLevel][tree.metricalAccent[index]]:
+                tupletType = self._decideTupletType(probTupletType,
+                                                    currentLevel)
+                self.insertFlatTuplet(tree, index, tupletType)
+                continue
+
+            stack.extend(reversed(tree.getChildIndexes(index)))
+        return tree
+
+
+    def enumerateFlatTupletConfigurations(self, tree, probTuplets,
+                                          probTupletType, index=0):
+        """Lists every version of a flat rhythm space tree that
+        addTupletsToFlatRhythmTree can return, with the probability of it
+        being returned, like enumerateTupletConfigurations does for
+        persistent trees. The tree passed in is left untouched.
+
+        Args:
+            tree (FlatRhythmTree): Rhythm space tree
+            probTuplet (list): Prob of having a tuplet at different duration
+                               levels
+            probTupletType (dict): Prob of having different types of tuplets at
+                                   different duration levels
+            index (int): Index of the node to start from
+
+        Returns:
+            configurations (list): (probability, newTree) tuples
+        """
+        currentLevel = tree.durationLevel[index]
+        if (tree.lowestDurationLevel - currentLevel) < 1:
+            return [(1.0, tree)]
+
+        configurations = []
+        probTuplet = probTuplets[currentLevel][tree.metricalAccent[index]]
+        if probTuplet > 0:
+            for tupletType, probType in self._calcTupletTypeProbabilities(
+                    probTupletType, currentLevel):
+                configurations.append(
+                    (probTuplet * probType,
+                     self.insertFlatTuplet(tree.copy(), index, tupletType)))
+
+        if probTuplet < 1:
+            # the children are decided independently, one after the other.
+            # Inserting a tuplet only adds nodes, so the indexes of the
+            # children are the same in every version
+            childConfigurations = [(1.0 - probTuplet, tree)]
+            for childIndex in tree.getChildIndexes(index):
+                childConfigurations = [
+                    (prob * childProb, childTree)
+                    for prob, newTree in childConfigurations
+                    for childProb, childTree in
+                    self.enumerateFlatTupletConfigurations(
+                        newTree, probTuplets, probTupletType, childIndex)]
+            configurations.extend(childConfigurations)
+        return configurations
+
+
+    def insertFlatTuplet(self, tree, index, tupletType):
+        """Inserts a tuplet of a given type in a node of a flat rhythm space
+        tree, giving it the same descendants as insertTuplet
+
+        Args:
+            tree (FlatRhythmTree): Rhythm space tree, which is modified
+            index (int): Index of the node that gets the tuplet
+            tupletType (int): Number that indicates the type of tuplet to be
+                              inserted (e.g., 5 stands for quintuplet)
+
+        Returns:
+            tree (FlatRhythmTree)
+        """
+        availableNonTripletTuplets = (5, 7)
+
+        if tupletType == 3:
+            self._insertFlatTriplet(tree, index)
+        elif tupletType in availableNonTripletTuplets:
+            self._insertFlatNonTripletTuplets(tree, index, tupletType)
+        else:
+            raise ValueError("%s-tuplet is not a supported tuplet type" %
+                             tupletType)
+        tree.hasTupletChildren[index] = True
+        return tree
+
+
+    def insertPersistentTuplet(self, root, path, tupletType):
+        """Inserts a tuplet of a given type in a node of a persistent rhythm
+        space tree
+
+        Args:
+            root (PersistentRhythmTree): Root of the rhythm space tree
+            path (tuple): Child indexes of the node that gets the tuplet
+            tupletType (int): Number that indicates the type of tuplet to be
+                              inserted (e.g., 5 stands for quintuplet)
+
+        Returns:
+            newRoot (PersistentRhythmTree): Root of the new version of the tree
+        """
+
+        # insert the tuplet in a mutable copy of the node only
+        node = root.getNode(path).toRhythmTree()
+        self.insertTuplet(node, tupletType)
+        newNode = PersistentRhythmTree.fromRhythmTree(node)
+        return root.replaceNode(path, newNode)
+
+
     def restoreRhythmTree(self, tree):
         """Restores normal durations, removing tuplets for all of the rhythm
         space tree
@@ -125,6 +486,9 @@ class RhythmTreeFactory(object):
             raise ValueError("%s-tuplet is not a supported tuplet type" %
                              tupletType)
         parent.setHasTupletChildren(True)
+
+        # the structure of the tree changed, so the successor index is stale
+        parent.getRoot().invalidateDurationCandidates()
         return parent
 
 
@@ -145,6 +509,9 @@ class RhythmTreeFactory(object):
 
         self._expandNode(lowestDurationLevel, startLevel, tree)
 
+        # the structure of the tree changed, so the successor index is stale
+        tree.getRoot().invalidateDurationCandidates()
+
 
     def _insertNonTripletTuplets(self, parent, tupletType):
         """Inserts a non triplet tuplet in a rhythm space tree.
@@ -192,18 +559,18 @@ class RhythmTreeFactory(object):
 
         # add extra child to parent
         parentDurationLevel = parent.getDurationLevel()
-        child = RhythmTree(1, parentDurationLevel + 1)
+        tripletItemTicks = parent.calculateTupletItemTicks(3)
+        child = RhythmTree.fromTicks(tripletItemTicks, parentDurationLevel + 1,
+                                     parent.getTicksPerQuarter())
         child.setMetricalAccent(parentDurationLevel+1)
 
         parent.addChild(child)
 
         tripletItems = parent.getChildren()
 
-        tripletItemDuration = parent.calculateTupletItemDuration(3)
-
         # change duration of children
         for item in tripletItems:
-            item.setDuration(tripletItemDuration)
+            item.setDurationTicks(tripletItemTicks)
 
         lowestDurationLevel = parent.getLowestDurationLevel()
         startLevel = parentDurationLevel + 2
@@ -213,6 +580,97 @@ class RhythmTreeFactory(object):
         self._expandNode(lowestDurationLevel, startLevel, parent.children[2])
 
 
+    def _insertFlatTriplet(self, tree, parent):
+        parentDurationLevel = tree.durationLevel[parent]
+        tripletItemTicks = divideTicks(tree.durationTicks[parent], 3)
+
+        # the existing items and their descendants get shorter durations,
+        # like in _modifyTripletItemsDurations
+        items = tree.getChildIndexes(parent)
+        queue = []
+        for item in items:
+            tree.durationTicks[item] = tripletItemTicks
+            queue.append(item)
+        for node in queue:
+            for child in tree.getChildIndexes(node):
+                tree.durationTicks[child] = divideTicks(
+                    tree.durationTicks[node], 2)
+                queue.append(child)
+
+        # add the third item and expand it
+        item = tree.addRhythmNode(parent, tripletItemTicks,
+                                  parentDurationLevel + 1,
+                                  parentDurationLevel + 1)
+        self._expandFlatNode(tree, item, tree.lowestDurationLevel,
+                             parentDurationLevel + 2)
+
+
+    def _insertFlatNonTripletTuplets(self, tree, parent, tupletType):
+        numDurationLevelsBelowParent = 2
+
+        # check there are two duration levels below the parent
+        if not tree.getNode(parent).hasDescendant(
+                numDurationLevelsBelowParent):
+            raise ValueError("It's not possible to insert a %s-tuplet, "
+                             "as there are not enough duration levels to "
+                             "support it" % tupletType)
+
+        # cut off the children, and create the items of the tuplet
+        tree.removeChildren(parent)
+        durationLevelChildren = (tree.durationLevel[parent] +
+                                 numDurationLevelsBelowParent)
+        items = self._addFlatChildren(
+            tree, parent, tupletType,
+            divideTicks(tree.durationTicks[parent], tupletType),
+            durationLevelChildren)
+
+        for item in items:
+            self._expandFlatNode(tree, item, tree.lowestDurationLevel,
+                                 durationLevelChildren + 1)
+
+
+    def _expandFlatNode(self, tree, parent, lowestDurationLevel,
+                        currentLevel):
+        """Adds binary subdivisions below a node of a flat tree down to the
+        lowest duration level, like _expandNode
+
+        Args:
+            tree (FlatRhythmTree):
+            parent (int): Index of the node to be expanded
+            lowestDurationLevel (int):
+            currentLevel (int): Duration level of the children of the node
+        """
+        queue = [(parent, currentLevel)]
+        for node, level in queue:
+            if (lowestDurationLevel - level) < 0:
+                continue
+            for child in self._addFlatChildren(
+                    tree, node, 2, divideTicks(tree.durationTicks[node], 2),
+                    level):
+                queue.append((child, level + 1))
+
+
+    @staticmethod
+    def _addFlatChildren(tree, parent, number, durationTicks, durationLevel):
+        """Adds children to a node of a flat tree. The first child takes the
+        metrical accent of the parent, the others the accent of their
+        duration level.
+
+        Returns:
+            children (list): Indexes of the children
+        """
+        children = []
+        for i in range(number):
+            if i == 0:
+                metricalAccent = tree.metricalAccent[parent]
+            else:
+                metricalAccent = durationLevel
+            children.append(tree.addRhythmNode(parent, durationTicks,
+                                               durationLevel,
+                                               metricalAccent))
+        return children
+
+
     def _expandTree(self, parent, lowestDurationLevel, durationLevels,
                     durationSubdivisions, barDuration, currentLevel):
 
@@ -224,12 +682,12 @@ class RhythmTreeFactory(object):
 
         # calculate duration of child
         subdivisionsParent = durationSubdivisions[parentLevel]
-        parentDuration = parent.getDuration()
-        duration = parentDuration / subdivisionsParent
+        ticks = divideTicks(parent.getDurationTicks(), subdivisionsParent)
 
         # create as many children as the number of subdivisions of the parent
         for _ in range(subdivisionsParent):
-            child = RhythmTree(duration, currentLevel)
+            child = RhythmTree.fromTicks(ticks, currentLevel,
+                                         parent.getTicksPerQuarter())
             parent.addChild(child)
 
             child.assignMetricalAccent(parent, currentLevel)
@@ -250,10 +708,9 @@ class RhythmTreeFactory(object):
 
         # change durations of children to be half of that of parent
         if parentDurationLevel > thresholdDurationLevel:
-            parentDuration = parent.getDuration()
-            newChildDuration = parentDuration / 2
+            newChildTicks = divideTicks(parent.getDurationTicks(), 2)
             for child in children:
-                child.setDuration(newChildDuration)
+                child.setDurationTicks(newChildTicks)
                 self._modifyTripletItemsDurations(child, thresholdDurationLevel)
         else:
             for child in children:
@@ -267,10 +724,10 @@ class RhythmTreeFactory(object):
         # return up the stack if we've reached the desired depth
         if (lowestDurationLevel - currentLevel) < 0:
             return
-        parentDuration = parent.getDuration()
-        duration = parentDuration / numSubdivisions
+        ticks = divideTicks(parent.getDurationTicks(), numSubdivisions)
         for _ in range(2):
-            child = RhythmTree(duration, currentLevel)
+            child = RhythmTree.fromTicks(ticks, currentLevel,
+                                         parent.getTicksPerQuarter())
             parent.addChild(child)
 
             # assign metrical accent to child
@@ -286,7 +743,8 @@ class RhythmTreeFactory(object):
         Args:
             parent (RhythmTree): Node we want to add the children to
             number (int): Number of children to be added
-            noteDuration (float): Note duration of children
+            noteDuration (float): Note duration of children. It must be
+                                  exact in the ticks of the parent
             durationLevel (float): duration level of children
 
         Returns:
@@ -296,7 +754,8 @@ class RhythmTreeFactory(object):
 
         # create children, add them to parent and assign them a metrical accent
         for i in range(number):
-            child = RhythmTree(noteDuration, durationLevel)
+            child = RhythmTree(noteDuration, durationLevel,
+                               ticksPerQuarter=parent.getTicksPerQuarter())
 
             if i == 0:
                 child.setMetricalAccent(parentMetricalAccent)
@@ -320,7 +779,7 @@ class RhythmTreeFactory(object):
             tupletType (int): Tuplet type (e.g., '3' stands for triplet)
         """
         normDistr = toNormalisedCumulativeDistr(probTupletType[currentLevel])
-        outcome = decideCumulativeDistrOutcome(normDistr)
+        outcome = decideCumulativeDistrOutcome(normDistr, self.random)
 
         # map index onto tuplet type
         if outcome == 0:
@@ -331,6 +790,25 @@ class RhythmTreeFactory(object):
             return 7
 
 
+    def _calcTupletTypeProbabilities(self, probTupletType, currentLevel):
+        """Returns the probability of _decideTupletType deciding each tuplet
+        type
+
+        Args:
+            probTupletType (list of list): Prob tuplet type across duration
+                                           levels
+            currentLevel (int): Current duration level
+
+        Returns:
+            probabilities (list): (tupletType, probability) tuples of the
+                                  types with a non-zero probability
+        """
+        normDistr = normaliseDistr(probTupletType[currentLevel])
+        return [(tupletType, prob)
+                for tupletType, prob in zip((3, 5, 7), normDistr)
+                if prob > 0]
+
+
     def setMetricalAccents(self, rhythmTree, accentList):
         """Set a list of accents on a tree
 
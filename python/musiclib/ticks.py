@@ -0,0 +1,125 @@
+from fractions import Fraction
+from math import gcd
+
+# tuplet types that can be inserted in a rhythm space (see
+# RhythmTreeFactory.insertTuplet)
+TUPLETTYPES = (3, 5, 7)
+
+# max denominator used when converting float durations into fractions
+MAXDENOMINATOR = 10 ** 6
+
+# max distance from an integer of a float number of ticks
+TICKSTOLERANCE = 1e-6
+
+# resolution of the events and rhythm trees which aren't created for a
+# metre. It represents exactly the durations, dots and tuplet items of the
+# 4/4 and 3/4 metres (see Metre.getTicksPerQuarter)
+TICKSPERQUARTER = 3360
+
+
+def calculateTicksPerQuarter(durations, tupletTypes=TUPLETTYPES, maxNumDots=0):
+    """Returns the smallest number of ticks per quarter note that represents
+    exactly all the given durations, their dotted versions and their tuplet
+    items
+
+    Args:
+        durations (list): Durations in quarter notes
+        tupletTypes (tuple): Types of tuplets that can divide the durations
+        maxNumDots (int): Max number of dots that can be applied to the
+                          durations
+
+    Returns:
+        ticksPerQuarter (int):
+    """
+    ticksPerQuarter = 1
+    for duration in durations:
+        duration = Fraction(duration).limit_denominator(MAXDENOMINATOR)
+        for tupletType in (1,) + tuple(tupletTypes):
+            shortestDuration = duration / (tupletType * 2 ** maxNumDots)
+            denominator = shortestDuration.denominator
+            ticksPerQuarter = ticksPerQuarter * denominator // gcd(
+                ticksPerQuarter, denominator)
+    return ticksPerQuarter
+
+
+def durationToTicks(duration, ticksPerQuarter):
+    """Converts a duration in quarter notes into ticks
+
+    Args:
+        duration (float): Duration in quarter notes. Can be a Fraction
+        ticksPerQuarter (int):
+
+    Returns:
+        ticks (int):
+    """
+    ticks = duration * ticksPerQuarter
+    roundedTicks = int(round(ticks))
+    if abs(ticks - roundedTicks) > TICKSTOLERANCE:
+        raise ValueError("%s can't be represented with %s ticks per quarter "
+                         "note" % (duration, ticksPerQuarter))
+    return roundedTicks
+
+
+def ticksToDuration(ticks, ticksPerQuarter):
+    """Converts ticks into a duration in quarter notes
+
+    Args:
+        ticks (int):
+        ticksPerQuarter (int):
+
+    Returns:
+        duration (float):
+    """
+    return ticks / float(ticksPerQuarter)
+
+
+def ticksToFraction(ticks, ticksPerQuarter):
+    """Converts ticks into an exact duration in quarter notes
+
+    Args:
+        ticks (int):
+        ticksPerQuarter (int):
+
+    Returns:
+        duration (Fraction):
+    """
+    return Fraction(ticks, ticksPerQuarter)
+
+
+def convertTicks(ticks, fromTicksPerQuarter, toTicksPerQuarter):
+    """Converts ticks from a resolution into another one
+
+    Args:
+        ticks (int):
+        fromTicksPerQuarter (int): Resolution of 'ticks'
+        toTicksPerQuarter (int): Resolution of the result
+
+    Returns:
+        ticks (int):
+    """
+    if fromTicksPerQuarter == toTicksPerQuarter:
+        return ticks
+    convertedTicks, remainder = divmod(ticks * toTicksPerQuarter,
+                                       fromTicksPerQuarter)
+    if remainder:
+        raise ValueError("%s ticks at %s ticks per quarter note can't be "
+                         "represented with %s ticks per quarter note" %
+                         (ticks, fromTicksPerQuarter, toTicksPerQuarter))
+    return convertedTicks
+
+
+def divideTicks(ticks, divisor):
+    """Divides ticks into equal parts (e.g., the items of a tuplet)
+
+    Args:
+        ticks (int):
+        divisor (int): Number of parts
+
+    Returns:
+        ticks (int): Ticks of each part
+    """
+    partTicks, remainder = divmod(ticks, divisor)
+    if remainder:
+        raise ValueError("%s ticks can't be divided into %s equal parts" %
+                         (ticks, divisor))
+    return partTicks
@@ -170,6 +170,14 @@ class Tree(object):
         return self.parent
 
 
+    def getRoot(self):
+        """Returns the root of the tree the node belongs to"""
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+
     def getRightSibling(self):
         """Returns right sibling with same parent if possible. If there's no
         right sibling, returns None"""
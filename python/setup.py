@@ -7,5 +7,6 @@ setup(
     license="private",
     keywords="Music Representation",
     url="http://melodrive.com",
+    install_requires=["numpy"],
     packages=find_packages(exclude=['tests'])
 )
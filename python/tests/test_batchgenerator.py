@@ -0,0 +1,57 @@
+from musiclib.batchgenerator import MUJob, generateBatch, deriveJobSeed, runJob
+
+job = MUJob(features={"density": 0.2, "entropy": 0.1,
+                      "harmonicComplexity": 0.5, "minMajRatio": 0.3},
+            generateLicks=False)
+
+
+def summarise(mu):
+    return (mu.jobIndex, mu.melodicRhythm.toList(), mu.harmonicRhythm.toList(),
+            [chord.getCode() for chord in mu.chords],
+            [note.getPitch() for note in mu.backbone])
+
+
+def testJobSeedsOnlyDependOnMasterSeedAndIndex():
+    seeds = [deriveJobSeed(3, jobIndex) for jobIndex in range(100)]
+    assert len(set(seeds)) == 100
+    assert seeds == [deriveJobSeed(3, jobIndex) for jobIndex in range(100)]
+    assert seeds != [deriveJobSeed(4, jobIndex) for jobIndex in range(100)]
+
+
+def testResultsDontDependOnWorkers():
+    serialResults = [summarise(mu) for mu in generateBatch(job, 12, 7,
+                                                           maxWorkers=0)]
+    assert [result[0] for result in serialResults] == list(range(12))
+
+    parallelResults = generateBatch(job, 12, 7, maxWorkers=2, chunkSize=5)
+    assert [summarise(mu) for mu in parallelResults] == serialResults
+
+    # jobs don't depend on the jobs run before them in the same process
+    reversedResults = [summarise(runJob(job, 7, jobIndex))
+                       for jobIndex in reversed(range(12))]
+    assert reversedResults[::-1] == serialResults
+
+
+def testLicksDontDependOnWorkers():
+    lickJob = MUJob(features=job.features, generateLicks=True)
+    serialResults = [summarise(mu) + (mu.lick,)
+                     for mu in generateBatch(lickJob, 6, 7, maxWorkers=0)]
+    assert all(result[-1] for result in serialResults)
+
+    parallelResults = generateBatch(lickJob, 6, 7, maxWorkers=2, chunkSize=2)
+    assert [summarise(mu) + (mu.lick,) for mu in parallelResults] == \
+        serialResults
+
+
+def testMUsAreComplete():
+    for mu in generateBatch(job, 5, 1, maxWorkers=0):
+        assert len(mu.chords) == len(mu.harmonicRhythm) == len(mu.backbone)
+        assert mu.harmonicRhythm.getNumBars() == 2
+        assert mu.lick is None
+
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    errno = pytest.main(["-xs", __file__])
+    sys.exit(errno)
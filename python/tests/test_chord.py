@@ -1,4 +1,5 @@
-from musiclib.harmonypitch.chord import Chord
+import pytest
+from musiclib.harmonypitch.chord import Chord, ChordShape
 
 def testChord():
     c = Chord()
@@ -54,6 +55,52 @@ def testPitchesChordTonesAreReturnedCorrectly():
     expectedPitches = {31: '5th', 35: '7th', 36: 'fundamental', 40: '3rd', 43: '5th'}
     assert pitches == expectedPitches
 
+def testPitchClassMasks():
+    c = Chord("a+-+", tonic=1)
+    assert c.getPitchClassMask() == Chord.fromPitchClassSetToMask([11, 3, 6, 10])
+    assert Chord.fromMaskToPitchClassSet(c.getPitchClassMask()) == [3, 6, 10, 11]
+    assert Chord.countPitchClasses(c.getPitchClassMask()) == 4
+
+    # transposing the mask is the same as transposing the code
+    for semitones in (-13, -1, 0, 5, 12):
+        transposed = Chord.transposePitchClassMask(
+            Chord.fromCodeToPitchClassMask("b+-+"), semitones)
+        assert transposed == Chord.fromCodeToPitchClassMask(
+            "b+-+", tonic=semitones)
+
+    c.setCode("0+-")
+    assert c.getPitchClassMask() == Chord.fromCodeToPitchClassMask("1+-")
+
+def testChordsShareInternedShapes():
+    c1 = Chord("5-+", onset=0, duration=2, octave=4)
+    c2 = Chord("5-+", onset=2, duration=1, octave=4)
+    assert c1.shape is c2.shape
+    assert c1.scale is c2.scale
+    assert (c1.getOnset(), c1.getDuration()) == (0, 2)
+    assert (c2.getOnset(), c2.getDuration()) == (2, 1)
+    assert Chord("5-+").shape is not c1.shape
+
+    # changing the code of a chord doesn't change the other chords
+    c1.setCode("5-+-")
+    assert c1.getPitchSet() == [53, 56, 60, 63]
+    assert c1.calcPitchesTypes([62, 64]) == {63: "7th"}
+    assert c2.getPitchSet() == [53, 56, 60]
+    assert c1.shape is ChordShape.get("5-+-", 0, 4, "ionian")
+
+def testPitchRangesAreReadOnlyViews():
+    c = Chord("0+-+", octave=2)
+    pitches, noteTypeCodes = c.shape.getPitchRange(31, 44)
+    assert pitches.tolist() == [31, 35, 36, 40, 43]
+    assert noteTypeCodes.tolist() == [2, 3, 0, 1, 2]
+    with pytest.raises(ValueError):
+        pitches[0] = 30
+
+    pitchesTypes = c.calcPitchesTypes([31, 44])
+    assert pitchesTypes is Chord("0+-+", octave=2).calcPitchesTypes([31, 44])
+    assert list(pitchesTypes) == [31, 35, 36, 40, 43]
+    with pytest.raises(TypeError):
+        pitchesTypes[30] = "3rd"
+
 if __name__ == "__main__":
     import sys
     import pytest
@@ -1,9 +1,14 @@
 from musiclib.harmonypitch.chordprofile import ChordProfile
+from musiclib.harmonypitch.scale import Scale
 
 def testChordProfile():
     c = ChordProfile()
     assert c is not None
 
+def testChordProfilesShareTheInternedScale():
+    assert ChordProfile().getScale() is Scale.get("ionian")
+    assert ChordProfile().getScale() is ChordProfile().getScale()
+
 if __name__ == "__main__":
     import sys
     import pytest
@@ -0,0 +1,128 @@
+import random
+from musiclib.flatrhythmtree import FlatRhythmTree
+from musiclib.persistentrhythmtree import PersistentRhythmTree
+from musiclib.rhythmtreefactory import RhythmTreeFactory
+from musiclib.metre import Metre
+from musiclib.rhythmdata import rhythmData as rd
+
+m4 = Metre.createFromLabels("4/4", "quarternote", "halfnote")
+m3 = Metre.createFromLabels("3/4", "quarternote", "dottedhalfnote")
+rsf = RhythmTreeFactory()
+rs = rsf.createRhythmTree(4, m4)
+rsf.insertTuplet(rs.children[1].children[0], 3)
+frs = FlatRhythmTree.fromRhythmTree(rs)
+
+
+def testFlatRhythmTreeIsCreatedCorrectly():
+    assert str(frs) == str(rs)
+    assert frs.getRoot().getLowestDurationLevel() == 4
+    node = frs.getRoot().getChild(1).getChild(0)
+    assert node.getHasTupletChildren() == True
+    assert [c.getMetricalAccent() for c in node.children] == \
+           [c.getMetricalAccent() for c in rs.children[1].children[0].children]
+
+
+def testDurationCandidatesMatchRhythmTree():
+    paths = [(), (0,), (0, 0), (0, 1, 1), (1, 0, 2), (1, 1, 1, 1)]
+    for path in paths:
+        node = rs[path]
+        flatNode = frs.getRoot()
+        for index in path:
+            flatNode = flatNode.getChild(index)
+
+        for numDots in range(3):
+            expected = node.getDurationCandidates(numDots)
+            candidates = flatNode.getDurationCandidates(numDots)
+            if expected is None:
+                assert candidates is None
+                continue
+            assert [c.getDuration() for c in candidates] == \
+                   [c.getDuration() for c in expected]
+
+
+def getFlatNode(flatRhythmTree, path):
+    node = flatRhythmTree.getRoot()
+    for index in path:
+        node = node.getChild(index)
+    return node
+
+
+def testFlatRhythmTreeIsBuiltDirectly():
+    for metre, lowestDurationLevel in ((m4, 4), (m3, 3)):
+        expected = FlatRhythmTree.fromRhythmTree(
+            rsf.createRhythmTree(lowestDurationLevel, metre))
+        flatRhythmTree = rsf.createFlatRhythmTree(lowestDurationLevel, metre)
+        for name in FlatRhythmTree._arrayNames:
+            assert getattr(flatRhythmTree, name) == getattr(expected, name)
+        assert flatRhythmTree.lowestDurationLevel == lowestDurationLevel
+
+    # trees are copies of the template
+    assert rsf.createFlatRhythmTree(4, m4) is not \
+        rsf.createFlatRhythmTree(4, m4)
+
+
+def testFlatTupletsMatchRhythmTree():
+    for path, tupletType in (((1, 0), 3), ((0,), 5), ((1, 1), 3), ((), 7)):
+        expected = rsf.createRhythmTree(4, m4)
+        rsf.insertTuplet(expected[path], tupletType)
+
+        base = rsf.createFlatRhythmTree(4, m4)
+        flatRhythmTree = base.copy()
+        rsf.insertFlatTuplet(flatRhythmTree,
+                             getFlatNode(flatRhythmTree, path).index,
+                             tupletType)
+        assert str(flatRhythmTree) == str(expected)
+        assert flatRhythmTree.getSignature() == \
+            PersistentRhythmTree.fromRhythmTree(expected).getSignature()
+        assert [n.getMetricalAccent() for n in
+                getFlatNode(flatRhythmTree, path).children] == \
+               [n.getMetricalAccent() for n in expected[path].children]
+
+        # the tree that was copied is left untouched
+        assert str(base) == str(rsf.createRhythmTree(4, m4))
+
+
+def testFlatTupletsAreDecidedLikePersistentTuplets():
+    probTuplets = rd["melody"]["probTuplets"]["4/4"]
+    probTupletType = rd["melody"]["probTupletType"]["4/4"]
+    base = rsf.createFlatRhythmTree(4, m4)
+    persistentBase = PersistentRhythmTree.fromRhythmTree(
+        rsf.createRhythmTree(4, m4))
+
+    for seed in range(50):
+        flatRhythmTree = RhythmTreeFactory(
+            random=random.Random(seed)).addTupletsToFlatRhythmTree(
+            base.copy(), probTuplets, probTupletType)
+        persistentRhythmTree = RhythmTreeFactory(
+            random=random.Random(seed)).addTupletsToPersistentRhythmTree(
+            persistentBase, probTuplets, probTupletType)
+        assert flatRhythmTree.getSignature() == \
+            persistentRhythmTree.getSignature()
+
+
+def testFlatTupletConfigurationsMatchPersistentTrees():
+    probTuplets = rd["melody"]["probTuplets"]["3/4"]
+    probTupletType = rd["melody"]["probTupletType"]["3/4"]
+
+    def getProbabilities(configurations):
+        probabilities = {}
+        for prob, tree in configurations:
+            signature = tree.getSignature()
+            probabilities[signature] = probabilities.get(signature, 0) + prob
+        return probabilities
+
+    expected = getProbabilities(rsf.enumerateTupletConfigurations(
+        PersistentRhythmTree.fromRhythmTree(rsf.createRhythmTree(3, m3)),
+        probTuplets, probTupletType))
+    probabilities = getProbabilities(rsf.enumerateFlatTupletConfigurations(
+        rsf.createFlatRhythmTree(3, m3), probTuplets, probTupletType))
+    assert probabilities.keys() == expected.keys()
+    for signature, prob in expected.items():
+        assert abs(probabilities[signature] - prob) < 1e-12
+
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    errno = pytest.main(["-xs", __file__])
+    sys.exit(errno)
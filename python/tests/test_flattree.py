@@ -0,0 +1,74 @@
+from musiclib.tree import Tree
+from musiclib.flattree import FlatTree
+
+t = Tree(1, [Tree(2.1, [
+                    Tree(3.1, [
+                        Tree(4.1), Tree(4.2)]),
+                    Tree(3.2, [
+                        Tree(4.3), Tree(4.4)])]),
+             Tree(2.2, [
+                     Tree(3.3, [
+                         Tree(4.5), Tree(4.6)]),
+                     Tree(3.4, [
+                         Tree(4.7), Tree(4.8)])])])
+ft = FlatTree.fromTree(t)
+root = ft.getRoot()
+
+
+def testFlatTreeIsCreatedCorrectly():
+    assert len(ft) == 15
+    assert str(ft) == str(t)
+    assert root.children[1].children[0].value == 3.3
+    assert root.children[1].children[0].parent == root.children[1]
+
+
+def testChildIsAdded():
+    ft2 = FlatTree.fromTree(Tree(1))
+    ft2.getRoot().addChild(Tree(2, [Tree(3)]))
+    assert str(ft2) == str(Tree(1, [Tree(2, [Tree(3)])]))
+
+
+def testSiblings():
+    node = root.children[0].children[1]
+    assert node.getRightSibling() is None
+    assert node.getLeftSibling() == root.children[0].children[0]
+    assert root.children[0].getRightSibling() == root.children[1]
+    assert root.getRightSibling() is None
+
+
+def testIsLastChild():
+    assert root.children[1].isLastChild() == True
+    assert root.children[0].isLastChild() == False
+    assert root.isLastChild() == True
+
+
+def testIsFirstChild():
+    assert root.children[0].children[1].isFirstChild() == False
+    assert root.children[0].children[0].children[0].isFirstChild() == True
+    assert root.isFirstChild() is None
+
+
+def testGetFirstAncestorNotLastChild():
+    node = root.children[0].children[1].children[1]
+    assert node.getFirstAncestorNotLastChild() == root.children[0]
+    assert root.children[1].children[1].getFirstAncestorNotLastChild() is None
+
+
+def testgetDescendantAtIndex():
+    assert root.getDescendantAtIndex(2, 1, 0) == root.children[1].children[1]
+    assert root.getDescendantAtIndex(3, 0, 0).value == 4.1
+    assert root.getDescendantAtIndex(3, 2, 0) is None
+
+
+def testHasDescendantAndAncestor():
+    assert root.hasDescendant(3) == True
+    assert root.hasDescendant(4) == False
+    assert root.children[1].children[0].hasAncestor(2) == True
+    assert root.children[1].children[0].hasAncestor(3) == False
+
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    errno = pytest.main(["-x", __file__])
+    sys.exit(errno)
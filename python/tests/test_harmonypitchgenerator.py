@@ -1,4 +1,9 @@
-from musiclib.harmonypitch.harmonypitchgenerator import HarmonyPitchGenerator
+import random
+import numpy as np
+import pytest
+from musiclib.harmonypitch.harmonypitchgenerator import HarmonyPitchGenerator, \
+    triadConsonanceScores, commonChordTonesScores, VITERBI, SAMPLE
+from musiclib.probability import decodeViterbi
 from musiclib.rhythmtree import RhythmTree
 from musiclib.harmonypitch.chord import Chord
 
@@ -41,8 +46,149 @@ def testChordProgressionsAreGeneratedCorrectly():
                                              "musicunit")
     print([x.pitchSet for x in progression])
 
+def testScoresMatchTriadScores():
+    hpg = HarmonyPitchGenerator()
+    consonance = hpg._calcConsonanceMetric(0.3, 2)
+    commonTones = hpg._calcCommonChordTonesMetric("9-+")
+    profileScores = hpg.chordProfile.getScores()
+    prominence = hpg._calcProminenceMetric(-0.72, 2)
+    for i, triad in enumerate(hpg._candidateTriads):
+        triadType = triad.getTriadType()
+        assert consonance[i] == triadConsonanceScores[triadType] + \
+            hpg._calcMinMajRatioImpact(0.3, 2, triadType)
+        assert commonTones[i] == commonChordTonesScores[
+            Chord.calcNumCommonChordTones("9-+", triad.getCode())]
+
+        # the lowest harmonic complexity leaves the profile untouched
+        assert prominence[i] == profileScores[triad.getCode()]
+
+    scores = hpg._calcMetrics("9-+", 5, 2, 0, 0)
+    assert len(scores) == 48
+    assert scores[5] == 0
+
+
+def testScoreRowsAreCachedForTheLastFeatureValues():
+    hpg = HarmonyPitchGenerator()
+    consonanceRows = hpg._getConsonanceRows(0.3)
+    prominenceRows = hpg._getProminenceRows(0.5)
+    assert hpg._getConsonanceRows(0.3) is consonanceRows
+    assert hpg._getProminenceRows(0.5) is prominenceRows
+
+    profileScores = hpg._getProfileScores()
+    midValue = profileScores.max() / 2
+    for level in range(len(consonanceRows)):
+        for i, triad in enumerate(hpg._candidateTriads):
+            triadType = triad.getTriadType()
+            assert consonanceRows[level, i] == \
+                triadConsonanceScores[triadType] + \
+                hpg._calcMinMajRatioImpact(0.3, level, triadType)
+        attractionRate = hpg._calcHarmonicComplexityImpactOnProfile(0.5,
+                                                                    level)
+        assert np.array_equal(prominenceRows[level], profileScores -
+                              (profileScores - midValue) * attractionRate)
+
+    # the rows are recomputed for new feature values
+    assert not np.array_equal(hpg._getProminenceRows(0.9), prominenceRows)
+    assert not np.array_equal(hpg._getConsonanceRows(0.9), consonanceRows)
+
+
+def createHarmonicRhythm(numChords):
+    harmonicRhythm = []
+    for i in range(numChords):
+        rs = RhythmTree(1, 1)
+        rs.setMetricalAccent(i % 4)
+        harmonicRhythm.append(rs)
+    return harmonicRhythm
+
+
+def testLatticeProgressionsEndWithTheCadence():
+    hpg = HarmonyPitchGenerator(random.Random(3))
+    hpg.chordProfile.cadenceProb = {"section": 1}
+    cadences = hpg.chordProfile.getCadences()
+    for decoder in (VITERBI, SAMPLE):
+        chords = hpg.generateHarmonyPitchMU(createHarmonicRhythm(12), 0.2,
+                                            -0.1, "section", show=False,
+                                            decoder=decoder)
+        codes = [chord.getCode() for chord in chords]
+        assert len(codes) == 12
+        assert codes[-2:] in cadences
+
+        # chords aren't repeated before the cadence
+        triadCodes = [code[:3] for code in codes[:-2]]
+        assert all(previous != code for previous, code in
+                   zip(triadCodes, triadCodes[1:]))
+
+    with pytest.raises(ValueError):
+        hpg.generateHarmonyPitchMU(createHarmonicRhythm(4), 0, 0, "section",
+                                   show=False, decoder="beam")
+
+
+def testViterbiFindsTheBestProgression():
+    hpg = HarmonyPitchGenerator()
+    harmonicRhythm = createHarmonicRhythm(3)
+    initialWeights, transitionWeights = hpg._buildTriadLattice(
+        harmonicRhythm, [], 0.3, 0.2)
+    assert transitionWeights.shape == (2, 48, 48)
+
+    pathWeights = initialWeights[:, np.newaxis, np.newaxis] * \
+        transitionWeights[0][:, :, np.newaxis] * \
+        transitionWeights[1][np.newaxis, :, :]
+    bestPath = np.unravel_index(np.argmax(pathWeights), pathWeights.shape)
+    assert decodeViterbi(initialWeights, transitionWeights) == \
+        [int(index) for index in bestPath]
+
+
+def getAliasProbabilities(aliasProbs, aliases):
+    """Returns the probability of each outcome of an alias table"""
+    numOutcomes = len(aliasProbs)
+    probabilities = np.array(aliasProbs, dtype=float)
+    np.add.at(probabilities, aliases, 1 - probabilities)
+    return probabilities / numOutcomes
+
+
+def testDecisionTablesMatchScores():
+    hpg = HarmonyPitchGenerator(featureGridSize=5)
+    tables = hpg.getDecisionTables(0.3, -0.5)
+
+    # the features are quantized to the grid points 0.36 and -0.36
+    for previousCode, previousIndex in [(None, None), ("0+-", 0),
+                                        ("9-+", 37)]:
+        for level in range(4):
+            scores = hpg._calcMetrics(previousCode, previousIndex, level,
+                                      0.36, -0.36)
+            row = -1 if previousIndex is None else previousIndex
+            probabilities = getAliasProbabilities(
+                tables.aliasProbs[level, row], tables.aliases[level, row])
+            assert np.allclose(probabilities, scores / scores.sum())
+
+    assert hpg.getDecisionTables(0.35, -0.4) is tables
+
+
+def testDecisionTablesAreCachedAndPersisted(tmp_path):
+    hpg = HarmonyPitchGenerator(featureGridSize=3, tablesDir=str(tmp_path),
+                                tablesCacheSize=2)
+    hpg.precomputeDecisionTables()
+    assert len(list(tmp_path.iterdir())) == 9
+    assert len(hpg._decisionTables) == 2
+
+    tables = hpg.getDecisionTables(0, 0)
+    loadedTables = HarmonyPitchGenerator(
+        featureGridSize=3, tablesDir=str(tmp_path)).getDecisionTables(0, 0)
+    assert np.array_equal(tables.aliasProbs, loadedTables.aliasProbs)
+    assert np.array_equal(tables.aliases, loadedTables.aliases)
+
+
+def testProgressionsAreGeneratedWithDecisionTables():
+    hpg = HarmonyPitchGenerator(random.Random(2), featureGridSize=9)
+    chords = hpg.generateHarmonyPitchMU(createHarmonicRhythm(16), 0.2, -0.1,
+                                        "musicunit", show=False)
+    triadCodes = [chord.getCode()[:3] for chord in chords]
+    assert len(triadCodes) == 16
+    assert all(previous != code for previous, code in
+               zip(triadCodes, triadCodes[1:-2]))
+
+
 if __name__ == "__main__":
     import sys
-    import pytest
     errno = pytest.main(["-xs", __file__])
     sys.exit(errno)
\ No newline at end of file
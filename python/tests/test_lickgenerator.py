@@ -1,4 +1,4 @@
-from musiclib.licks.lickgenerator import LickGenerator
+from musiclib.licks.lickgenerator import LickGenerator, midiMapping
 from musiclib.harmonypitch.scale import Scale
 from music21 import stream, note, roman
 
@@ -82,6 +82,14 @@ def testRhythmIsGeneratedCorrectly():
     rhythm = l._generateRhythmLick()
     assert sum(rhythm) < 8
 
+
+def testLickIsGeneratedCorrectly():
+    s = Scale("aeolian")
+    lick = l.generateLick(s)
+    assert len(lick) > 0
+    assert sum(duration for duration, _ in lick) >= l.getLickLength()
+    assert all(pitch in midiMapping["minor"] for _, pitch in lick)
+
 def testPitchGeneration():
     s = Scale("ionian")
     rhythmSeq = l._generateRhythmLick()
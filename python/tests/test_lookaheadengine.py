@@ -0,0 +1,275 @@
+import asyncio
+import threading
+import pytest
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from musiclib.lookaheadengine import LookaheadEngine, BarPipeline
+from musiclib.melodyrhythmgenerator import MelodyRhythmGenerator
+from musiclib.harmonyrhythmgenerator import HarmonyRhythmGenerator
+from musiclib.harmonypitch.harmonypitchgenerator import HarmonyPitchGenerator
+from musiclib.melodypitch.melodybackbonegenerator import \
+    MelodyBackboneGenerator
+from musiclib.metre import Metre
+from musiclib.rhythmdata import rhythmData as rd
+
+m = Metre.createFromLabels("4/4", "quarternote", "halfnote")
+
+
+class SynchronousExecutor(Executor):
+    """Generates bars in the event loop thread, so that the order in which
+    bars are generated and played doesn't depend on thread scheduling"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+async def waitUntilBuffered(engine, numBars):
+    while engine.getNumBufferedBars() < numBars:
+        await asyncio.sleep(0)
+
+
+def testBarsAreBufferedAhead():
+    generatedBars = []
+
+    def generateBar(barIndex, features):
+        generatedBars.append(barIndex)
+        return (barIndex, features["density"])
+
+    async def run():
+        engine = LookaheadEngine(generateBar, 0.02, {"density": 0},
+                                 lookahead=3, executor=SynchronousExecutor())
+        engine.start()
+        await waitUntilBuffered(engine, 3)
+
+        # generation stops when the buffer is full, and the next bar is only
+        # started once there's room for it
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert engine.getNumBufferedBars() == 3
+        assert generatedBars == [0, 1, 2]
+        bars = [await engine.nextBar()]
+        await waitUntilBuffered(engine, 3)
+        assert generatedBars == [0, 1, 2, 3]
+
+        bars += [bar async for bar in engine.play(4)]
+        await engine.stop()
+        return bars, engine
+
+    bars, engine = asyncio.run(run())
+    assert bars == [(i, 0) for i in range(5)]
+    assert engine.deadlineMisses == []
+
+
+def testFeatureChangesDropBufferedBars():
+    def generateBar(barIndex, features):
+        return (barIndex, features["density"])
+
+    async def run():
+        # deadlines are far away, as nextBar returns as soon as bars are
+        # generated
+        engine = LookaheadEngine(generateBar, 60, {"density": 0},
+                                 lookahead=4, executor=SynchronousExecutor())
+        engine.start()
+        bars = [await engine.nextBar(), await engine.nextBar()]
+        await waitUntilBuffered(engine, 4)
+        engine.setFeatures(density=1)
+        assert engine.getNumBufferedBars() == 0
+        bars += [await engine.nextBar(), await engine.nextBar()]
+        await engine.stop()
+        return bars, engine
+
+    bars, engine = asyncio.run(run())
+    assert bars == [(0, 0), (1, 0), (2, 1), (3, 1)]
+    assert engine.deadlineMisses == []
+
+
+def testLookaheadIsTheMaxNumberOfBarsAhead():
+    generatedBars = []
+
+    def generateBar(barIndex, features):
+        generatedBars.append(barIndex)
+        return barIndex
+
+    async def run():
+        engine = LookaheadEngine(generateBar, 60, lookahead=1,
+                                 executor=SynchronousExecutor())
+        engine.start()
+        for barIndex in range(3):
+            await waitUntilBuffered(engine, 1)
+            for _ in range(10):
+                await asyncio.sleep(0)
+            assert generatedBars == list(range(barIndex + 1))
+            assert await engine.nextBar() == barIndex
+        await engine.stop()
+
+    asyncio.run(run())
+
+
+def testFeatureChangesDiscardTheBarBeingGenerated():
+    generatedBars = []
+    runningBars = []
+    staleBarStarted = threading.Event()
+    staleBarReleased = threading.Event()
+
+    def generateBar(barIndex, features):
+        runningBars.append(barIndex)
+        # the bar with the old features is being generated when they change
+        if barIndex == 1 and features["density"] == 0:
+            staleBarStarted.set()
+            staleBarReleased.wait(10)
+        generatedBars.append((barIndex, features["density"]))
+        numRunningBars = len(runningBars)
+        runningBars.remove(barIndex)
+        assert numRunningBars == 1
+        return (barIndex, features["density"])
+
+    async def run():
+        # the executor could run bars in parallel, so the engine has to wait
+        # for the discarded bar itself
+        executor = ThreadPoolExecutor(max_workers=2)
+        engine = LookaheadEngine(generateBar, 60, {"density": 0},
+                                 lookahead=2, executor=executor)
+        engine.start()
+        bars = [await engine.nextBar()]
+        staleBarStarted.wait(10)
+        engine.setFeatures(density=1)
+        assert engine.discardedBars == [1]
+
+        # the discarded bar can't be interrupted, and holds up the bars with
+        # the new features until it's finished
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        assert generatedBars == [(0, 0)]
+        staleBarReleased.set()
+        bars += [await engine.nextBar(), await engine.nextBar()]
+        await engine.stop()
+        executor.shutdown()
+        return bars
+
+    bars = asyncio.run(run())
+    assert bars == [(0, 0), (1, 1), (2, 1)]
+    assert generatedBars[:3] == [(0, 0), (1, 0), (1, 1)]
+
+
+def testSlowBarsAreReportedAsDeadlineMisses():
+    missedBars = []
+    slowBarReleased = threading.Event()
+
+    def generateBar(barIndex, features):
+        # the slow bar is only finished once it has missed its deadline
+        if barIndex == 1:
+            slowBarReleased.wait(10)
+        return barIndex
+
+    def onDeadlineMiss(barIndex):
+        missedBars.append(barIndex)
+        slowBarReleased.set()
+
+    async def run():
+        # bars after the slow one have a whole bar to be generated in
+        engine = LookaheadEngine(generateBar, 0.2, lookahead=2,
+                                 onDeadlineMiss=onDeadlineMiss)
+        engine.start()
+        bars = [bar async for bar in engine.play(5)]
+        await engine.stop()
+        return bars, engine
+
+    bars, engine = asyncio.run(run())
+    assert bars == [0, None, 2, 3, 4]
+    assert engine.deadlineMisses == [1]
+    assert missedBars == engine.deadlineMisses
+
+
+def testGenerationErrorsAreRaisedAtThePlayhead():
+    def generateBar(barIndex, features):
+        if barIndex == 2:
+            raise ValueError("bar %d" % barIndex)
+        return barIndex
+
+    async def run():
+        engine = LookaheadEngine(generateBar, 0.02, lookahead=4)
+        engine.start()
+        bars = []
+        with pytest.raises(ValueError, match="bar 2"):
+            async for bar in engine.play(6):
+                bars.append(bar)
+
+        # the engine stays failed, and stopping it doesn't raise
+        with pytest.raises(ValueError, match="bar 2"):
+            await engine.nextBar()
+        await engine.stop()
+        return bars, engine
+
+    bars, engine = asyncio.run(run())
+    assert bars == [0, 1]
+    assert engine.playhead == 2
+    assert engine.deadlineMisses == []
+
+
+def testPipelineGeneratesRhythm():
+    pipeline = BarPipeline(m, MelodyRhythmGenerator(m))
+
+    async def run():
+        engine = LookaheadEngine(pipeline, 60, {"density": 0.2,
+                                                "entropy": 0.2},
+                                 executor=SynchronousExecutor())
+        engine.start()
+        bars = [await engine.nextBar() for _ in range(3)]
+        await engine.stop()
+        return bars
+
+    for barIndex, bar in enumerate(asyncio.run(run())):
+        assert bar.barIndex == barIndex
+        assert bar.melodicRhythm.getTotalTicks() == m.getBarTicks()
+
+
+def testPipelineGeneratesWholeMUs():
+    harmonyPitchGenerator = HarmonyPitchGenerator()
+    pipeline = BarPipeline(m, MelodyRhythmGenerator(m),
+                           HarmonyRhythmGenerator.fromModelData(
+                               m, rd["harmony"]),
+                           harmonyPitchGenerator, MelodyBackboneGenerator(),
+                           numBarsMU=2)
+
+    # record the harmonic rhythms the progressions are generated for
+    progressionLengths = []
+    generateHarmonyPitchMU = harmonyPitchGenerator.generateHarmonyPitchMU
+
+    def recordProgression(harmonicRhythm, *args, **kwargs):
+        progressionLengths.append(len(harmonicRhythm))
+        return generateHarmonyPitchMU(harmonicRhythm, *args, **kwargs)
+
+    harmonyPitchGenerator.generateHarmonyPitchMU = recordProgression
+
+    features = {"density": 0.3, "entropy": 0.2, "harmonicDensity": 0.5,
+                "harmonicEntropy": 0.5, "harmonicComplexity": 0.5,
+                "minMajRatio": 0.5}
+    bars = [pipeline(barIndex, features) for barIndex in range(4)]
+    assert [bar.barIndex for bar in bars] == [0, 1, 2, 3]
+    assert [bar.barIndexMU for bar in bars] == [0, 1, 0, 1]
+    for bar in bars:
+        assert bar.melodicRhythm.getTotalTicks() == m.getBarTicks()
+        assert bar.harmonicRhythm.getTotalTicks() == m.getBarTicks()
+        assert len(bar.chords) == len(bar.harmonicRhythm)
+        assert len(bar.backbone) == len(bar.harmonicRhythm)
+        assert [note.getUnderlyingChord() for note in bar.backbone] == \
+               bar.chords
+
+    # chords are decided once for each MU
+    assert progressionLengths == [
+        len(bars[0].harmonicRhythm) + len(bars[1].harmonicRhythm),
+        len(bars[2].harmonicRhythm) + len(bars[3].harmonicRhythm)]
+
+    # feature changes and jumps start a new MU
+    assert pipeline(4, features).barIndexMU == 0
+    assert pipeline(5, dict(features, density=0.8)).barIndexMU == 0
+    assert pipeline(9, dict(features, density=0.8)).barIndexMU == 0
+    assert pipeline(10, dict(features, density=0.8)).barIndexMU == 1
+
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    errno = pytest.main(["-xs", __file__])
+    sys.exit(errno)
@@ -1,5 +1,11 @@
-from musiclib.melodypitch.melodybackbonegenerator import MelodyBackboneGenerator
-from musiclib.harmonypitch.chord import Chord
+import itertools
+import random
+import numpy as np
+import pytest
+from musiclib.melodypitch.melodybackbonegenerator import \
+    MelodyBackboneGenerator, VITERBI, SAMPLE
+from musiclib.probability import decodeViterbi, sampleForwardBackward
+from musiclib.harmonypitch.chord import Chord, noteTypes
 from musiclib.rhythmtree import RhythmTree
 from musiclib.melodypitch.note import Note
 
@@ -79,6 +85,14 @@ mbg._chordNoteScores = chordNoteScores
 mbg._scoreWeights = scoreWeights
 mbg._numBestOptions = numBestOptions
 mbg._modifiers = modifiers
+mbg._compileScoreTables()
+
+
+def selectPitchOptions(*args):
+    """Returns the pitch options as a dict of pitches and note types"""
+    pitches, noteTypeCodes = mbg._selectPitchOptions(*args)
+    return {pitch: noteTypes[code]
+            for pitch, code in zip(pitches.tolist(), noteTypeCodes.tolist())}
 
 
 def testTessituraIsChosenCorrectly():
@@ -95,27 +109,27 @@ def testSelectPitchOptionsSelectsTheRightPitches():
     c = Chord("0+-")
 
     # case for first note with no previous pitch and no contour
-    pitches = mbg._selectPitchOptions(c, None, None, "low")
+    pitches = selectPitchOptions(c, None, None, "low")
     expectedPitches = {55: '5th', 60: 'fundamental', 64: '3rd', 67: '5th'}
     assert pitches == expectedPitches
 
     # case with previous note and contour moving up
-    pitches = mbg._selectPitchOptions(c, 60, "up", "low")
+    pitches = selectPitchOptions(c, 60, "up", "low")
     expectedPitches = {60: 'fundamental', 64: '3rd', 67: '5th'}
     assert pitches == expectedPitches
 
     # case with previous note and contour moving down
-    pitches = mbg._selectPitchOptions(c, 64, "down", "low")
+    pitches = selectPitchOptions(c, 64, "down", "low")
     expectedPitches = {55: '5th', 60: 'fundamental', 64: '3rd'}
     assert pitches == expectedPitches
 
     # case where we're at the upper extreme
-    pitches = mbg._selectPitchOptions(c, 70, "down", "low")
+    pitches = selectPitchOptions(c, 70, "down", "low")
     expectedPitches = {55: '5th', 60: 'fundamental', 64: '3rd', 67: '5th'}
     assert pitches == expectedPitches
 
     # case where we're at the lower extreme
-    pitches = mbg._selectPitchOptions(c, 55, "down", "low")
+    pitches = selectPitchOptions(c, 55, "down", "low")
     expectedPitches = {55: '5th', 60: 'fundamental', 64: '3rd', 67: '5th'}
     assert pitches == expectedPitches
 
@@ -124,37 +138,51 @@ def testMelGravityScoresAreCalculatedCorrectly():
     pitchOptions = [55, 60, 64, 67]
     previousPitch = 62
     scores = mbg._calcMelodicGravityScores(pitchOptions, previousPitch, 0.6)
-    expectedScores = {55: 0.65, 60: 0.9, 64: 0.9, 67: 0.75}
-    assert scores == expectedScores
+    expectedScores = [0.65, 0.9, 0.9, 0.75]
+    assert scores.tolist() == expectedScores
 
 
 def testChordNoteScoresAreCalculatedCorrectly():
-    pitchOptions = {55: '5th', 60: 'fundamental', 64: '3rd', 67: '5th'}
+    noteTypeCodes = [noteTypes.index(type) for type in
+                     ["5th", "fundamental", "3rd", "5th"]]
     metricalAccent = 0
-    scores = mbg._calcChordNoteScores(pitchOptions, metricalAccent,
+    scores = mbg._calcChordNoteScores(noteTypeCodes, metricalAccent,
                                       melodicComplexity=0)
-    expectedScores = {55: 0.4, 60: 1, 64: 0.6, 67: 0.4}
-    assert scores == expectedScores
+    expectedScores = [0.4, 1, 0.6, 0.4]
+    assert scores.tolist() == expectedScores
 
 
 def testCombinationsOfScoresWorksProperly():
-    pitchOptions = {55: '5th', 60: 'fundamental', 64: '3rd', 67: '5th'}
+    pitches, noteTypeCodes = mbg._selectPitchOptions(Chord("0+-"), None,
+                                                     None, "low")
     metricalAccent = 0
     previousPitch = 62
-    expectedScores = {55: 1.05, 60: 1.9, 64: 1.5, 67: 1.15}
-    scores = mbg._calculateScores(pitchOptions, previousPitch,
+    expectedScores = [1.05, 1.9, 1.5, 1.15]
+    scores = mbg._calculateScores(pitches, noteTypeCodes, previousPitch,
                                   metricalAccent, pitchRange=0,
                                   melodicComplexity=0)
-    assert scores == expectedScores
+    assert np.allclose(scores, expectedScores)
 
 
 def testPitchIsChosenCorrectly():
-    scores = {55: 1.05, 60: 1.9, 64: 1.5, 67: 1.15}
+    pitches = np.array([55, 60, 64, 67])
+    scores = np.array([1.05, 1.9, 1.5, 1.15])
     expectedPitches = [60, 64]
-    pitch = mbg._decidePitch(scores)
+    pitch = mbg._decidePitch(pitches, scores)
     assert pitch in expectedPitches
 
 
+def testBestOptionsKeepTheFirstOfTiedScores():
+    scores = np.array([0.5, 0.9, 0.5, 0.7, 0.5])
+    bestIndexes = MelodyBackboneGenerator._selectBestOptions(scores, 3)
+    assert bestIndexes.tolist() == [0, 1, 3]
+
+    # the options are the same as when sorting the scores
+    order = sorted(range(len(scores)), key=lambda i: scores[i],
+                   reverse=True)[:3]
+    assert sorted(order) == bestIndexes.tolist()
+
+
 def testBackboneNotesAreGeneratedCorrectly():
     c1 = Chord("0+-")
     r1 = RhythmTree(1, 1)
@@ -187,8 +215,76 @@ def testBackboneNotesAreGeneratedCorrectly():
     s = mbg._realizeM21Sequence(notes)
 
 
+def createBackboneNotes():
+    notes = []
+    for code, metricalAccent in [("0+-", 0), ("5-+", 2), ("7+--", 1),
+                                 ("0-+", 0), ("9+-+-", 3)]:
+        r = RhythmTree(1, 1)
+        r.metricalAccent = metricalAccent
+        notes.append(Note(r, Chord(code), isBackboneNote=True))
+    return notes
+
+
+def testContourMaskFallsBackToAllPitches():
+    previousPitches = np.array([55, 60, 70])
+    pitches = np.array([55, 62, 67])
+    allowed = MelodyBackboneGenerator._getContourMask(previousPitches,
+                                                      pitches, "up", 55, 70)
+    assert allowed.tolist() == [[True, True, True],
+                                [False, True, True],
+                                [True, True, True]]
+
+    allowed = MelodyBackboneGenerator._getContourMask(previousPitches,
+                                                      pitches, "down", 55, 70)
+    assert allowed.tolist() == [[True, True, True],
+                                [True, False, False],
+                                [True, True, True]]
+
+
+def testLatticeDecodersPickChordNotes():
+    g = MelodyBackboneGenerator(random.Random(2))
+    for decoder in (VITERBI, SAMPLE):
+        notes = g.generateBackbonePitches(createBackboneNotes(),
+                                          pitchHeight=-0.5, pitchRange=0,
+                                          melodicComplexity=0, show=False,
+                                          decoder=decoder)
+        for note in notes:
+            pitch = note.getPitch()
+            assert 55 <= pitch <= 70
+            assert pitch % 12 in note.getUnderlyingChord().pitchClassSet
+
+    with pytest.raises(ValueError):
+        g.generateBackbonePitches(createBackboneNotes(), 0, 0, 0, show=False,
+                                  decoder="beam")
+
+
+def testViterbiFindsTheBestScoringBackbone():
+    g = MelodyBackboneGenerator()
+    notes = createBackboneNotes()
+    contour = ["up", "down", "down", "up"]
+    pitchOptions, initialWeights, transitionWeights = \
+        g._buildPitchLattice(notes, contour, "low", 0.2, -0.3)
+
+    def getWeight(path):
+        weight = initialWeights[path[0]]
+        for i, weights in enumerate(transitionWeights):
+            weight *= weights[path[i], path[i+1]]
+        return weight
+
+    bestPath = max(itertools.product(*[range(len(pitches))
+                                       for pitches in pitchOptions]),
+                   key=getWeight)
+    path = decodeViterbi(initialWeights, transitionWeights)
+    assert tuple(path) == bestPath
+
+    # the sampled backbones follow the contour, and are never better
+    r = random.Random(3)
+    for _ in range(20):
+        path = sampleForwardBackward(initialWeights, transitionWeights, r)
+        assert 0 < getWeight(path) <= getWeight(bestPath)
+
+
 if __name__ == "__main__":
     import sys
-    import pytest
     errno = pytest.main(["-xs", __file__])
     sys.exit(errno)
@@ -1,8 +1,15 @@
 from musiclib.melodyrhythmgenerator import MelodyRhythmGenerator
 from musiclib.metre import Metre, calculateDurationSubdivisions
 from musiclib.rhythmtreefactory import RhythmTreeFactory
+from musiclib.rhythmchain import RhythmChain
+from musiclib.probability import normaliseDistr
+from musiclib.rhythmstreamstate import RhythmStreamState
+from melodrive.stats.randommanager import RandomManager
+import itertools
+import random
+from concurrent.futures import ThreadPoolExecutor
 
-m = Metre("4/4", "quarternote")
+m = Metre.createFromLabels("4/4", "quarternote", "halfnote")
 r = MelodyRhythmGenerator(m)
 
 
@@ -21,6 +28,82 @@ def testCalcMetricsWork():
     for score in scores:
         assert 0 <= score <= 2
 
+def testCombinedScoresMatchMetrics():
+    candidates = r.rhythmSpace.children[1].children[0].getDurationCandidates(0)
+    r.densityImpact = 0.3
+    r.entropyImpact = 0.6
+
+    tactusLevel = m.getTactusLevel()
+    mp = r._calcMetricalProminenceMetric(candidates)
+    dt = r._calcDistFromTactusMetric(candidates, tactusLevel)
+    scores = [x + y for x, y in zip(mp, dt)]
+    scores = r._modifyScoresForDensity(candidates, scores, 2)
+    expectedScores = r._modifyScoresForEntropy(scores, 2)
+
+    assert r._calcScores(candidates, m) == expectedScores
+
+def testScoresDistrsAreCached():
+    candidates = r.rhythmSpace.children[0].getDurationCandidates(0)
+    r.setDensityImpact(0)
+    r.setEntropyImpact(0)
+
+    distr = r._getScoresDistr(candidates, m)
+    assert distr == normaliseDistr(r._calcScores(candidates, m))
+    assert r._getScoresDistr(candidates, m) is distr
+
+    # candidates with the same levels and accents share the distribution
+    otherCandidates = r.rhythmSpace.clone().children[0].getDurationCandidates(0)
+    assert otherCandidates[0] is not candidates[0]
+    assert r._getScoresDistr(otherCandidates, m) is distr
+
+
+def testFeatureChangesOnlyInvalidateAffectedDistrs():
+    candidates = r.rhythmSpace.children[0].getDurationCandidates(0)
+    r.setDensityImpact(0)
+    r.setEntropyImpact(0)
+    distr = r._getScoresDistr(candidates, m)
+    numBaseScores = len(r._baseScoresCache)
+
+    # setting the same value keeps the distribution
+    r.setDensityImpact(0)
+    assert r._getScoresDistr(candidates, m) is distr
+
+    r.setDensityImpact(0.5)
+    assert len(r._scoresDistrCache) == 0
+    assert len(r._baseScoresCache) == numBaseScores
+    newDistr = r._getScoresDistr(candidates, m)
+    assert newDistr != distr
+    assert newDistr == normaliseDistr(r._calcScores(candidates, m))
+
+
+def testScoresCacheIsBounded():
+    generator = MelodyRhythmGenerator(m)
+    generator._scoresCacheSize = 2
+    generator.densityImpact = 0
+    generator.entropyImpact = 0
+    candidates = generator.rhythmSpace.getDurationCandidates(0)
+    for i in range(5):
+        generator.densityImpact = i / 10.0
+        generator._getScoresDistr(candidates, m)
+    assert len(generator._scoresDistrCache) == 2
+    assert [key[2] for key in generator._scoresDistrCache] == [0.3, 0.4]
+
+
+def testRhythmChainsAreCompiledFromCachedDistrs():
+    generator = MelodyRhythmGenerator(m)
+    generator.densityImpact = 0.2
+    generator.entropyImpact = 0.3
+    RhythmChain.fromRhythmGenerator(generator, m, generator.rhythmSpace)
+    assert len(generator._scoresDistrCache) > 0
+    assert all(key[2:] == (0.2, 0.3) for key in generator._scoresDistrCache)
+
+    # the distribution of the first duration is shared with the chain
+    candidates = generator.rhythmSpace.getDurationCandidates(0)
+    numDistrs = len(generator._scoresDistrCache)
+    generator._getScoresDistr(candidates, m)
+    assert len(generator._scoresDistrCache) == numDistrs
+
+
 def testTreeIndexing():
     rhythmNode = r.rhythmSpace[(1,0,1)]
     print(rhythmNode)
@@ -79,12 +162,122 @@ def testDurationGeneratedBar():
         assert round(barDuration, 5) == expectedBarDuration
 
 
+def testRhythmSpaceDepthFollowsTimeSignature():
+    m34 = Metre.createFromLabels("3/4", "quarternote", "dottedhalfnote")
+    for metre, lowestDurationLevel in ((m, 4), (m34, 3)):
+        generator = MelodyRhythmGenerator(metre, random=random.Random(4))
+        generator.setDensityImpact(0.7)
+        generator.setEntropyImpact(0.7)
+        baseRhythmSpace = generator._baseRhythmSpace
+        assert baseRhythmSpace.getLowestDurationLevel() == lowestDurationLevel
+
+        # the score tables cover all the duration levels of the tree
+        assert len(generator._metricalProminenceScores) == \
+            lowestDurationLevel + 1
+        assert len(generator._densityImpactDurationLevels) == \
+            lowestDurationLevel + 1
+
+        bars = generator.generateMelodicRhythmBars(metre, 200)
+        durationLevels = [bar.getDurationLevels().max() for bar in bars]
+        assert max(durationLevels) == lowestDurationLevel
+
+
+def testFlatRhythmSpaceGeneratesTheSameBars():
+    generator = MelodyRhythmGenerator(m, random=random.Random(7))
+    flatGenerator = MelodyRhythmGenerator(m, random=random.Random(7),
+                                          flatRhythmSpace=True)
+    for g in (generator, flatGenerator):
+        g.setDensityImpact(0.6)
+        g.setEntropyImpact(0.4)
+
+    for _ in range(20):
+        assert flatGenerator.generateMelodicRhythmMU(m, 2).toList() == \
+            generator.generateMelodicRhythmMU(m, 2).toList()
+
+
+def testDurationGeneratedAdditionalBars():
+    r.densityImpact = 0
+    r.entropyImpact = 0
+    durations = [r.rhythmSpace.getDescendantAtIndex(level, 0).getDuration()
+                 for level in range(1, 5)]
+
+    for i in range(100):
+        for type in ("pickup", "prolongation"):
+            rs = r._generateAdditionalBar(m, type)
+            assert round(sum(j for j, _ in rs), 5) in durations
+
+
 def testDurationGeneratedMU():
     r.densityImpact = 0
     r.entropyImpact = 0
 
+    barTicks = m.getBarTicks()
     for i in range(100):
         rs = r.generateMelodicRhythmMU(m, 2)
+        bars = rs.getBars()
+        assert 2 <= len(bars) <= 4
+        assert all(bar.getTotalTicks() <= barTicks for bar in bars)
+        assert rs.getTotalTicks() == sum(bar.getTotalTicks() for bar in bars)
+        assert rs.toList() == [bar.toList()[0] for bar in bars]
+
+
+
+def testEventStreamMatchesBars():
+    r.densityImpact = 0.3
+    r.entropyImpact = 0.3
+
+    RandomManager.getActive().seed(4)
+    expectedBars = [r._generateMelodicRhythmBar(m) for _ in range(5)]
+
+    RandomManager.getActive().seed(4)
+    state = RhythmStreamState(m.getBarTicks())
+    bars = [[] for _ in range(5)]
+    for event in r.generateMelodicRhythmEvents(m, state):
+        if state.barIndex == 5:
+            break
+        bars[state.barIndex].append([event.getDuration(), event.getTie()])
+    assert [[[round(d, 10), t] for d, t in bar] for bar in bars] == \
+           [[[round(d, 10), t] for d, t in bar] for bar in expectedBars]
+
+
+def testEventStreamIsResumable():
+    r.densityImpact = 0.3
+    r.entropyImpact = 0.3
+    state = RhythmStreamState(m.getBarTicks())
+
+    events = list(itertools.islice(r.generateMelodicRhythmEvents(m, state),
+                                   30))
+    ticks = sum(event.getDurationTicks() for event in events)
+    assert ticks == state.barIndex * m.getBarTicks() + state.timeTicks
+
+    # the new stream starts where the other one stopped, with new features
+    r.densityImpact = 0.1
+    event = next(r.generateMelodicRhythmEvents(m, state))
+    assert event.getOnsetTicks() == ticks % m.getBarTicks()
+    assert state.treeKey in [key[0] for key in r._rhythmChainCache
+                             if key[2] == 0.1]
+
+
+def testBarStreamIsLazy():
+    r.densityImpact = 0.3
+    r.entropyImpact = 0.3
+    bars = r.generateMelodicRhythmBars(m)
+    for _ in range(10):
+        assert next(bars).getTotalTicks() == m.getBarTicks()
+
+
+
+def testGeneratorsWithOwnRandomRunInThreads():
+    def generateMUs(seed):
+        generator = MelodyRhythmGenerator(m, random.Random(seed))
+        generator.setDensityImpact(0.4)
+        generator.setEntropyImpact(0.4)
+        return [generator.generateMelodicRhythmMU(m, 2).toList()
+                for _ in range(50)]
+
+    expected = [generateMUs(seed) for seed in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(generateMUs, range(4))) == expected
 
 
 if __name__ == "__main__":
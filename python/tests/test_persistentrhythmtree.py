@@ -0,0 +1,91 @@
+from musiclib.persistentrhythmtree import PersistentRhythmTree
+from musiclib.rhythmtreefactory import RhythmTreeFactory
+from musiclib.metre import Metre
+
+m4 = Metre.createFromLabels("4/4", "quarternote", "halfnote")
+rsf = RhythmTreeFactory()
+rs = rsf.createRhythmTree(3, m4)
+prs = PersistentRhythmTree.fromRhythmTree(rs)
+
+
+def testPersistentRhythmTreeIsConvertedCorrectly():
+    assert str(prs) == str(rs)
+    assert str(prs.toRhythmTree()) == str(rs)
+    assert prs.getNode((1, 0)).getMetricalAccent() == \
+           rs.children[1].children[0].getMetricalAccent()
+
+
+def testTupletInsertionCopiesOnlyThePath():
+    newPrs = rsf.insertPersistentTuplet(prs, (0, 1), 3)
+
+    # original version is untouched
+    assert str(prs) == str(rs)
+    assert len(newPrs.getNode((0, 1)).children) == 3
+
+    # nodes outside of the path are shared
+    assert newPrs is not prs
+    assert newPrs.children[0] is not prs.children[0]
+    assert newPrs.children[1] is prs.children[1]
+    assert newPrs.getNode((0, 0)) is prs.getNode((0, 0))
+
+    expectedRs = rsf.createRhythmTree(3, m4)
+    rsf.insertTuplet(expectedRs.children[0].children[1], 3)
+    assert str(newPrs) == str(expectedRs)
+
+
+def testCursorNavigation():
+    cursor = prs.getCursor((0, 1))
+
+    assert cursor.isLastChild() == True
+    assert cursor.isFirstChild() == False
+    assert cursor.getRightSibling() is None
+    assert cursor.getLeftSibling() == prs.getCursor((0, 0))
+    assert cursor.getParent() == prs.getCursor((0,))
+    assert cursor.getFirstAncestorNotLastChild() == prs.getCursor((0,))
+    assert prs.getCursor().isFirstChild() is None
+
+
+def testCursorDurationCandidatesMatchRhythmTree():
+    paths = [(), (0,), (0, 0), (0, 1, 1), (1, 1, 1)]
+    for path in paths:
+        node = rs[path]
+        cursor = prs.getCursor(path)
+        for numDots in range(3):
+            expected = node.getDurationCandidates(numDots)
+            candidates = cursor.getDurationCandidates(numDots)
+            if expected is None:
+                assert candidates is None
+                continue
+            assert [c.getDuration() for c in candidates] == \
+                   [c.getDuration() for c in expected]
+            assert [c.getMetricalAccent() for c in candidates] == \
+                   [c.getMetricalAccent() for c in expected]
+
+
+def testCursorDurationCandidatesAreIndexedPerRoot():
+    cursor = prs.getCursor((0, 1, 1))
+    candidates = cursor.getDurationCandidates(0)
+    assert candidates == cursor._findDurationCandidates(0)
+    assert prs.getCursor((0, 1, 1)).getDurationCandidates(0) is candidates
+
+    # versions with the same structure share the index, but their cursors
+    # point into their own root
+    otherPrs = PersistentRhythmTree.fromRhythmTree(rs)
+    assert otherPrs._getCandidatePaths() is prs._getCandidatePaths()
+    otherCandidates = otherPrs.getCursor((0, 1, 1)).getDurationCandidates(0)
+    assert [c.path for c in otherCandidates] == [c.path for c in candidates]
+    assert all(c.getNode() is otherPrs.getNode(c.path)
+               for c in otherCandidates)
+
+    # a tuplet changes the structure, and so the index
+    newPrs = rsf.insertPersistentTuplet(prs, (0, 1), 3)
+    newCursor = newPrs.getCursor((0, 1, 0))
+    assert newCursor.getDurationCandidates(0) == \
+        newCursor._findDurationCandidates(0)
+
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    errno = pytest.main(["-xs", __file__])
+    sys.exit(errno)
@@ -1,4 +1,8 @@
+import random
+import numpy as np
+import pytest
 from musiclib import probability as p
+from melodrive.stats.randommanager import RandomManager
 
 l = [1, 1, 1, 1]
 
@@ -20,6 +24,133 @@ def testDecideCumulativeDistrOutcome():
         assert 200 < value < 300
 
 
+def testCumulativeDistrOutcomeEdgeCases():
+    assert p.getCumulativeDistrOutcome(0.1, [0.2, 0.5]) == 0
+    assert p.getCumulativeDistrOutcomeDict(0.1, {"a": 0.2, "b": 0.5}) == "a"
+
+
+def testDistributionCumulativeOutcomesMatchCumulativeDistr():
+    weights = [3, 0, 1, 6]
+    d = p.Distribution(weights)
+    distr = p.toNormalisedCumulativeDistr(weights)
+    for i in range(100):
+        r = i / 100.0
+        assert d.getCumulativeOutcome(r) == \
+               p.getCumulativeDistrOutcome(r, distr)
+
+
+def testDistributionFromDict():
+    d = p.Distribution({"a": 1, "b": 0, "c": 3})
+    assert d.outcomes == ["a", "b", "c"]
+    assert d.probabilities == [0.25, 0, 0.75]
+    for i in range(100):
+        assert d.getAliasOutcome(i / 100.0) != "b"
+
+
+def testDistributionAliasSampling():
+    d = p.Distribution(l)
+    outcomes = [0, 0, 0, 0]
+    for i in range(1000):
+        r = d.sample()
+        outcomes[r] += 1
+
+    for value in outcomes:
+        assert 200 < value < 300
+
+
+def testBatchOutcomesMatchScalarOutcomes():
+    weights = [3, 0, 1, 6]
+    d = p.Distribution(weights)
+    r = p.uniformSamplingBatch(1000)
+    cumulativeOutcomes = p.getCumulativeDistrOutcomeBatch(r, d.cumulative)
+    aliasOutcomes = d.getAliasOutcomeBatch(r)
+    for i in range(len(r)):
+        assert cumulativeOutcomes[i] == d.getCumulativeOutcome(r[i])
+        assert aliasOutcomes[i] == d.getAliasOutcome(r[i])
+
+
+def testBatchSamplingIsReproducible():
+    d = p.Distribution({"a": 1, "b": 0, "c": 3})
+    outcomes = d.sampleBatch(100, np.random.default_rng(7))
+    assert list(outcomes) == list(d.sampleBatch(100,
+                                                np.random.default_rng(7)))
+    assert "b" not in outcomes
+
+    generator = np.random.default_rng(7)
+    outcomes = p.decideCumulativeDistrOutcomeBatch(d.cumulative, 100,
+                                                   generator)
+    expected = d.getCumulativeOutcomeBatch(np.random.default_rng(7).random(100))
+    assert [d.outcomes[i] for i in outcomes] == list(expected)
+
+
+def testGaussSamplingBatch():
+    samples = p.gaussSamplingBatch(-1, 1, 0, 2, 1000)
+    assert samples.shape == (1000,)
+    assert samples.min() == -1
+    assert samples.max() == 1
+
+
+
+def testInjectedRandomContext():
+    d = p.Distribution(l, random.Random(5))
+    expected = random.Random(5)
+
+    RandomManager.getActive().seed(3)
+    outcomes = [d.sample() for _ in range(20)]
+    assert outcomes == [d.getAliasOutcome(expected.random())
+                        for _ in range(20)]
+    assert p.decideCumulativeDistrOutcome(d.cumulative, d.random) == \
+        d.getCumulativeOutcome(expected.random())
+
+    # the active random manager is left untouched
+    r = RandomManager.getActive().random()
+    RandomManager.getActive().seed(3)
+    assert r == RandomManager.getActive().random()
+
+
+initialWeights = np.array([1.0, 2.0])
+transitionWeights = [np.array([[1.0, 0.0, 3.0], [1.0, 2.0, 0.0]]),
+                     np.array([[2.0], [1.0], [1.0]])]
+
+
+def getPathWeights():
+    """Returns the weight of every path of the test lattice"""
+    weights = {}
+    for i in range(2):
+        for j in range(3):
+            weights[(i, j, 0)] = initialWeights[i] * \
+                transitionWeights[0][i, j] * transitionWeights[1][j, 0]
+    return weights
+
+
+def testViterbiFindsTheBestPath():
+    pathWeights = getPathWeights()
+    bestPath = max(pathWeights, key=pathWeights.get)
+    assert tuple(p.decodeViterbi(initialWeights, transitionWeights)) == \
+        bestPath
+    assert p.decodeViterbi(initialWeights, []) == [1]
+
+    with pytest.raises(ValueError):
+        p.decodeViterbi(initialWeights, [np.zeros((2, 2))])
+
+
+def testForwardBackwardSamplesPathsByWeight():
+    pathWeights = getPathWeights()
+    total = sum(pathWeights.values())
+    counts = dict.fromkeys(pathWeights, 0)
+    r = random.Random(4)
+    numSamples = 4000
+    for _ in range(numSamples):
+        path = p.sampleForwardBackward(initialWeights, transitionWeights, r)
+        counts[tuple(path)] += 1
+
+    for path, weight in pathWeights.items():
+        assert abs(counts[path] / numSamples - weight / total) < 0.03
+
+    with pytest.raises(ValueError):
+        p.sampleForwardBackward(initialWeights, [np.zeros((2, 2))], r)
+
+
 if __name__ == "__main__":
     import sys
     import pytest
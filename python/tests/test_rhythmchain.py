@@ -0,0 +1,379 @@
+import random
+import numpy as np
+from musiclib.flatrhythmtree import FlatRhythmTree
+from musiclib.harmonyrhythmgenerator import HarmonyRhythmGenerator
+from musiclib.melodyrhythmgenerator import MelodyRhythmGenerator
+from musiclib.metre import Metre
+from musiclib.probability import normaliseDistr, \
+    toNormalisedCumulativeDistr, decideCumulativeDistrOutcome
+from musiclib.rhythmchain import RhythmChain
+from musiclib.rhythmdata import rhythmData as rd
+from musiclib.ticks import durationToTicks
+
+m = Metre.createFromLabels("4/4", "quarternote", "halfnote")
+r = MelodyRhythmGenerator(m)
+r.densityImpact = 0.2
+r.entropyImpact = 0.3
+# chain of the rhythm space without tuplets
+chain = RhythmChain.fromRhythmGenerator(r, m, r.rhythmSpace)
+
+
+def testTransitionProbabilitiesSumToOne():
+    assert round(chain.fillProbability, 10) == 1
+    for state, transitions in enumerate(chain.transitions):
+        if chain.isTerminal[state]:
+            assert transitions is None
+            continue
+        assert round(sum(prob for _, _, prob in transitions), 10) == 1
+
+
+def testTimesAreTicks():
+    barTicks = m.getBarTicks()
+    assert chain.ticksPerQuarter == m.getTicksPerQuarter()
+    for state, time in enumerate(chain.times):
+        assert isinstance(time, int)
+        assert chain.isTerminal[state] == (time == barTicks)
+
+
+def testFirstDurationFollowsScores():
+    candidates = r.rhythmSpace.getDurationCandidates(0)
+    expectedProbs = normaliseDistr(r._calcScores(candidates, m))
+
+    probs = [0] * len(candidates)
+    for nextState, _, prob in chain.transitions[chain.initialState]:
+        node, _ = chain.states[nextState]
+        probs[candidates.index(node)] += prob
+
+    for prob, expectedProb in zip(probs, expectedProbs):
+        assert round(prob, 10) == round(expectedProb, 10)
+
+
+def testSampledBarsFillTheBar():
+    for _ in range(100):
+        rs = chain.sampleBar()
+        assert round(sum(d for d, _ in rs), 5) == 4.0
+
+    for rs in chain.sampleBars(1000):
+        assert round(sum(d for d, _ in rs), 5) == 4.0
+
+
+def testSampleBarsIsReproducible():
+    bars = chain.sampleBars(50, np.random.default_rng(3))
+    assert bars == chain.sampleBars(50, np.random.default_rng(3))
+
+
+def testSampledSequencesMatchSampledBars():
+    sequence = chain.sampleBarSequences(200, np.random.default_rng(5))
+    assert sequence.toList() == chain.sampleBars(200,
+                                                 np.random.default_rng(5))
+    assert sequence.getNumBars() == 200
+    assert sequence.getTotalTicks() == 200 * m.getBarTicks()
+
+    for bar in sequence.getBars():
+        onsets = bar.getOnsetTicks()
+        assert (onsets[1:] == onsets[:-1] + bar.getDurationTicks()[:-1]).all()
+
+    flatRhythmSpace = FlatRhythmTree.fromRhythmTree(r.rhythmSpace)
+    for element in sequence.getBar(0):
+        node = flatRhythmSpace.getNode(element.getNodeId())
+        assert element.getDurationLevel() == node.getDurationLevel()
+        assert element.getMetricalAccent() == node.getMetricalAccent()
+
+
+def testBarProbabilitiesAreExact():
+    barProbabilities = chain.calcBarProbabilities()
+    assert round(sum(barProbabilities.values()), 10) == 1
+
+    for rhythm in barProbabilities:
+        assert round(sum(d for d, _ in rhythm), 5) == 4.0
+
+    # the whole bar is only generated when the root is chosen first
+    candidates = r.rhythmSpace.getDurationCandidates(0)
+    probRoot = normaliseDistr(r._calcScores(candidates, m))[0]
+    probWholeBar = barProbabilities[((4.0, None),)] + \
+                   barProbabilities[((4.0, 't'),)]
+    assert round(probWholeBar, 10) == round(probRoot, 10)
+
+
+def testHistogramsMatchBarProbabilities():
+    barProbabilities = chain.calcBarProbabilities()
+    expectedNumNotes = sum(prob * len(rhythm)
+                           for rhythm, prob in barProbabilities.items())
+    assert round(chain.calcExpectedNumNotes(), 10) == \
+           round(expectedNumNotes, 10)
+
+    expectedTies = sum(prob * sum(1 for _, tie in rhythm if tie == 't')
+                       for rhythm, prob in barProbabilities.items())
+    assert round(chain.calcTieHistogram()["t"], 10) == round(expectedTies, 10)
+
+    durationHistogram = chain.calcDurationHistogram()
+    expectedQuarterNotes = sum(prob * sum(1 for d, _ in rhythm if d == 1.0)
+                               for rhythm, prob in barProbabilities.items())
+    assert round(durationHistogram[1.0], 10) == \
+           round(expectedQuarterNotes, 10)
+
+    dotHistogram = chain.calcDotHistogram()
+    assert round(sum(dotHistogram.values()), 10) == \
+           round(expectedNumNotes, 10)
+
+
+
+def testChainIsConditionedOnFillingTheBar():
+    generator = MelodyRhythmGenerator(m)
+    generator.densityImpact = 0.2
+    generator.entropyImpact = 0.3
+
+    # dots below the lowest level of the tree lead to dead ends
+    generator._lowestDurationLevel = 6
+    generator._probabilityDot = [0.9] * 5
+    generator._probabilitySingleDot = [0.5] * 5
+    deadEndChain = RhythmChain.fromRhythmGenerator(generator, m,
+                                                   generator.rhythmSpace)
+    assert 0 < deadEndChain.fillProbability < 1
+
+    stateProbabilities = deadEndChain.calcStateProbabilities()
+    for state, transitions in enumerate(deadEndChain.transitions):
+        if transitions == []:
+            assert stateProbabilities[state] == 0
+        elif transitions is not None and stateProbabilities[state] > 0:
+            assert round(sum(prob for _, _, prob in transitions), 10) == 1
+
+    barProbabilities = deadEndChain.calcBarProbabilities()
+    assert round(sum(barProbabilities.values()), 10) == 1
+    for rs in deadEndChain.sampleBars(1000):
+        assert round(sum(d for d, _ in rs), 5) == 4.0
+
+
+def _hasTuplet(rhythmicSeq):
+    return any(round(d * 8, 5) % 1 for d, _ in rhythmicSeq)
+
+
+def generateRhythmicUnit(generator, currentRS, numDots, metre, canDot):
+    """Reference for the chains: chooses the next duration traversing the
+    rhythm tree node by node, like the generators did before they were
+    compiled. Returns None if there are no candidates."""
+    candidates = currentRS.getDurationCandidates(numDots)
+    if candidates is None:
+        return None
+
+    distr = toNormalisedCumulativeDistr(generator._calcScores(candidates,
+                                                              metre))
+    currentRS = candidates[decideCumulativeDistrOutcome(distr,
+                                                        generator.random)]
+    rhythmicSeqElement = [currentRS.getDuration(), None]
+    durationLevel = currentRS.getDurationLevel()
+    numDots = 0
+
+    if currentRS.isLastChild():
+        rhythmicSeqElement = generator._decideToApplyTie(rhythmicSeqElement,
+                                                         durationLevel)
+    elif canDot(currentRS):
+        maxDepth = generator._lowestDurationLevel - durationLevel
+        rhythmicSeqElement, numDots = generator._decideToApplyDot(currentRS,
+                                                                  maxDepth)
+    return currentRS, rhythmicSeqElement, numDots
+
+
+def generateBarByRejection(generator, metre, createTree, canDot):
+    """Generates bars with generateRhythmicUnit until one fills the bar
+    exactly. Bars which overshoot it or get stuck are rejected, so the bars
+    follow the distribution of the traversal conditioned on filling the
+    bar."""
+    barTicks = metre.getBarTicks()
+    ticksPerQuarter = metre.getTicksPerQuarter()
+    while True:
+        currentRS = createTree()
+        numDots = 0
+        totTicks = 0
+        rhythmicSeq = []
+        while totTicks < barTicks:
+            unit = generateRhythmicUnit(generator, currentRS, numDots, metre,
+                                        canDot)
+            if unit is None:
+                break
+            currentRS, rhythmicSeqElement, numDots = unit
+            rhythmicSeq.append((round(rhythmicSeqElement[0], 5),
+                                rhythmicSeqElement[1]))
+            totTicks += durationToTicks(rhythmicSeqElement[0],
+                                        ticksPerQuarter)
+        if totTicks == barTicks:
+            return tuple(rhythmicSeq)
+
+
+def generateMelodicBarByRejection(generator, metre):
+    """Reference bar of a MelodyRhythmGenerator, from a linked rhythm tree
+    with tuplets inserted node by node"""
+    def createTree():
+        rhythmTree = generator.rsf.createRhythmTree(
+            generator._lowestDurationLevel, metre)
+        return generator.rsf.addTupletsToRhythmTree(
+            rhythmTree, generator._probTuplets, generator._probTupletType)
+
+    # dots only apply to first children not followed by tuplets
+    def canDot(currentRS):
+        return currentRS.isFirstChild() and \
+            not currentRS.getRightSibling().hasTupletAncestors()
+
+    return generateBarByRejection(generator, metre, createTree, canDot)
+
+
+def generateHarmonicBarByRejection(generator, metre):
+    """Reference bar of a HarmonyRhythmGenerator"""
+    return generateBarByRejection(generator, metre,
+                                  lambda: generator.rhythmTree,
+                                  lambda currentRS: True)
+
+
+def roundBarProbabilities(barProbabilities):
+    rounded = {}
+    for rhythm, prob in barProbabilities.items():
+        rhythm = tuple((round(d, 5), tie) for d, tie in rhythm)
+        rounded[rhythm] = rounded.get(rhythm, 0) + prob
+    return rounded
+
+
+def assertMatchesReference(barProbabilities, referenceBars):
+    """Checks exact bar probabilities against the frequencies of bars
+    sampled by rejection"""
+    barProbabilities = roundBarProbabilities(barProbabilities)
+    numBars = len(referenceBars)
+    counts = {}
+    for rhythm in referenceBars:
+        # every reference bar, tuplets included, has a probability
+        assert rhythm in barProbabilities
+        counts[rhythm] = counts.get(rhythm, 0) + 1
+
+    mostProbable = sorted(barProbabilities, key=barProbabilities.get,
+                          reverse=True)[:10]
+    for rhythm in mostProbable:
+        prob = barProbabilities[rhythm]
+        error = (prob * (1 - prob) / numBars) ** 0.5
+        assert abs(counts.get(rhythm, 0) / float(numBars) - prob) < \
+               5 * error
+
+
+def testCompiledChainCoversTuplets():
+    m34 = Metre.createFromLabels("3/4", "quarternote", "dottedhalfnote")
+    generator = MelodyRhythmGenerator(m34, random=random.Random(1))
+    generator.densityImpact = 0.2
+    generator.entropyImpact = 0.3
+    mixture = generator.compileRhythmChain(m34)
+    assert len(mixture) > 1
+    assert round(sum(mixture.probabilities), 10) == 1
+
+    # the compiled chain generates bars like the node by node traversal
+    numBars = 10000
+    sampledBars = mixture.sampleBars(numBars, np.random.default_rng(1))
+    referenceBars = [generateMelodicBarByRejection(generator, m34)
+                     for _ in range(numBars)]
+    for rs in sampledBars:
+        assert round(sum(d for d, _ in rs), 5) == 3.0
+
+    sampledNumNotes = np.mean([len(rs) for rs in sampledBars])
+    referenceNumNotes = np.mean([len(rs) for rs in referenceBars])
+    assert abs(sampledNumNotes - referenceNumNotes) < 0.15
+
+    sampledTuplets = np.mean([_hasTuplet(rs) for rs in sampledBars])
+    referenceTuplets = np.mean([_hasTuplet(rs) for rs in referenceBars])
+    assert referenceTuplets > 0.1
+    assert abs(sampledTuplets - referenceTuplets) < 0.025
+
+
+def testMixtureSequencesMatchSampledBars():
+    m34 = Metre.createFromLabels("3/4", "quarternote", "dottedhalfnote")
+    generator = MelodyRhythmGenerator(m34)
+    generator.densityImpact = 0.7
+    generator.entropyImpact = 0.5
+    mixture = generator.compileRhythmChain(m34)
+
+    sequence = mixture.sampleBarSequences(500, np.random.default_rng(5))
+    bars = mixture.sampleBars(500, np.random.default_rng(5))
+    assert sequence.getNumBars() == 500
+    assert sequence.getTotalTicks() == 500 * m34.getBarTicks()
+
+    onsets = sequence.getOnsetTicks()
+    assert (onsets[1:] == onsets[:-1] +
+            sequence.getDurationTicks()[:-1]).all()
+    for bar, rs in zip(sequence.toList(), bars):
+        assert [(round(d, 5), tie) for d, tie in bar] == \
+               [(round(d, 5), tie) for d, tie in rs]
+
+
+def testMixtureExpectedNumNotesMatchesReference():
+    generator = MelodyRhythmGenerator(m, random=random.Random(4))
+    generator.densityImpact = 0.2
+    generator.entropyImpact = 0.3
+    assert any(p > 0 for row in generator._probTuplets for p in row)
+    mixture = generator.compileRhythmChain(m)
+
+    numBars = 10000
+    referenceBars = [generateMelodicBarByRejection(generator, m)
+                     for _ in range(numBars)]
+    numNotes = np.mean([len(rs) for rs in referenceBars])
+    assert abs(mixture.calcExpectedNumNotes() - numNotes) < 0.1
+
+    numTies = np.mean([sum(1 for _, tie in rs if tie == 't')
+                       for rs in referenceBars])
+    assert abs(mixture.calcTieHistogram()["t"] - numTies) < 0.05
+    assert round(sum(mixture.calcDotHistogram().values()), 10) == \
+           round(mixture.calcExpectedNumNotes(), 10)
+
+
+def testMixtureBarProbabilitiesMatchReference():
+    m34 = Metre.createFromLabels("3/4", "quarternote", "dottedhalfnote")
+    generator = MelodyRhythmGenerator(m34, random=random.Random(4))
+    generator.densityImpact = 0.2
+    generator.entropyImpact = 0.3
+    mixture = generator.compileRhythmChain(m34)
+
+    barProbabilities = mixture.calcBarProbabilities()
+    assert round(sum(barProbabilities.values()), 10) == 1
+    expectedNumNotes = sum(prob * len(rhythm)
+                           for rhythm, prob in barProbabilities.items())
+    assert round(mixture.calcExpectedNumNotes(), 10) == \
+           round(expectedNumNotes, 10)
+
+    assertMatchesReference(barProbabilities,
+                           [generateMelodicBarByRejection(generator, m34)
+                            for _ in range(10000)])
+
+
+def testChainBarProbabilitiesMatchReference():
+    # bars of the rhythm space without tuplets, where dots can lead to dead
+    # ends that the chain is conditioned on avoiding
+    generator = MelodyRhythmGenerator(m, random=random.Random(6))
+    generator.densityImpact = 0.2
+    generator.entropyImpact = 0.3
+    generator._probTuplets = [[0] * len(row) for row in
+                              generator._probTuplets]
+    barProbabilities = RhythmChain.fromRhythmGenerator(
+        generator, m, generator.rhythmSpace).calcBarProbabilities()
+
+    assertMatchesReference(barProbabilities,
+                           [generateMelodicBarByRejection(generator, m)
+                            for _ in range(20000)])
+
+
+def testHarmonyChainBarProbabilitiesMatchReference():
+    for timeSignature, harmonicTactus in (("4/4", "halfnote"),
+                                          ("3/4", "dottedhalfnote")):
+        metre = Metre.createFromLabels(timeSignature, "quarternote",
+                                       harmonicTactus)
+        generator = HarmonyRhythmGenerator.fromModelData(
+            metre, rd["harmony"], random=random.Random(2))
+        generator.setDensityImpact(0.3)
+        generator.setEntropyImpact(0.2)
+        barProbabilities = generator.compileRhythmChain(
+            metre).calcBarProbabilities()
+        assert round(sum(barProbabilities.values()), 10) == 1
+
+        assertMatchesReference(barProbabilities,
+                               [generateHarmonicBarByRejection(generator,
+                                                               metre)
+                                for _ in range(20000)])
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    errno = pytest.main(["-xs", __file__])
+    sys.exit(errno)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from musiclib.rhythmsequence import RhythmSequence, RHYTHMSEQUENCEDTYPE, \
+    RHYTHMSEQUENCEFIELDS
+
+
+def createSequence(bars, ticksPerQuarter=4):
+    """Creates a sequence from lists of (durationTicks, tie) pairs"""
+    elements = [element for bar in bars for element in bar]
+    columns = RhythmSequence.createColumns(len(elements))
+    columns["durationTicks"][:] = [ticks for ticks, _ in elements]
+    columns["onsetTicks"][:] = np.cumsum(columns["durationTicks"]) - \
+        columns["durationTicks"]
+    columns["tie"][:] = [tie for _, tie in elements]
+    columns["metricalAccent"][:] = np.arange(len(elements))
+    barStarts = np.cumsum([0] + [len(bar) for bar in bars[:-1]])
+    return RhythmSequence(columns, barStarts, ticksPerQuarter)
+
+
+s = createSequence([[(8, False), (8, True)],
+                    [(4, False), (4, False), (8, False)]])
+
+
+def testBarsAreViews():
+    assert s.getNumBars() == 2
+    bar = s.getBar(1)
+    assert len(bar) == 3
+    assert np.shares_memory(bar.getOnsetTicks(), s.getOnsetTicks())
+    assert bar.getOnsetTicks().tolist() == [16, 20, 24]
+    assert bar.getTotalTicks() == 16
+    assert s.getBar(-1) == bar
+
+    with pytest.raises(IndexError):
+        s.getBar(2)
+
+
+def testSlicingKeepsBars():
+    tail = s[1:4]
+    assert np.shares_memory(tail.getTies(), s.getTies())
+    assert tail.getNumBars() == 2
+    assert tail.toList() == [[[2.0, "t"]], [[1.0, None], [1.0, None]]]
+    assert len(s[3:1]) == 0 and s[3:1].getNumBars() == 0
+
+
+def testColumnsAreContiguousAndReadOnly():
+    bar = s.getBar(1)
+    for name, dtype in RHYTHMSEQUENCEFIELDS:
+        column = bar.getColumns()[name]
+        assert column.dtype == dtype
+        assert column.flags.c_contiguous
+        assert not column.flags.writeable
+
+    with pytest.raises(ValueError):
+        s.getDurationTicks()[0] = 1
+
+    data = s.asArray()
+    assert data.dtype == RHYTHMSEQUENCEDTYPE
+    assert not data.flags.writeable
+    assert data["onsetTicks"].tolist() == s.getOnsetTicks().tolist()
+    assert data["metricalAccent"].tolist() == [0, 1, 2, 3, 4]
+
+
+def testElementsExposeRhythmTreeGetters():
+    element = s[-1]
+    assert element.getOnset() == 6.0
+    assert element.getDuration() == 2.0
+    assert element.getTie() is None
+    assert element.getMetricalAccent() == 4
+    assert [e.getTie() for e in reversed(s[:])][-2:] == ["t", None]
+
+
+def testConcatenationMovesOnsets():
+    joined = s + s.getBar(1)
+    assert joined.getNumBars() == 3
+    assert joined.getTotalTicks() == 32 + 16
+    assert joined.getOnsetTicks().tolist() == [0, 8, 16, 20, 24, 32, 36, 40]
+    assert joined.toList() == s.toList() + s.getBar(1).toList()
+
+    # the original sequences are untouched
+    assert s.getOnsetTicks().tolist() == [0, 8, 16, 20, 24]
+
+    with pytest.raises(ValueError):
+        RhythmSequence.concatenate([s, createSequence([[(4, False)]], 8)])
+
+
+if __name__ == "__main__":
+    import sys
+    errno = pytest.main(["-xs", __file__])
+    sys.exit(errno)
@@ -2,8 +2,8 @@ from musiclib.rhythmtree import RhythmTree
 from musiclib.rhythmtreefactory import RhythmTreeFactory
 from musiclib.metre import Metre
 
-m3 = Metre("3/4", "quarternote")
-m4 = Metre("4/4", "quarternote")
+m3 = Metre.createFromLabels("3/4", "quarternote", "dottedhalfnote")
+m4 = Metre.createFromLabels("4/4", "quarternote", "halfnote")
 rsf = RhythmTreeFactory()
 rs3 = rsf.createRhythmTree(2, m3)
 
@@ -28,7 +28,7 @@ def testRhythmicSpaceIsInstantiatedCorrectly():
 
 
 def testRhythmicSpaceIsCreatedCorrectly():
-    m = Metre("3/4", "quarternote")
+    m = Metre.createFromLabels("3/4", "quarternote", "dottedhalfnote")
     rsf = RhythmTreeFactory()
     rs2 = rsf.createRhythmTree(2, m)
 
@@ -45,7 +45,7 @@ def testRhythmicSpaceIsCreatedCorrectly():
 
 def testInsertTriplet():
     rsf = RhythmTreeFactory()
-    m = Metre("4/4", "quarternote")
+    m = Metre.createFromLabels("4/4", "quarternote", "halfnote")
 
     rs = rsf.createRhythmTree(3, m)
 
@@ -63,7 +63,7 @@ def testInsertTriplet():
 
 
 def testCorrectCandidateDurationsWithNoDotsArePicked():
-    m5 = Metre("4/4", "quarternote")
+    m5 = Metre.createFromLabels("4/4", "quarternote", "halfnote")
     rsf5 = RhythmTreeFactory()
     rs5 = rsf.createRhythmTree(2, m5)
 
@@ -186,6 +186,74 @@ def testTupletAncestorsAreIdentifiedCorrectly():
     assert rs.children[1].hasTupletAncestors() == True
     assert rs.children[0].hasTupletAncestors() == False
 
+
+def testDurationCandidatesAreReadFromSuccessorIndex():
+    rs = rsf.createRhythmTree(3, m4)
+
+    # starting from a node which is last child
+    node = rs.children[0].children[1].children[1]
+    expectedResult = tuple(node._getDurationCandidatesNoDot())
+    assert node.getDurationCandidates(0) == expectedResult
+
+    # starting from a dotted node
+    node = rs.children[0]
+    expectedResult = tuple(node._getDurationCandidatesDot(1))
+    assert node.getDurationCandidates(1) == expectedResult
+
+    # last node of the bar has no candidates
+    assert rs.children[1].children[1].children[1].getDurationCandidates(0) \
+           is None
+
+
+def testSuccessorIndexIsInvalidatedWhenTupletIsInserted():
+    rs = rsf.createRhythmTree(4, m4)
+    node = rs.children[0].children[0]
+    candidates = node.getDurationCandidates(0)
+    assert len(candidates[0].children) == 2
+
+    rsf.insertTuplet(rs.children[0].children[1], 3)
+    candidates = node.getDurationCandidates(0)
+    assert len(candidates[0].children) == 3
+
+
+def testRhythmTreesAreClonedFromTemplate():
+    rsf = RhythmTreeFactory()
+    rs1 = rsf.createRhythmTree(4, m4)
+    rs2 = rsf.createRhythmTree(4, m4)
+
+    assert rs1 is not rs2
+    assert str(rs1) == str(rs2)
+    assert len(rsf._templates) == 1
+
+    # inserting a tuplet in a copy doesn't affect the others
+    rsf.insertTuplet(rs1.children[0], 3)
+    rs3 = rsf.createRhythmTree(4, m4)
+    assert len(rs3.children[0].children) == 2
+    assert str(rs2) == str(rs3)
+
+
+def testClonedRhythmTreeKeepsSuccessorIndex():
+    rsf = RhythmTreeFactory()
+    rs = rsf.createRhythmTree(3, m4)
+    node = rs.children[0].children[1].children[1]
+    candidates = node.getDurationCandidates(0)
+
+    assert candidates == tuple(node._getDurationCandidatesNoDot())
+    assert candidates[0].getRoot() is rs
+
+
+def testTemplateCacheEvictsLeastRecentlyUsed():
+    rsf = RhythmTreeFactory(templateCacheSize=2)
+    rsf.createRhythmTree(2, m4)
+    rsf.createRhythmTree(3, m4)
+    rsf.createRhythmTree(2, m4)
+    rsf.createRhythmTree(4, m4)
+
+    assert len(rsf._templates) == 2
+    levels = [key[3] for key in rsf._templates]
+    assert levels == [2, 4]
+
+
 if __name__ == "__main__":
     import sys
     import pytest
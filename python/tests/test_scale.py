@@ -1,3 +1,4 @@
+import pytest
 from musiclib.harmonypitch.scale import Scale
 
 s = Scale()
@@ -18,6 +19,25 @@ def testScalesAreExpandedCorrectly():
     print(seq)
     assert seq == expectedSeq
 
+def testScalesAreInterned():
+    s1 = Scale.get("dorian")
+    assert s1 is Scale.get("dorian")
+    assert s1 is not Scale.get("ionian")
+    assert s1.expandScaleSequence(1) is s1.expandScaleSequence(1)
+    assert s1.expandScaleSequence(0) == [0, 2, 3, 5, 7, 9, 10]
+
+def testInternedScalesCantBeRenamed():
+    s1 = Scale.get("dorian")
+    with pytest.raises(ValueError):
+        s1.setName("lydian")
+    assert s1.getName() == "dorian"
+    assert s1.expandScaleSequence(0) == [0, 2, 3, 5, 7, 9, 10]
+
+    # scales which aren't shared can still be renamed
+    s2 = Scale("dorian")
+    s2.setName("lydian")
+    assert s2.expandScaleSequence(0) == [0, 2, 4, 6, 7, 9, 11]
+
 if __name__ == "__main__":
     import sys
     import pytest
@@ -0,0 +1,107 @@
+from fractions import Fraction
+import numpy as np
+import pytest
+from musiclib.metre import Metre
+from musiclib.rhythmtreefactory import RhythmTreeFactory
+from musiclib.persistentrhythmtree import PersistentRhythmTree
+from musiclib.flatrhythmtree import FlatRhythmTree
+from musiclib.harmonypitch.event import Event
+from musiclib.harmonypitch.harmonypitchgenerator import HarmonyPitchGenerator
+from musiclib.melodypitch.note import Note
+from musiclib.rhythmsequence import RhythmSequence
+from musiclib.ticks import calculateTicksPerQuarter, durationToTicks, \
+    ticksToDuration, ticksToFraction
+
+m4 = Metre.createFromLabels("4/4", "quarternote", "halfnote")
+m3 = Metre.createFromLabels("3/4", "quarternote", "dottedhalfnote")
+rsf = RhythmTreeFactory()
+
+
+def testTicksPerQuarterIsCalculatedCorrectly():
+    assert calculateTicksPerQuarter([1.0, 0.5, 0.25], ()) == 4
+    assert calculateTicksPerQuarter([1.0, 0.5], (3,)) == 6
+    assert calculateTicksPerQuarter([1.0], (3,), 2) == 12
+    assert calculateTicksPerQuarter([1.0 / 3]) == 315
+
+    assert m4.getTicksPerQuarter() == 1680
+    assert m4.getBarTicks() == 4 * 1680
+    assert m3.getBarTicks() == 3 * m3.getTicksPerQuarter()
+
+
+def testDurationsAreConvertedExactly():
+    ppq = m4.getTicksPerQuarter()
+    for tupletType in (3, 5, 7):
+        itemDuration = 0.25 / tupletType
+        ticks = durationToTicks(itemDuration, ppq)
+        assert durationToTicks(itemDuration, ppq) * tupletType == \
+               durationToTicks(0.25, ppq)
+        assert ticksToFraction(ticks, ppq) == Fraction(1, 4 * tupletType)
+        assert round(ticksToDuration(ticks, ppq), 10) == \
+               round(itemDuration, 10)
+
+    with pytest.raises(ValueError):
+        durationToTicks(1.0 / 11, ppq)
+
+
+def testTreeNodesReturnTheirTicks():
+    ppq = m4.getTicksPerQuarter()
+    rs = rsf.createRhythmTree(3, m4)
+    rsf.insertTuplet(rs.children[0].children[1], 3)
+    prs = PersistentRhythmTree.fromRhythmTree(rs)
+    flatRs = FlatRhythmTree.fromRhythmTree(rs)
+
+    tuplet = rs.children[0].children[1]
+    assert sum(child.getDurationTicks(ppq) for child in tuplet.children) == \
+           tuplet.getDurationTicks(ppq)
+
+    assert prs.getDurationTicks(ppq) == rs.getDurationTicks(ppq)
+    assert prs.getCursor((0, 1, 2)).getDurationTicks(ppq) == \
+           tuplet.children[2].getDurationTicks(ppq)
+    assert flatRs.getRoot().getDurationTicks(ppq) == m4.getBarTicks()
+
+
+def testEventReturnsItsTicks():
+    event = Event(onset=1.5, duration=0.5)
+    assert event.getOnsetTicks(4) == 6
+    assert event.getDurationTicks(4) == 2
+
+    event = Event(ticksPerQuarter=4, onsetTicks=6, durationTicks=3)
+    assert event.getOnset() == 1.5
+    assert event.getDuration() == 0.75
+    assert event.getDurationTicks(8) == 6
+
+
+def testTupletDurationsAreStoredExactly():
+    ppq = m4.getTicksPerQuarter()
+    rs = rsf.createRhythmTree(4, m4)
+    beat = rs.children[0].children[0]
+    rsf.insertTuplet(beat, 3)
+
+    # the children add up to the beat in ticks, not just approximately
+    childTicks = [child.durationTicks for child in beat.children]
+    assert sum(childTicks) == beat.durationTicks == ppq
+    assert beat.children[0].getDuration() == ticksToDuration(ppq // 3, ppq)
+
+
+def testChordsAndNotesKeepTheTicksOfTheirRhythm():
+    # a triplet of eighth notes and a half note, at 12 ticks per quarter
+    columns = RhythmSequence.createColumns(4)
+    columns["durationTicks"][:] = [4, 4, 4, 24]
+    columns["onsetTicks"][:] = [0, 4, 8, 12]
+    sequence = RhythmSequence(columns, np.zeros(1, dtype=np.intp), 12)
+
+    for element in sequence:
+        chord = HarmonyPitchGenerator._createChord("0", element, "ionian")
+        assert chord.getTicksPerQuarter() == 12
+        assert chord.getDurationTicks() == element.getDurationTicks()
+        assert chord.getDuration() == element.getDuration()
+
+        note = Note(element, chord)
+        assert note.getDurationTicks() == chord.getDurationTicks()
+        assert note.getDurationTicks(24) == 2 * chord.getDurationTicks()
+
+
+if __name__ == "__main__":
+    import sys
+    errno = pytest.main(["-xs", __file__])
+    sys.exit(errno)